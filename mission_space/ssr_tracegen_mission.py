@@ -1,11 +1,27 @@
 import argparse
 import csv
 import math
+import os
+import sys
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
+from typing import Optional, Tuple
+
+# The columnar writer and the chunked/parallel trace writer live with the SSR engine in ../ssr.
+sys.path.insert(0, os.environ.get("SSR_ENGINE_DIR") or str(Path(__file__).resolve().parent.parent / "ssr"))
+from ssr_columnar import SUFFIX as COLUMNAR_SUFFIX, write_columnar  # noqa: E402
+from ssr_bundle import SUFFIX as BUNDLE_SUFFIX  # noqa: E402
+from ssr_tracegen import DEFAULT_CHUNK_ROWS, write_bundle_traces, write_traces  # noqa: E402
+
 
 EPS = 1e-12
 
+# Low-discrepancy steps (golden ratio, plastic-number pair) for the variant family.
+_GOLDEN = 0.6180339887498949
+_PLASTIC_1 = 0.7548776662466927
+_PLASTIC_2 = 0.5698402909980532
+
 def clamp(x, lo=-0.999999, hi=0.999999):
     return lo if x < lo else hi if x > hi else x
 
@@ -17,6 +33,19 @@ class RouteSpec:
     name: str
     n: int
     pattern: str
+    phase: float = 0.0                            # added to the base cos/sin angle
+    band: Optional[Tuple[float, float]] = None    # (lo, hi) fractions of n; None = middle third
+    spikes: Optional[int] = None                  # None = pattern default (3 radiation, 1 shock)
+
+HEADERS = [
+    "k", "x", "x_next", "r", "dx_raw", "dx", "dx_perm",
+    "a", "s", "u", "v", "R", "Psi", "event"
+]
+
+PATTERNS = [
+    "free_return_corridor", "comms_blackout_band", "comms_blackout_smooth",
+    "radiation_spike_hazard", "midcourse_shock_denied", "margin_erosion_denied_only",
+]
 
 def smoothstep01(t):
     if t <= 0.0:
@@ -31,82 +60,117 @@ def _guaranteed_low(a_min_for_event: float, preferred: float = -0.35) -> float:
     return min(preferred, float(a_min_for_event) - 0.05)
 
 def make_trace(spec: RouteSpec, a_min_for_event: float):
-    headers = [
-        "k", "x", "x_next", "r", "dx_raw", "dx", "dx_perm",
-        "a", "s", "u", "v", "R", "Psi", "event"
-    ]
-
-    rows = []
-    u_prev = 0.0
-    v_prev = 0.0
-    m_prev = 0.0
-
+    return list(HEADERS), list(trace_rows(spec, a_min_for_event))
+
+def variant_spec(i: int, n: int) -> RouteSpec:
+    # Cycle through PATTERNS; later cycles shift phase, move/resize the band and vary spike counts.
+    pattern = PATTERNS[i % len(PATTERNS)]
+    j = i // len(PATTERNS)
+    name = f"route{i:05d}_{pattern}.csv"
+    if j == 0:
+        return RouteSpec(name, n, pattern)
+    width = 0.15 + 0.30 * ((j * _PLASTIC_1) % 1.0)
+    lo = 0.05 + (0.90 - width) * ((j * _PLASTIC_2) % 1.0)
+    return RouteSpec(name, n, pattern, phase=2.0 * math.pi * ((j * _GOLDEN) % 1.0),
+                     band=(lo, lo + width), spikes=1 + j % 6)
+
+def route_layout(spec: RouteSpec):
     n = max(2, int(spec.n))
-    denom = max(1, n - 1)
 
     # Central band and ramp sizes (deterministic, no randomness)
-    band_lo = n // 3
-    band_hi = (2 * n) // 3
+    if spec.band is None:
+        band_lo = n // 3
+        band_hi = (2 * n) // 3
+    else:
+        band_lo = int(spec.band[0] * n)
+        band_hi = int(spec.band[1] * n)
     ramp = max(2, n // 20)
 
-    a_low = _guaranteed_low(a_min_for_event, preferred=-0.35)
+    if spec.pattern == "radiation_spike_hazard":
+        count = 3 if spec.spikes is None else spec.spikes
+        spikes = frozenset(i * n // (count + 2) for i in range(1, count + 1))
+    else:
+        count = 1 if spec.spikes is None else spec.spikes
+        spikes = frozenset(i * n // (count + 1) for i in range(1, count + 1))
 
-    for k in range(n):
-        m = float(k)
+    return n, band_lo, band_hi, ramp, spikes
 
-        base_a = 0.62 + 0.06 * math.cos(2.0 * math.pi * k / denom)
-        base_s = 0.16 + 0.05 * math.sin(2.0 * math.pi * k / denom)
-
-        if spec.pattern == "free_return_corridor":
-            a = base_a + 0.03 * math.cos(4.0 * math.pi * k / denom)
-            s = base_s
-
-        elif spec.pattern == "comms_blackout_band":
-            a = base_a
-            s = base_s
-            if band_lo <= k <= band_hi:
-                a = a_low
-
-        elif spec.pattern == "comms_blackout_smooth":
-            a = base_a
-            s = base_s
-
-            if k < band_lo - ramp or k > band_hi + ramp:
-                pass
-            elif band_lo <= k <= band_hi:
-                a = a_low
-            elif band_lo - ramp <= k < band_lo:
-                t = (k - (band_lo - ramp)) / max(1.0, float(ramp))
-                w = smoothstep01(t)
-                a = (1.0 - w) * base_a + w * a_low
-            elif band_hi < k <= band_hi + ramp:
-                t = (k - band_hi) / max(1.0, float(ramp))
-                w = smoothstep01(t)
-                a = (1.0 - w) * a_low + w * base_a
-
-        elif spec.pattern == "radiation_spike_hazard":
-            a = 0.56 + 0.05 * math.cos(2.0 * math.pi * k / denom)
-            s = base_s
-            for kk in (n // 5, 2 * n // 5, 3 * n // 5):
-                if k == kk:
-                    s = 0.80
-
-        elif spec.pattern == "midcourse_shock_denied":
-            a = 0.60 + 0.04 * math.cos(2.0 * math.pi * k / denom)
-            s = 0.15 + 0.04 * math.sin(2.0 * math.pi * k / denom)
-            if k == n // 2:
-                s = 0.98
-
-        elif spec.pattern == "margin_erosion_denied_only":
-            erosion = 0.75 * (k / denom)
-            a = 0.60 - erosion + 0.03 * math.cos(2.0 * math.pi * k / denom)
-            s = 0.16 + 0.02 * math.sin(2.0 * math.pi * k / denom)
+def pattern_as(spec: RouteSpec, k: int, layout, a_low: float):
+    n, band_lo, band_hi, ramp, spikes = layout
+    denom = max(1, n - 1)
+    theta = 2.0 * math.pi * k / denom + spec.phase
+
+    base_a = 0.62 + 0.06 * math.cos(theta)
+    base_s = 0.16 + 0.05 * math.sin(theta)
+
+    if spec.pattern == "free_return_corridor":
+        a = base_a + 0.03 * math.cos(4.0 * math.pi * k / denom + 2.0 * spec.phase)
+        s = base_s
+
+    elif spec.pattern == "comms_blackout_band":
+        a = base_a
+        s = base_s
+        if band_lo <= k <= band_hi:
+            a = a_low
+
+    elif spec.pattern == "comms_blackout_smooth":
+        a = base_a
+        s = base_s
+
+        if k < band_lo - ramp or k > band_hi + ramp:
+            pass
+        elif band_lo <= k <= band_hi:
+            a = a_low
+        elif band_lo - ramp <= k < band_lo:
+            t = (k - (band_lo - ramp)) / max(1.0, float(ramp))
+            w = smoothstep01(t)
+            a = (1.0 - w) * base_a + w * a_low
+        elif band_hi < k <= band_hi + ramp:
+            t = (k - band_hi) / max(1.0, float(ramp))
+            w = smoothstep01(t)
+            a = (1.0 - w) * a_low + w * base_a
+
+    elif spec.pattern == "radiation_spike_hazard":
+        a = 0.56 + 0.05 * math.cos(theta)
+        s = base_s
+        if k in spikes:
+            s = 0.80
+
+    elif spec.pattern == "midcourse_shock_denied":
+        a = 0.60 + 0.04 * math.cos(theta)
+        s = 0.15 + 0.04 * math.sin(theta)
+        if k in spikes:
+            s = 0.98
+
+    elif spec.pattern == "margin_erosion_denied_only":
+        erosion = 0.75 * (k / denom)
+        a = 0.60 - erosion + 0.03 * math.cos(theta)
+        s = 0.16 + 0.02 * math.sin(theta)
+
+    else:
+        raise ValueError(f"Unknown pattern: {spec.pattern}")
+
+    return clamp(a), clamp(s)
+
+def trace_rows(spec: RouteSpec, a_min_for_event: float, start: int = 0, stop: Optional[int] = None):
+    # Rows [start, stop), streamed. A row depends only on its index and the previous row,
+    # so chunks can be generated independently and concatenate to the sequential trace.
+    layout = route_layout(spec)
+    n = layout[0]
+    stop = n if stop is None else min(stop, n)
 
-        else:
-            raise ValueError(f"Unknown pattern: {spec.pattern}")
+    a_low = _guaranteed_low(a_min_for_event, preferred=-0.35)
 
-        a = clamp(a)
-        s = clamp(s)
+    v_prev = 0.0
+    m_prev = 0.0
+    if start > 0:
+        _, s = pattern_as(spec, start - 1, layout, a_low)
+        v_prev = atanh_safe(s)
+        m_prev = float(start - 1)
+
+    for k in range(start, stop):
+        m = float(k)
+        a, s = pattern_as(spec, k, layout, a_low)
 
         u = atanh_safe(a)
         v = atanh_safe(s)
@@ -131,16 +195,17 @@ def make_trace(spec: RouteSpec, a_min_for_event: float):
         x_next = float(k + 1)
         r = 0.0
 
-        rows.append([
+        yield [
             k, x, x_next, r, dx_raw, dx, dx_perm,
             a, s, u, v, R, Psi, event
-        ])
-
-        u_prev, v_prev, m_prev = u, v, m
+        ]
 
-    return headers, rows
+        v_prev, m_prev = v, m
 
 def write_csv(path: Path, headers, rows):
+    if path.suffix == COLUMNAR_SUFFIX:
+        write_columnar(path, headers, rows)
+        return
     with path.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(headers)
@@ -152,26 +217,49 @@ def main():
     ap.add_argument("--out_dir", default="traces_mission")
     ap.add_argument("--include_smooth_blackout", action="store_true")
     ap.add_argument("--a_min_for_event", type=float, default=0.05)
+    ap.add_argument("--format", choices=["csv", "ssrc"], default="csv", help="Trace file format")
+    ap.add_argument("--variants", type=int, default=0,
+                    help="Write this many routes from the deterministic variant family instead of the scenarios")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--chunk_rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                    help="(workers > 1) split CSV routes longer than this into parallel chunks")
+    ap.add_argument("--bundle", default=None, metavar="NAME" + BUNDLE_SUFFIX,
+                    help="Write all routes into this one bundle file in --out_dir instead of one CSV per route")
     args = ap.parse_args()
+    if args.bundle and (args.format != "csv" or not args.bundle.endswith(BUNDLE_SUFFIX)):
+        raise SystemExit(f"--bundle needs --format csv and a name ending in {BUNDLE_SUFFIX}")
 
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    specs = [
-        RouteSpec("routeA_free_return_corridor.csv", args.n, "free_return_corridor"),
-        RouteSpec("routeB_comms_blackout_band.csv", args.n, "comms_blackout_band"),
-        RouteSpec("routeC_radiation_spike_hazard.csv", args.n, "radiation_spike_hazard"),
-        RouteSpec("routeD_midcourse_shock_denied.csv", args.n, "midcourse_shock_denied"),
-        RouteSpec("routeE_margin_erosion_denied_only.csv", args.n, "margin_erosion_denied_only"),
-    ]
-
-    if args.include_smooth_blackout:
-        specs.append(RouteSpec("routeB2_comms_blackout_smooth.csv", args.n, "comms_blackout_smooth"))
-
-    for s in specs:
-        headers, rows = make_trace(s, a_min_for_event=float(args.a_min_for_event))
-        write_csv(out_dir / s.name, headers, rows)
-        print("WROTE", s.name)
+    if args.variants > 0:
+        specs = [variant_spec(i, args.n) for i in range(args.variants)]
+    else:
+        specs = [
+            RouteSpec("routeA_free_return_corridor.csv", args.n, "free_return_corridor"),
+            RouteSpec("routeB_comms_blackout_band.csv", args.n, "comms_blackout_band"),
+            RouteSpec("routeC_radiation_spike_hazard.csv", args.n, "radiation_spike_hazard"),
+            RouteSpec("routeD_midcourse_shock_denied.csv", args.n, "midcourse_shock_denied"),
+            RouteSpec("routeE_margin_erosion_denied_only.csv", args.n, "margin_erosion_denied_only"),
+        ]
+
+        if args.include_smooth_blackout:
+            specs.append(RouteSpec("routeB2_comms_blackout_smooth.csv", args.n, "comms_blackout_smooth"))
+
+    a_min_for_event = float(args.a_min_for_event)
+    if args.bundle:
+        jobs = [(s.name, partial(trace_rows, s, a_min_for_event), max(2, int(s.n))) for s in specs]
+        write_bundle_traces(out_dir / args.bundle, jobs, HEADERS, workers=args.workers,
+                            chunk_rows=max(1, args.chunk_rows))
+        print("WROTE", args.bundle, f"({len(specs)} routes)")
+        return
+
+    names = [s.name if args.format == "csv" else Path(s.name).with_suffix(COLUMNAR_SUFFIX).name for s in specs]
+    jobs = [(out_dir / name, partial(trace_rows, s, a_min_for_event), max(2, int(s.n)))
+            for name, s in zip(names, specs)]
+    write_traces(jobs, HEADERS, workers=args.workers, chunk_rows=max(1, args.chunk_rows))
+    for name in names:
+        print("WROTE", name)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,283 @@
+"""SSR benchmark suite.
+
+Synthesizes traces with the ssr_tracegen patterns, runs every engine configuration on them and
+reports rows/sec, per-stage wall time and peak memory. Every configuration is also given as a
+speedup over the python reference engine on the same traces (when python is among --engines).
+Results are written as JSON; pass a previous results file with --compare to flag regressions
+between versions.
+
+Stages: parse (CSV/.ssrc decode, including the a,s -> u,v transform for traces without u,v),
+transform (R/Psi), steps (step costs and L_struct), percentiles (sort + median/p95), gating
+and output (summary CSV + report). Engines that fuse stages report the fused time under the
+first stage and leave the others empty. Each configuration runs in a fresh process, so peak
+memory (max RSS) is per configuration.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, get_start_method, set_start_method
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ssr_columnar import SUFFIX as COLUMNAR_SUFFIX
+from ssr_structural_safety_routing import (
+    PROFILES,
+    STAGES,
+    EngineConfig,
+    MetricProfile,
+    GateConfig,
+    StageProfiler,
+    add_gate_args,
+    evaluate_parallel,
+    evaluate_route_staged,
+    gate_from_args,
+    print_report,
+    write_summary,
+)
+from ssr_tracegen import HEADERS, PATTERNS, RouteSpec, trace_rows, write_csv
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESULTS_VERSION = 1
+ENGINES = ["python", "stream", "stream_exact", "numpy"]
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # Largest of this process and its finished route workers.
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024.0
+
+
+def make_bench_trace(path: Path, pattern: str, n: int) -> float:
+    """Write one synthetic trace unless it already exists; returns the generation time (0 if reused)."""
+    if path.exists():
+        return 0.0
+    t0 = time.perf_counter()
+    tmp = path.with_name(path.stem + ".tmp" + path.suffix)
+    write_csv(tmp, HEADERS, trace_rows(RouteSpec(path.name, n, pattern)))
+    os.replace(tmp, path)
+    return time.perf_counter() - t0
+
+
+def run_staged(path: Path, engine: str, gate: GateConfig, eps: float, profile: MetricProfile, clock: StageProfiler):
+    ecfg = EngineConfig(engine="stream" if engine.startswith("stream") else engine, eps=eps,
+                        exact_quantiles=engine == "stream_exact", profile=profile.name)
+    return evaluate_route_staged(path, gate, ecfg, clock)
+
+
+def run_case(case: Dict) -> Dict:
+    """Run one configuration over its route set; executed in a fresh worker process."""
+    gate = GateConfig(**case["gate"])
+    paths = [Path(p) for p in case["paths"]]
+    engine = case["engine"]
+    profile = PROFILES[case["profile"]]
+    out_path = Path(case["out"])
+
+    # This process was spawned for isolation; route workers should start the way the router's do.
+    set_start_method(case["start_method"], force=True)
+
+    clock = StageProfiler()
+    t0 = time.perf_counter()
+    if case["workers"] > 1:
+        ecfg = EngineConfig(engine="stream" if engine.startswith("stream") else engine, eps=case["eps"],
+                            exact_quantiles=engine == "stream_exact", profile=profile.name)
+        routes = evaluate_parallel(paths, gate, ecfg, case["workers"])
+        clock.lap("parse")
+    else:
+        routes = [run_staged(p, engine, gate, case["eps"], profile, clock) for p in paths]
+
+    write_summary(out_path, routes, gate, profile=profile)
+    with contextlib.redirect_stdout(io.StringIO()):
+        print_report(routes, gate, "L_struct", out_path, profile)
+    clock.lap("output")
+    wall = time.perf_counter() - t0
+
+    rows = sum(r.rows for r in routes)
+    return {
+        "wall_s": wall,
+        "rows": rows,
+        "rows_per_s": rows / wall if wall > 0 else None,
+        "stages_s": {s: clock.times.get(s) for s in STAGES},
+        "peak_rss_mb": peak_rss_mb(),
+        "denied": sum(r.denied for r in routes),
+    }
+
+
+def run_isolated(case: Dict) -> Dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+        return ex.submit(run_case, case).result()
+
+
+def build_sets(args, work: Path) -> List[Dict]:
+    """Trace sets to benchmark: one route per --rows size, then --routes files of --route_rows each."""
+    sets = []
+    for n in args.rows:
+        sets.append({"name": f"rows_{n}", "files": 1, "rows_per_file": n,
+                     "specs": [(work / f"bench_{args.pattern}_{n}", args.pattern, n)]})
+    for m in args.routes:
+        specs = [(work / f"set_{args.route_rows}" / f"route_{i:05d}_{PATTERNS[i % len(PATTERNS)]}",
+                  PATTERNS[i % len(PATTERNS)], args.route_rows) for i in range(m)]
+        sets.append({"name": f"routes_{m}x{args.route_rows}", "files": m, "rows_per_file": args.route_rows,
+                     "specs": specs})
+    return sets
+
+
+def compare(results: List[Dict], baseline_path: Path, tolerance: float) -> int:
+    base = json.loads(baseline_path.read_text(encoding="utf-8"))
+    index = {(r["set"], r["engine"], r["format"], r["workers"]): r for r in base.get("results", [])}
+    regressions = 0
+    print("")
+    print(f"COMPARE vs {baseline_path.as_posix()} ({base.get('label') or 'unlabelled'}):")
+    for r in results:
+        old = index.get((r["set"], r["engine"], r["format"], r["workers"]))
+        if old is None or not old.get("rows_per_s") or not r.get("rows_per_s"):
+            continue
+        ratio = r["rows_per_s"] / old["rows_per_s"]
+        flag = ""
+        if ratio < 1.0 - tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"- {r['set']:<22} {r['engine']:<12} {r['format']:<5} w={r['workers']}  "
+              f"{old['rows_per_s']:>12.0f} -> {r['rows_per_s']:>12.0f} rows/s  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the SSR router and trace generator")
+    ap.add_argument("--rows", type=int, nargs="*", default=[1000, 10000, 100000],
+                    help="Single-route trace sizes (e.g. 1000 ... 10000000)")
+    ap.add_argument("--routes", type=int, nargs="*", default=[5, 100], help="Route-set sizes (number of files)")
+    ap.add_argument("--route_rows", type=int, default=200, help="Rows per file in route sets")
+    ap.add_argument("--pattern", choices=PATTERNS, default="permission_collapse",
+                    help="Pattern for single-route traces (route sets cycle through all patterns)")
+    ap.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    ap.add_argument("--formats", nargs="+", choices=["csv", "ssrc"], default=["csv"])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1], help="Worker counts to run route sets with")
+    ap.add_argument("--repeat", type=int, default=1, help="Runs per configuration; the fastest is kept")
+
+    add_gate_args(ap)
+    ap.set_defaults(step_spike_mode="rel_p95")
+    ap.add_argument("--eps", type=float, default=1e-12)
+    ap.add_argument("--metric_profile", choices=list(PROFILES), default="canonical",
+                    help="Metric profile to run (the synthetic traces carry both 'k' and 'dx')")
+
+    ap.add_argument("--work_dir", default=None, help="Where traces are generated and reused (default: temp dir)")
+    ap.add_argument("--label", default="", help="Free-form label stored with the results (e.g. a version)")
+    ap.add_argument("--out", default="ssr_bench_results.json")
+    ap.add_argument("--compare", default=None, help="Previous results JSON to compare rows/sec against")
+    ap.add_argument("--tolerance", type=float, default=0.10,
+                    help="(compare) flag a regression when rows/sec drops by more than this fraction")
+    args = ap.parse_args()
+
+    engines = list(args.engines)
+    if "numpy" in engines and np is None:
+        print("NOTE: NumPy not installed; skipping --engines numpy", file=sys.stderr)
+        engines.remove("numpy")
+
+    gate = gate_from_args(args)
+
+    tmp = None
+    if args.work_dir:
+        work = Path(args.work_dir)
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="ssr_bench_")
+        work = Path(tmp.name)
+    work.mkdir(parents=True, exist_ok=True)
+
+    print("SSUM-SSR — Benchmark")
+    print(f"Python {platform.python_version()} | NumPy {np.__version__ if np is not None else 'n/a'} | "
+          f"{platform.platform()}")
+    print("")
+
+    generation = []
+    results = []
+    reference: Dict[tuple, float] = {}
+    try:
+        for tset in build_sets(args, work):
+            for fmt in args.formats:
+                suffix = ".csv" if fmt == "csv" else COLUMNAR_SUFFIX
+                paths = []
+                gen_s = 0.0
+                for base, pattern, n in tset["specs"]:
+                    base.parent.mkdir(parents=True, exist_ok=True)
+                    p = base.with_suffix(suffix)
+                    gen_s += make_bench_trace(p, pattern, n)
+                    paths.append(p)
+                total_rows = tset["files"] * tset["rows_per_file"]
+                if gen_s > 0:
+                    generation.append({"set": tset["name"], "format": fmt, "rows": total_rows,
+                                       "wall_s": gen_s, "rows_per_s": total_rows / gen_s})
+                    print(f"GEN  {tset['name']:<22} {fmt:<5} {total_rows:>10} rows  {gen_s:8.3f}s  "
+                          f"{total_rows / gen_s:>12.0f} rows/s")
+
+                for engine in engines:
+                    for workers in (args.workers if tset["files"] > 1 else [1]):
+                        case = {"gate": gate.__dict__, "paths": [p.as_posix() for p in paths], "engine": engine,
+                                "eps": args.eps, "workers": workers, "start_method": get_start_method(),
+                                "profile": args.metric_profile,
+                                "out": (work / f"summary_{engine}.csv").as_posix()}
+                        best = None
+                        for _ in range(max(1, args.repeat)):
+                            res = run_isolated(case)
+                            if best is None or res["wall_s"] < best["wall_s"]:
+                                best = res
+                        best.update({"set": tset["name"], "files": tset["files"], "format": fmt,
+                                     "engine": engine, "workers": workers})
+                        if engine == "python":
+                            reference[(tset["name"], fmt, workers)] = best["rows_per_s"]
+                        ref = reference.get((tset["name"], fmt, workers))
+                        best["speedup"] = best["rows_per_s"] / ref if ref and best["rows_per_s"] else None
+                        results.append(best)
+                        rss = "n/a" if best["peak_rss_mb"] is None else f"{best['peak_rss_mb']:.0f}MB"
+                        speedup = "" if best["speedup"] is None else f"  x{best['speedup']:.2f} vs python"
+                        stages = "  ".join(f"{s}={best['stages_s'][s]:.3f}" for s in STAGES
+                                           if best["stages_s"][s] is not None)
+                        print(f"RUN  {tset['name']:<22} {fmt:<5} {engine:<12} w={workers}  {best['wall_s']:8.3f}s  "
+                              f"{best['rows_per_s']:>12.0f} rows/s{speedup}  rss={rss}  [{stages}]")
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    out_path = Path(args.out)
+    doc = {
+        "version": RESULTS_VERSION,
+        "label": args.label,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__ if np is not None else None,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "metric_profile": args.metric_profile,
+        "gate": gate.__dict__,
+        "generation": generation,
+        "results": results,
+    }
+    out_path.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+
+    regressions = compare(results, Path(args.compare), args.tolerance) if args.compare else 0
+    print("")
+    print(f"WROTE {out_path.as_posix()}")
+    if regressions:
+        raise SystemExit(f"{regressions} configuration(s) regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Multi-route bundle files: many routes in one CSV, located through a route directory.
+
+A bundle is a CSV named `*.bundle.csv` whose first column is `route`; the other columns are the
+usual trace columns, and each route's rows are contiguous and in row order. The route directory
+(name -> byte range and row count) lives next to the bundle in `<bundle>.ssrbi`. It is written
+together with the bundle, or built by one scan of the file and rebuilt whenever the bundle's size
+or mtime changes. Evaluating a route then costs one seek and one read in an already open file.
+
+- convert: `python ssr_bundle.py --in traces/*.csv --out traces.bundle.csv`
+- list:    `python ssr_bundle.py --list traces.bundle.csv`
+"""
+
+import argparse
+import atexit
+import csv
+import fnmatch
+import io
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+SUFFIX = ".bundle.csv"
+INDEX_SUFFIX = ".ssrbi"
+INDEX_VERSION = 1
+
+# Open bundle files of this process, keyed by path: (stamp the directory was read at, file).
+_files: Dict[Path, Tuple[Tuple[int, int], BinaryIO]] = {}
+
+
+def is_bundle(path: Path) -> bool:
+    return Path(path).name.endswith(SUFFIX)
+
+
+def index_path(bundle: Path) -> Path:
+    bundle = Path(bundle)
+    return bundle.with_name(bundle.name + INDEX_SUFFIX)
+
+
+def _stamp(path: Path) -> Tuple[int, int]:
+    st = path.stat()
+    return st.st_size, st.st_mtime_ns
+
+
+@dataclass(frozen=True)
+class BundleRoute:
+    """One route of a bundle: rows in bytes [start, end) of the file, trace columns in header."""
+    bundle: Path
+    name: str
+    start: int
+    end: int
+    rows: int
+    header: Tuple[str, ...]
+    stamp: Tuple[int, int] = (0, 0)
+
+
+@dataclass
+class BundleIndex:
+    bundle: Path
+    header: Tuple[str, ...]      # trace columns, without 'route'
+    routes: List[BundleRoute]
+    stamp: Tuple[int, int]
+
+    @classmethod
+    def build(cls, bundle: Path) -> "BundleIndex":
+        """Scan the bundle once; routes must be contiguous."""
+        bundle = Path(bundle)
+        stamp = _stamp(bundle)
+        with bundle.open("rb") as f:
+            header = _read_header(bundle, f.readline())
+            spans: List[Tuple[str, int, int, int]] = []
+            seen = set()
+            name, start, rows = None, f.tell(), 0
+            pos = start
+            for line in f:
+                if line.strip():
+                    cut = line.find(b",")
+                    if line.startswith(b'"') or cut < 0:
+                        row = next(csv.reader([line.decode("utf-8")]), [""])
+                        this = row[0]
+                    else:
+                        this = line[:cut].decode("utf-8")
+                    if this != name:
+                        if name is not None:
+                            spans.append((name, start, pos, rows))
+                        if this in seen:
+                            raise SystemExit(f"{bundle.as_posix()}: rows of route '{this}' are not contiguous")
+                        seen.add(this)
+                        name, start, rows = this, pos, 0
+                    rows += 1
+                pos += len(line)
+            if name is not None:
+                spans.append((name, start, pos, rows))
+        return cls(bundle, header, [BundleRoute(bundle, n, s, e, r, header, stamp) for n, s, e, r in spans], stamp)
+
+    def save(self) -> None:
+        """Write <bundle>.ssrbi atomically; a read-only directory just keeps the index in memory."""
+        path = index_path(self.bundle)
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        doc = {
+            "version": INDEX_VERSION,
+            "size": self.stamp[0],
+            "mtime_ns": self.stamp[1],
+            "header": list(self.header),
+            "routes": [[r.name, r.start, r.end, r.rows] for r in self.routes],
+        }
+        try:
+            tmp.write_text(json.dumps(doc, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, bundle: Path) -> Optional["BundleIndex"]:
+        """The saved index if it matches the bundle's current size and mtime, else None."""
+        bundle = Path(bundle)
+        try:
+            doc = json.loads(index_path(bundle).read_text(encoding="utf-8"))
+            stamp = _stamp(bundle)
+            if doc.get("version") != INDEX_VERSION or (doc["size"], doc["mtime_ns"]) != stamp:
+                return None
+            header = tuple(doc["header"])
+            routes = [BundleRoute(bundle, n, s, e, r, header, stamp) for n, s, e, r in doc["routes"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return cls(bundle, header, routes, stamp)
+
+    def select(self, patterns: Optional[Sequence[str]] = None) -> List[BundleRoute]:
+        """Routes matching any of patterns (exact names or fnmatch patterns), in bundle order; all if None."""
+        if not patterns:
+            return list(self.routes)
+        names = {r.name for r in self.routes}
+        for p in patterns:
+            if not any(c in p for c in "*?[") and p not in names:
+                raise SystemExit(f"{self.bundle.as_posix()}: no route '{p}'")
+        return [r for r in self.routes if any(fnmatch.fnmatchcase(r.name, p) for p in patterns)]
+
+
+def _read_header(bundle: Path, line: bytes) -> Tuple[str, ...]:
+    cols = next(csv.reader([line.decode("utf-8")]), None)
+    if not cols or cols[0] != "route":
+        raise SystemExit(f"{bundle.as_posix()}: a bundle's first column must be 'route'")
+    return tuple(cols[1:])
+
+
+def open_bundle(bundle: Path, rebuild: bool = False) -> BundleIndex:
+    """The route directory of bundle: loaded from <bundle>.ssrbi, or built (and saved) when missing or stale."""
+    index = None if rebuild else BundleIndex.load(bundle)
+    if index is None:
+        index = BundleIndex.build(bundle)
+        index.save()
+    return index
+
+
+def _bundle_file(ref: BundleRoute) -> BinaryIO:
+    """The open bundle of ref, one per path and process. A bundle rewritten since it was opened is
+    reopened (the old handle is closed); one that no longer matches ref's directory is an error."""
+    stamp, f = _files.get(ref.bundle, (None, None))
+    if stamp == ref.stamp:
+        return f
+    if f is not None:
+        f.close()
+        del _files[ref.bundle]
+    f = ref.bundle.open("rb")
+    st = os.fstat(f.fileno())
+    if (st.st_size, st.st_mtime_ns) != ref.stamp:
+        f.close()
+        raise SystemExit(f"{ref.bundle.as_posix()} changed since its route directory was read; run again")
+    _files[ref.bundle] = (ref.stamp, f)
+    return f
+
+
+def close_bundles() -> None:
+    """Close the bundles this process opened (also run at exit)."""
+    while _files:
+        _, f = _files.popitem()[1]
+        f.close()
+
+
+atexit.register(close_bundles)
+
+
+def route_rows(ref: BundleRoute) -> List[List[str]]:
+    """The CSV rows of one route, without the route column (one read in a per-process open file)."""
+    f = _bundle_file(ref)
+    f.seek(ref.start)
+    data = f.read(ref.end - ref.start)
+    return [row[1:] for row in csv.reader(io.StringIO(data.decode("utf-8"), newline="")) if row]
+
+
+def _saved_index(bundle: Path, headers: Sequence[str], spans: List[Tuple[str, int, int, int]]) -> BundleIndex:
+    stamp = _stamp(bundle)
+    header = tuple(headers)
+    index = BundleIndex(bundle, header, [BundleRoute(bundle, n, s, e, r, header, stamp) for n, s, e, r in spans],
+                        stamp)
+    index.save()
+    return index
+
+
+def prefixed_rows(name: str, rows: Callable, start: int = 0, stop: Optional[int] = None) -> Iterable[List]:
+    """rows(start, stop) with the route name in front of every row (generator jobs writing bundle parts)."""
+    for row in rows(start, stop):
+        yield [name, *row]
+
+
+def assemble_bundle(bundle: Path, headers: Sequence[str], parts: Sequence[Tuple[str, Path]]) -> BundleIndex:
+    """Concatenate header-less part files (rows already prefixed with their route) into bundle,
+    recording the route directory on the way; the parts are removed."""
+    bundle = Path(bundle)
+    spans = []
+    head = io.StringIO()
+    csv.writer(head).writerow(["route", *headers])
+    with bundle.open("wb") as out:
+        out.write(head.getvalue().encode("utf-8"))
+        for name, part in parts:
+            start = out.tell()
+            rows = 0
+            with Path(part).open("rb") as f:
+                while True:
+                    buf = f.read(1 << 20)
+                    if not buf:
+                        break
+                    rows += buf.count(b"\n")
+                    out.write(buf)
+            spans.append((name, start, out.tell(), rows))
+            Path(part).unlink()
+    return _saved_index(bundle, headers, spans)
+
+
+def write_bundle(bundle: Path, headers: Sequence[str], routes: Iterable[Tuple[str, Iterable[Sequence]]]) -> BundleIndex:
+    """Write (route name, rows) pairs as one bundle and its route directory."""
+    bundle = Path(bundle)
+    spans = []
+    with bundle.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["route", *headers])
+        for name, rows in routes:
+            f.flush()
+            start = f.buffer.tell()
+            n = 0
+            for row in rows:
+                w.writerow([name, *row])
+                n += 1
+            f.flush()
+            spans.append((name, start, f.buffer.tell(), n))
+    return _saved_index(bundle, headers, spans)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pack trace CSVs into a route bundle, or list a bundle's routes")
+    ap.add_argument("--in", dest="inputs", nargs="+", default=[], help="Trace CSVs to pack (route name = file name)")
+    ap.add_argument("--out", default=None, help="Bundle to write (*" + SUFFIX + ")")
+    ap.add_argument("--list", default=None, metavar="BUNDLE", help="Print the route directory of a bundle")
+    ap.add_argument("--routes", nargs="+", default=None, help="(list) route names or fnmatch patterns")
+    ap.add_argument("--rebuild", action="store_true", help="(list) rebuild the route directory")
+    args = ap.parse_args()
+
+    if args.list:
+        index = open_bundle(Path(args.list), rebuild=args.rebuild)
+        for r in index.select(args.routes):
+            print(f"{r.name}  rows={r.rows}  bytes={r.start}-{r.end}")
+        return
+    if not args.inputs or not args.out or not is_bundle(Path(args.out)):
+        raise SystemExit(f"give --in traces and --out NAME{SUFFIX} (or --list BUNDLE)")
+
+    paths = [Path(p) for p in args.inputs]
+    header = None
+    for p in paths:
+        with p.open("r", newline="", encoding="utf-8") as f:
+            cols = next(csv.reader(f), None)
+        if header is None:
+            header = cols
+        elif cols != header:
+            raise SystemExit(f"{p.as_posix()}: columns differ from {paths[0].as_posix()}; a bundle has one header")
+
+    def rows_of(p: Path):
+        with p.open("r", newline="", encoding="utf-8") as f:
+            rdr = csv.reader(f)
+            next(rdr, None)
+            yield from (row for row in rdr if row)
+
+    index = write_bundle(Path(args.out), header or [], ((p.name, rows_of(p)) for p in paths))
+    print(f"WROTE {Path(args.out).as_posix()} ({len(index.routes)} routes)")
+
+
+if __name__ == "__main__":
+    main()
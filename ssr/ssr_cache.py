@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 1 << 30
+ENTRY_SUFFIX = ".ssrbc"
+STAMP_SUFFIX = ".json"
+# A put that takes the cache over max_bytes trims it to this fraction, so a full cache is scanned
+# once per tenth of its capacity written rather than on every put.
+EVICT_TO = 0.9
+
+_MAGIC = b"SSRBC1\0\0"
+_HEADER = struct.Struct("<8sQQQ")
+
+
+def content_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with Path(path).open("rb") as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def _pad8(n: int) -> int:
+    return (8 - n % 8) % 8
+
+
+def _to_le_bytes(values: Sequence[float]) -> bytes:
+    if hasattr(values, "dtype"):
+        return values.astype("<f8", copy=False).tobytes()
+    buf = values if isinstance(values, array) and values.typecode == "d" else array("d", values)
+    if sys.byteorder != "little":
+        buf = array("d", buf)
+        buf.byteswap()
+    return buf.tobytes()
+
+
+class BaseCache:
+    """On-disk cache of base route metrics plus sorted step costs and sorted (non-NaN) a-values.
+
+    Entries are keyed by (resolved path, content hash, eps, engine variant), so any change to the
+    trace or to parameters that affect compute_base misses. The content hash of a trace is
+    remembered under its (size, mtime) stamp in stamps/, so a lookup only re-reads the trace when
+    the stamp changed. Gate parameters are not part of the key: gating is answered from the sorted
+    arrays.
+
+    Entries and stamp memos both count against max_bytes and are evicted least recently used first
+    (hits refresh their mtime). The directory is scanned when the cache is opened; after that the
+    size is tracked as entries are written, and a put that goes over max_bytes trims the directory
+    to EVICT_TO of it. Other processes writing the same directory are seen at their next scan.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.dir = Path(cache_dir)
+        self.stamps = self.dir / "stamps"
+        self.stamps.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.total = 0
+        self.evict()
+
+    def trace_hash(self, path: Path) -> str:
+        """content_hash(path), reused while the trace's size and mtime are unchanged."""
+        path = Path(path).resolve()
+        st = path.stat()
+        stamp = [st.st_size, st.st_mtime_ns]
+        memo = self.stamps / (hashlib.blake2b(str(path).encode("utf-8"), digest_size=16).hexdigest() + STAMP_SUFFIX)
+        try:
+            saved = json.loads(memo.read_text(encoding="utf-8"))
+            if saved["path"] == str(path) and saved["stamp"] == stamp:
+                os.utime(memo)
+                return saved["hash"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        digest = content_hash(path)
+        data = json.dumps({"path": str(path), "stamp": stamp, "hash": digest}).encode("utf-8")
+        tmp = memo.with_name(memo.name + f".tmp{os.getpid()}")
+        old = _size(memo)
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, memo)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+        else:
+            self._grew(len(data) - old)
+        return digest
+
+    def key_for(self, path: Path, eps: float, variant: str) -> str:
+        ident = [CACHE_VERSION, str(Path(path).resolve()), self.trace_hash(path), repr(float(eps)), variant]
+        return hashlib.blake2b(json.dumps(ident).encode("utf-8"), digest_size=20).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.dir / (key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[Tuple[Dict, Sequence[float], Sequence[float]]]:
+        p = self._entry(key)
+        try:
+            with p.open("rb") as f:
+                head = f.read(_HEADER.size)
+                magic, meta_len, n_steps, n_a = _HEADER.unpack(head)
+                if magic != _MAGIC:
+                    raise ValueError("bad cache entry")
+                meta = json.loads(f.read(meta_len).rstrip(b"\0").decode("utf-8"))
+                steps = self._read(f, n_steps)
+                a_sorted = self._read(f, n_a)
+            now = time.time_ns()
+            os.utime(p, ns=(now, now))
+        except (OSError, ValueError, EOFError, struct.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return meta, steps, a_sorted
+
+    @staticmethod
+    def _read(f, n: int) -> array:
+        col = array("d")
+        col.fromfile(f, n)
+        if sys.byteorder != "little":
+            col.byteswap()
+        return col
+
+    def put(self, key: str, meta: Dict, steps_sorted: Sequence[float], a_sorted: Sequence[float]) -> None:
+        meta_bytes = json.dumps(meta).encode("utf-8")
+        meta_bytes += b"\0" * _pad8(len(meta_bytes))
+        entry = self._entry(key)
+        old = _size(entry)
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, len(meta_bytes), len(steps_sorted), len(a_sorted)))
+                f.write(meta_bytes)
+                f.write(_to_le_bytes(steps_sorted))
+                f.write(_to_le_bytes(a_sorted))
+                size = f.tell()
+            os.replace(tmp, entry)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._grew(size - old)
+
+    def _grew(self, n: int) -> None:
+        self.total += n
+        if self.total > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def evict(self, target: Optional[int] = None) -> int:
+        """Scan the directory and remove the least recently used entries and stamp memos until
+        their total is at most target (default max_bytes); returns how many files were removed."""
+        target = self.max_bytes if target is None else target
+        files = []
+        total = 0
+        for p in (*self.dir.glob("*" + ENTRY_SUFFIX), *self.stamps.glob("*" + STAMP_SUFFIX)):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime_ns, -st.st_size, p))
+            total += st.st_size
+
+        removed = 0
+        files.sort()
+        for _, neg_size, p in files:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total += neg_size
+            removed += 1
+        self.total = total
+        return removed
@@ -0,0 +1,226 @@
+"""SSR columnar trace format (.ssrc).
+
+Layout (little-endian):
+    magic    8s   b"SSRCOL1\\0"
+    version  u32
+    ncols    u32
+    nrows    u64
+    meta_len u64  length of the UTF-8 JSON block that follows, zero-padded to 8 bytes
+    meta          {"columns": [...], "categories": {column: [labels...]}, "malformed": {column: n}}
+    data          ncols contiguous float64 columns of nrows values each, in header order
+
+Numeric cells are stored the way the router parses them, so a reader can hand the columns
+straight to the engine: a missing/malformed 'k' becomes the row index, 'u', 'v', 's', 'dx'
+become 0.0, 'a' becomes NaN when ('u','v') are present (0.0 otherwise), and any other numeric
+column becomes NaN. The router's columns (ROUTER_COLUMNS) are always numeric; their missing and
+malformed cells are counted per column in meta["malformed"], so a run over the .ssrc reports the
+same validation counts as one over the CSV. Any other column with a non-numeric cell anywhere in the
+trace (e.g. 'event') is a text column, stored as float codes into meta["categories"].
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+MAGIC = b"SSRCOL1\0"
+VERSION = 1
+SUFFIX = ".ssrc"
+_HEADER = struct.Struct("<8sIIQQ")
+_FLUSH_ROWS = 1 << 16
+
+# Columns the router reads as numbers, whatever their first cells look like.
+ROUTER_COLUMNS = frozenset({"k", "u", "v", "a", "s", "dx"})
+
+
+def is_columnar(path: Path) -> bool:
+    return Path(path).suffix == SUFFIX
+
+
+def _to_float(x, default):
+    try:
+        return float(x)
+    except Exception:
+        return default
+
+
+def _pad8(n: int) -> int:
+    return (8 - n % 8) % 8
+
+
+def _little_endian(buf: array) -> bytes:
+    if sys.byteorder != "little":
+        buf = array("d", buf)
+        buf.byteswap()
+    return buf.tobytes()
+
+
+def write_columnar(path: Path, headers: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """Write rows to a columnar trace in bounded memory; returns the number of rows written.
+
+    Columns outside ROUTER_COLUMNS are spilled both as numbers and as category codes until the
+    whole column has been seen, then written as whichever applies.
+    """
+    headers = [str(h) for h in headers]
+    ncols = len(headers)
+    pos = {h: i for i, h in enumerate(headers)}
+    has_uv = "u" in pos and "v" in pos
+    zero_default = {"u", "v", "s", "dx"} | (set() if has_uv else {"a"})
+
+    nan = float("nan")
+    maybe_text = [h not in ROUTER_COLUMNS for h in headers]
+    text_cols = [False] * ncols
+    malformed: Dict[str, int] = {}
+    categories: List[Dict[str, int]] = [{} for _ in headers]
+    spills = [tempfile.TemporaryFile() for _ in headers]
+    code_spills = [tempfile.TemporaryFile() if t else None for t in maybe_text]
+    bufs = [array("d") for _ in headers]
+    code_bufs = [array("d") if t else None for t in maybe_text]
+    nrows = 0
+
+    def flush():
+        for i in range(ncols):
+            spills[i].write(_little_endian(bufs[i]))
+            del bufs[i][:]
+            if code_bufs[i] is not None:
+                code_spills[i].write(_little_endian(code_bufs[i]))
+                del code_bufs[i][:]
+
+    try:
+        for row in rows:
+            if not row:
+                continue
+            for i, h in enumerate(headers):
+                cell = row[i] if i < len(row) else None
+                if maybe_text[i]:
+                    cats = categories[i]
+                    label = "" if cell is None else str(cell)
+                    code = cats.get(label)
+                    if code is None:
+                        code = cats[label] = len(cats)
+                    code_bufs[i].append(float(code))
+                    value = _to_float(cell, None)
+                    if value is None:
+                        if label:
+                            text_cols[i] = True
+                        value = nan
+                    bufs[i].append(value)
+                else:
+                    value = _to_float(cell, None)
+                    if value is None:
+                        malformed[h] = malformed.get(h, 0) + 1
+                        value = float(nrows) if h == "k" else 0.0 if h in zero_default else nan
+                    elif h in zero_default:
+                        value = value or 0.0
+                    bufs[i].append(value)
+            nrows += 1
+            if nrows % _FLUSH_ROWS == 0:
+                flush()
+        flush()
+
+        meta = {
+            "columns": headers,
+            "categories": {headers[i]: list(categories[i]) for i in range(ncols) if text_cols[i]},
+            "malformed": malformed,
+        }
+        meta_bytes = json.dumps(meta).encode("utf-8")
+        meta_bytes += b"\0" * _pad8(len(meta_bytes))
+
+        with Path(path).open("wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, ncols, nrows, len(meta_bytes)))
+            f.write(meta_bytes)
+            for i in range(ncols):
+                spill = code_spills[i] if text_cols[i] else spills[i]
+                spill.seek(0)
+                shutil.copyfileobj(spill, f, 1 << 20)
+    finally:
+        for spill in spills + code_spills:
+            if spill is not None:
+                spill.close()
+    return nrows
+
+
+def convert_csv(src: Path, dst: Path) -> int:
+    with Path(src).open("r", newline="", encoding="utf-8") as f:
+        rdr = csv.reader(f)
+        headers = next(rdr, None)
+        if headers is None:
+            raise SystemExit(f"Empty CSV: {Path(src).as_posix()}")
+        return write_columnar(dst, headers, rdr)
+
+
+class ColumnarTrace:
+    """Memory-mapped columnar trace; column() returns zero-copy float64 views into the map.
+
+    The mapping stays alive as long as any returned view does, so views may outlive this object.
+    malformed holds the missing/malformed cell counts of the router's columns in the source rows.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                raise SystemExit(f"Not an SSR columnar trace: {self.path.as_posix()}")
+            magic, version, ncols, nrows, meta_len = _HEADER.unpack(head)
+            if magic != MAGIC or version != VERSION:
+                raise SystemExit(f"Not an SSR columnar trace (v{VERSION}): {self.path.as_posix()}")
+            meta = json.loads(f.read(meta_len).rstrip(b"\0").decode("utf-8"))
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.columns: List[str] = list(meta["columns"])
+        self.categories: Dict[str, List[str]] = dict(meta.get("categories", {}))
+        self.malformed: Dict[str, int] = dict(meta.get("malformed", {}))
+        self.nrows = int(nrows)
+        self._data_offset = _HEADER.size + meta_len
+        expected = self._data_offset + 8 * ncols * self.nrows
+        if len(self._mm) < expected:
+            raise SystemExit(f"Truncated SSR columnar trace: {self.path.as_posix()}")
+        self._pos = {name: i for i, name in enumerate(self.columns)}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._pos
+
+    def offset(self, name: str) -> int:
+        return self._data_offset + 8 * self.nrows * self._pos[name]
+
+    def column(self, name: str):
+        off = self.offset(name)
+        view = memoryview(self._mm)[off:off + 8 * self.nrows]
+        if sys.byteorder != "little":
+            col = array("d", view.tobytes())
+            col.byteswap()
+            return col
+        return view.cast("d")
+
+    def numpy_column(self, name: str):
+        import numpy as np
+        return np.frombuffer(self._mm, dtype="<f8", count=self.nrows, offset=self.offset(name))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert route trace CSVs to the SSR columnar format")
+    ap.add_argument("--in", dest="inputs", nargs="+", required=True, help="One or more route trace CSVs")
+    ap.add_argument("--out_dir", default=None, help="Output directory (default: next to each input)")
+    args = ap.parse_args()
+
+    for p in args.inputs:
+        src = Path(p)
+        if not src.exists():
+            raise SystemExit(f"Not found: {p}")
+        out_dir = Path(args.out_dir) if args.out_dir else src.parent
+        out_dir.mkdir(parents=True, exist_ok=True)
+        dst = out_dir / (src.stem + SUFFIX)
+        n = convert_csv(src, dst)
+        print("WROTE", dst.as_posix(), f"({n} rows)")
+
+
+if __name__ == "__main__":
+    main()
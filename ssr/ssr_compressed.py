@@ -0,0 +1,108 @@
+"""Streaming input of compressed CSV traces (.csv.gz, .csv.bz2, .csv.xz).
+
+open_text() / open_binary() open any CSV trace; compressed ones are decompressed on the fly, never
+to disk. Decompression runs in a background thread that keeps a bounded queue of decompressed
+blocks ahead of the reader, so it overlaps with parsing: zlib, bz2 and lzma release the GIL while
+they work. Memory stays bounded at about (depth + 1) blocks per open trace.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+from pathlib import Path
+from typing import BinaryIO, TextIO
+
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+SUFFIXES = tuple(OPENERS)
+
+BLOCK = 1 << 20
+DEPTH = 4
+
+
+def is_compressed(path: Path) -> bool:
+    return Path(path).suffix.lower() in OPENERS
+
+
+class PrefetchReader(io.RawIOBase):
+    """Raw binary stream of a compressed file, decompressed ahead of the reader by a thread."""
+
+    def __init__(self, path: Path, block: int = BLOCK, depth: int = DEPTH):
+        super().__init__()
+        self.path = Path(path)
+        self._src = OPENERS[self.path.suffix.lower()](self.path, "rb")
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, depth))
+        self._buf = memoryview(b"")
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, args=(block,), name="ssr-decompress", daemon=True)
+        self._thread.start()
+
+    def _fill(self, block: int) -> None:
+        # Whatever ends the thread, the reader gets a sentinel: b"" at EOF, else the exception
+        # (zlib.error, OSError, EOFError, LZMAError, ...), which readinto() re-raises.
+        end = b""
+        try:
+            while not self._stop.is_set():
+                data = self._src.read(block)
+                if not data:
+                    break
+                self._put(data)
+        except Exception as e:
+            end = e
+        finally:
+            self._put(end)
+
+    def _put(self, item) -> None:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                self._eof = True
+                raise SystemExit(f"Cannot decompress {self.path.as_posix()}: {item}") from item
+            if not item:
+                self._eof = True
+                return 0
+            self._buf = memoryview(item)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._src.close()
+        super().close()
+
+
+def open_binary(path: Path, prefetch: bool = True) -> BinaryIO:
+    path = Path(path)
+    if not is_compressed(path):
+        return path.open("rb")
+    if not prefetch:
+        return OPENERS[path.suffix.lower()](path, "rb")
+    return io.BufferedReader(PrefetchReader(path), BLOCK)
+
+
+def open_text(path: Path, prefetch: bool = True) -> TextIO:
+    """Text stream for csv.reader (utf-8, newline='')."""
+    path = Path(path)
+    if not is_compressed(path):
+        return path.open("r", newline="", encoding="utf-8")
+    return io.TextIOWrapper(open_binary(path, prefetch), encoding="utf-8", newline="")
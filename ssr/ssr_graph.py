@@ -0,0 +1,272 @@
+"""Gated shortest-path routing over a graph of segment traces.
+
+A manifest CSV lists one edge per row: `src,dst,trace` (trace paths relative to the manifest).
+Every distinct trace is evaluated once with the router's engine and gates; denied segments are
+removed from the graph, and paths over the admissible ones are ranked by summed L_struct
+(Dijkstra for the best path, Yen for the k best loopless paths).
+"""
+
+import argparse
+import csv
+import heapq
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from ssr_structural_safety_routing import (
+    PROFILES,
+    EngineConfig,
+    GateConfig,
+    RouteMetrics,
+    add_gate_args,
+    gate_from_args,
+    iter_evaluate,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Adjacency: node -> [(L_struct, dst, edge id)], admissible edges only.
+Adjacency = Dict[str, List[Tuple[float, str, int]]]
+
+
+@dataclass
+class Edge:
+    src: str
+    dst: str
+    trace: Path
+    metrics: Optional[RouteMetrics] = None
+
+    @property
+    def cost(self) -> float:
+        return self.metrics.L_struct
+
+
+@dataclass
+class GraphPath:
+    edges: Tuple[int, ...]
+    L_struct: float
+
+
+def read_manifest(path: Path, undirected: bool = False) -> List[Edge]:
+    path = Path(path)
+    with path.open("r", newline="", encoding="utf-8") as f:
+        rdr = csv.DictReader(f)
+        missing = {"src", "dst", "trace"} - set(rdr.fieldnames or [])
+        if missing:
+            raise SystemExit(f"{path.as_posix()}: manifest needs columns src,dst,trace (missing {sorted(missing)})")
+        edges = []
+        for row in rdr:
+            trace = Path(row["trace"])
+            if not trace.is_absolute():
+                trace = path.parent / trace
+            edges.append(Edge(row["src"], row["dst"], trace))
+    if undirected:
+        # Reversed canonical traces have the same step costs, so the same L_struct and (without
+        # rel_window) the same gate outcome; main() rejects the other combinations.
+        edges += [Edge(e.dst, e.src, e.trace) for e in edges]
+    return edges
+
+
+def evaluate_edges(edges: Sequence[Edge], gate: GateConfig, ecfg: EngineConfig, workers: int = 1) -> int:
+    """Attach gated metrics to every edge, evaluating each distinct trace once; returns the trace count."""
+    traces = list(dict.fromkeys(e.trace for e in edges))
+    for p in traces:
+        if not p.exists():
+            raise SystemExit(f"Not found: {p.as_posix()}")
+    by_trace = dict(zip(traces, iter_evaluate(traces, gate, ecfg, workers)))
+    for e in edges:
+        e.metrics = by_trace[e.trace]
+    return len(traces)
+
+
+def build_adjacency(edges: Sequence[Edge]) -> Adjacency:
+    adj: Adjacency = {}
+    for i, e in enumerate(edges):
+        if not e.metrics.denied and e.src != e.dst:
+            adj.setdefault(e.src, []).append((e.cost, e.dst, i))
+    return adj
+
+
+def distances_to(adj: Adjacency, target: str) -> Dict[str, float]:
+    """Minimum cost from every node that can reach target (Dijkstra over reversed edges)."""
+    radj: Dict[str, List[Tuple[float, str]]] = {}
+    for node, out in adj.items():
+        for cost, nxt, _ in out:
+            radj.setdefault(nxt, []).append((cost, node))
+    dist = {target: 0.0}
+    heap = [(0.0, target)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for cost, prev in radj.get(node, ()):
+            nd = d + cost
+            if nd < dist.get(prev, math.inf):
+                dist[prev] = nd
+                heapq.heappush(heap, (nd, prev))
+    return dist
+
+
+def shortest_path(adj: Adjacency, source: str, target: str, banned_edges: Set[int] = frozenset(),
+                  banned_nodes: Set[str] = frozenset(),
+                  to_target: Optional[Dict[str, float]] = None) -> Optional[Tuple[float, List[int]]]:
+    """(cost, edge ids) of a minimum-cost path, or None. Which of several equal-cost paths is returned is unspecified.
+
+    to_target (distances_to on adj, or on any supergraph) turns the search into A*: banning edges
+    and nodes only lengthens paths, so those distances stay a consistent lower bound, and nodes
+    without one cannot reach the target at all.
+    """
+    dist = {source: 0.0}
+    via: Dict[str, Tuple[str, int]] = {}
+    h = to_target.get if to_target is not None else (lambda node, default: 0.0)
+    heap = [(h(source, math.inf), 0.0, source)]
+    done: Set[str] = set()
+    while heap:
+        _, d, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        if node == target:
+            path = []
+            while node != source:
+                node, edge = via[node]
+                path.append(edge)
+            path.reverse()
+            return d, path
+        done.add(node)
+        for cost, nxt, edge in adj.get(node, ()):
+            if edge in banned_edges or nxt in banned_nodes or nxt in done:
+                continue
+            rest = h(nxt, None)
+            if rest is None:
+                continue
+            nd = d + cost
+            if nd < dist.get(nxt, math.inf):
+                dist[nxt] = nd
+                via[nxt] = (node, edge)
+                heapq.heappush(heap, (nd + rest, nd, nxt))
+    return None
+
+
+def k_shortest_paths(adj: Adjacency, edges: Sequence[Edge], source: str, target: str, k: int) -> List[GraphPath]:
+    """Up to k loopless paths in increasing L_struct (Yen's algorithm)."""
+    if source == target:
+        return [GraphPath((), 0.0)]
+
+    def cost_of(ids) -> float:
+        return math.fsum(edges[i].cost for i in ids)
+
+    to_target = distances_to(adj, target)
+    if source not in to_target:
+        return []
+    first = shortest_path(adj, source, target, to_target=to_target)
+    if first is None:
+        return []
+    found = [GraphPath(tuple(first[1]), cost_of(first[1]))]
+    seen = {found[0].edges}
+    candidates: List[Tuple[float, Tuple[int, ...]]] = []
+
+    while len(found) < k:
+        prev = found[-1].edges
+        nodes = [source] + [edges[i].dst for i in prev]
+        for i in range(len(prev)):
+            root = prev[:i]
+            banned_edges = {p.edges[i] for p in found if p.edges[:i] == root and len(p.edges) > i}
+            spur = shortest_path(adj, nodes[i], target, banned_edges, set(nodes[:i]), to_target)
+            if spur is None:
+                continue
+            total = root + tuple(spur[1])
+            if total not in seen:
+                seen.add(total)
+                heapq.heappush(candidates, (cost_of(total), total))
+        if not candidates:
+            break
+        cost, ids = heapq.heappop(candidates)
+        found.append(GraphPath(ids, cost))
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Route over a graph of segment traces: gate every segment, "
+                                             "then find the k lowest-L_struct admissible paths")
+    ap.add_argument("--manifest", required=True, help="CSV with columns src,dst,trace (one edge per row)")
+    ap.add_argument("--source", required=True)
+    ap.add_argument("--target", required=True)
+    ap.add_argument("--k", type=int, default=1, help="Number of paths (k shortest loopless, Yen)")
+    ap.add_argument("--undirected", action="store_true", help="Each segment can also be traversed dst -> src")
+
+    add_gate_args(ap)
+    ap.add_argument("--eps", type=float, default=1e-12)
+    ap.add_argument("--metric_profile", choices=list(PROFILES), default="canonical")
+    ap.add_argument("--engine", choices=["python", "stream", "numpy"], default="python")
+    ap.add_argument("--cache_dir", "--cache-dir", dest="cache_dir", default=None)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--out", default="ssr_graph_paths.csv", help="Paths CSV")
+    ap.add_argument("--edges_out", default=None, help="Also write per-edge metrics and gate outcomes")
+    args = ap.parse_args()
+
+    if args.k < 1:
+        raise SystemExit("--k must be >= 1")
+    if args.engine == "numpy" and np is None:
+        args.engine = "python"
+
+    gate = gate_from_args(args)
+    if args.undirected and (args.metric_profile != "canonical" or gate.step_spike_mode == "rel_window"):
+        raise SystemExit("--undirected needs --metric_profile canonical and a direction-free spike gate "
+                         "(not rel_window)")
+    ecfg = EngineConfig(engine=args.engine, eps=args.eps, cache_dir=args.cache_dir, profile=args.metric_profile)
+
+    edges = read_manifest(Path(args.manifest), args.undirected)
+    n_traces = evaluate_edges(edges, gate, ecfg, max(1, args.workers))
+    adj = build_adjacency(edges)
+    paths = k_shortest_paths(adj, edges, args.source, args.target, args.k)
+
+    denied: Dict[str, int] = {}
+    for e in edges:
+        if e.metrics.denied:
+            key = e.metrics.deny_class if PROFILES[args.metric_profile].deny_classes else "DENIED"
+            denied[key] = denied.get(key, 0) + 1
+
+    out_path = Path(args.out)
+    with out_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["rank", "L_struct", "hops", "nodes", "traces"])
+        for rank, p in enumerate(paths, 1):
+            nodes = [args.source] + [edges[i].dst for i in p.edges]
+            w.writerow([rank, p.L_struct, len(p.edges), ">".join(nodes),
+                        ";".join(edges[i].trace.as_posix() for i in p.edges)])
+
+    if args.edges_out:
+        with Path(args.edges_out).open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["src", "dst", "trace", "denied", "deny_reason", "L_struct", "eta", "max_step"])
+            for e in edges:
+                m = e.metrics
+                w.writerow([e.src, e.dst, e.trace.as_posix(), m.denied, m.deny_reason, m.L_struct, m.eta, m.max_step])
+
+    print("SSUM-SSR — Graph routing (deterministic, observation-only)")
+    print(f"Gate: a_min={gate.a_min} | spike_mode={gate.step_spike_mode} | deny_mode={gate.deny_mode}")
+    n_denied = sum(denied.values())
+    detail = ", ".join(f"{k}={v}" for k, v in sorted(denied.items()))
+    print(f"Edges: {len(edges)} ({n_traces} traces) | admissible: {len(edges) - n_denied} | "
+          f"denied: {n_denied}" + (f" ({detail})" if detail else ""))
+    print("")
+    if not paths:
+        print(f"NO ADMISSIBLE PATH {args.source} -> {args.target}")
+    for rank, p in enumerate(paths, 1):
+        nodes = [args.source] + [edges[i].dst for i in p.edges]
+        print(f"{rank:02d}  L_struct={p.L_struct:.6g}  hops={len(p.edges)}  {' > '.join(nodes)}")
+        for i in p.edges:
+            e = edges[i]
+            print(f"    {e.src} -> {e.dst}  {e.trace.name}  L_struct={e.cost:.6g}")
+    print("")
+    print(f"WROTE {out_path.as_posix()}")
+    if args.edges_out:
+        print(f"WROTE {Path(args.edges_out).as_posix()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""Per-route segment index (.ssri) for sub-route queries without rescanning the trace.
+
+For a trace with n rows, step t joins rows t and t+1. The index stores, next to the trace
+(`<trace>.ssri`), little-endian:
+    magic    8s   b"SSRIDX1\\0"
+    meta_len u64  length of the UTF-8 JSON block that follows, zero-padded to 8 bytes
+    n        u64  rows
+    n_runs_a u64  permission-violation runs
+    n_runs_s u64  spike-violation runs
+    meta          trace fingerprint, eps, metric profile, gate, route-level spike threshold
+    data          float64: coord[n], step prefix sums[n], |coord| prefix sums[n + 1],
+                  min-a segment tree[2n], max-step segment tree[2(n - 1)]
+                  int64: start, end and preceding-length arrays of each run list
+
+A query over rows [i, j] (inclusive) answers the same L_struct, progress, eta, min a and max step
+as a trace cut to those rows, plus the gate decision and the first violating row, in O(log n).
+Spike thresholds (rel_p95, rel_median) and rel_window histories are those of the whole route,
+so a segment is judged exactly as its steps are judged when the whole route is evaluated.
+"""
+
+import argparse
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ssr_cache import content_hash
+from ssr_structural_safety_routing import (
+    PROFILES,
+    GateConfig,
+    RouteMetrics,
+    add_gate_args,
+    apply_gates,
+    compute_columns,
+    gate_from_args,
+    load_columns,
+    spike_threshold,
+    window_violation_steps,
+)
+
+INDEX_VERSION = 1
+SUFFIX = ".ssri"
+
+_MAGIC = b"SSRIDX1\0"
+_HEADER = struct.Struct("<8sQQQQ")
+_INF = float("inf")
+
+
+@dataclass
+class SegmentMetrics:
+    route: str
+    start: int
+    end: int
+    rows: int
+
+    progress: float
+    L_struct: float
+    eta: float
+
+    a_min_seen: float
+    max_step: float
+
+    deny_count_a: int
+    deny_count_step: int
+    first_violation: Optional[int]
+    denied: int
+    deny_reason: str
+
+
+def index_path(trace: Path) -> Path:
+    trace = Path(trace)
+    return trace.with_name(trace.name + SUFFIX)
+
+
+def _pad8(n: int) -> int:
+    return (8 - n % 8) % 8
+
+
+def _le_bytes(buf: array) -> bytes:
+    if sys.byteorder != "little":
+        buf = array(buf.typecode, buf)
+        buf.byteswap()
+    return buf.tobytes()
+
+
+def _tree(leaves: Sequence[float], op) -> array:
+    # Iterative segment tree: leaves at [n, 2n), node p = op(2p, 2p + 1).
+    n = len(leaves)
+    tree = array("d", bytes(8 * n)) + array("d", leaves)
+    for p in range(n - 1, 0, -1):
+        tree[p] = op(tree[2 * p], tree[2 * p + 1])
+    return tree
+
+
+def _tree_query(tree, n: int, lo: int, hi: int, op, empty: float) -> float:
+    # op over leaves [lo, hi]
+    res = empty
+    lo += n
+    hi += n + 1
+    while lo < hi:
+        if lo & 1:
+            res = op(res, tree[lo])
+            lo += 1
+        if hi & 1:
+            hi -= 1
+            res = op(res, tree[hi])
+        lo >>= 1
+        hi >>= 1
+    return res
+
+
+def _runs(positions) -> Tuple[array, array, array]:
+    # Run-length intervals [start, end] of ascending positions, and the run lengths before each.
+    starts, ends, before = array("q"), array("q"), array("q")
+    total = 0
+    for x in positions:
+        if ends and x == ends[-1] + 1:
+            ends[-1] = x
+            continue
+        if ends:
+            total += ends[-1] - starts[-1] + 1
+        starts.append(x)
+        ends.append(x)
+        before.append(total)
+    return starts, ends, before
+
+
+def _runs_query(starts, ends, before, lo: int, hi: int) -> Tuple[int, Optional[int]]:
+    # (positions inside [lo, hi], first such position)
+    r0 = bisect_left(ends, lo)
+    r1 = bisect_right(starts, hi)
+    if r0 >= r1:
+        return 0, None
+    last = r1 - 1
+    count = before[last] + (ends[last] - starts[last] + 1) - before[r0]
+    count -= max(0, lo - starts[r0]) + max(0, ends[last] - hi)
+    return count, max(starts[r0], lo)
+
+
+def fingerprint(trace: Path) -> Dict:
+    st = Path(trace).stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": content_hash(trace)}
+
+
+class RouteIndex:
+    """Segment index of one trace under one gate; build() scans the trace once, query() is O(log n)."""
+
+    def __init__(self, meta: Dict, arrays: Dict[str, Sequence]):
+        self.meta = meta
+        self.route: str = meta["route"]
+        self.n: int = meta["rows"]
+        self.profile = PROFILES[meta["profile"]]
+        self.gate = GateConfig(**meta["gate"])
+        self.thr: Optional[float] = meta["thr"]
+        self.__dict__.update(arrays)
+
+    @classmethod
+    def build(cls, trace: Path, gate: GateConfig, eps: float = 1e-12, profile: str = "canonical") -> "RouteIndex":
+        trace = Path(trace)
+        metrics = PROFILES[profile]
+        k_vals, u, v, a_vals = load_columns(trace, eps, {}, metrics)
+        rm, step_costs, a_vals = compute_columns(trace.name, k_vals, u, v, a_vals, metrics)
+        n = len(k_vals)
+
+        step_prefix = array("d", [0.0])
+        total = 0.0
+        for st in step_costs:
+            total += st
+            step_prefix.append(total)
+        abs_prefix = array("d", [0.0])
+        total = 0.0
+        for x in k_vals:
+            total += abs(x)
+            abs_prefix.append(total)
+
+        a_leaves = array("d", (av if av == av else _INF for av in a_vals))
+        if rm.a_min_seen == rm.a_min_seen:
+            a_runs = _runs(i for i, av in enumerate(a_vals) if av < gate.a_min)
+        else:
+            a_runs = _runs(())
+
+        thr = spike_threshold(gate, rm)
+        if thr is not None:
+            s_runs = _runs(t for t, st in enumerate(step_costs) if st > thr)
+        elif gate.step_spike_mode == "rel_window":
+            s_runs = _runs(window_violation_steps(step_costs, gate))
+        else:
+            s_runs = _runs(())
+
+        meta = {
+            "version": INDEX_VERSION,
+            "route": trace.name,
+            "rows": n,
+            "trace": fingerprint(trace),
+            "eps": repr(float(eps)),
+            "profile": profile,
+            "gate": asdict(gate),
+            "thr": thr,
+            "a_gated": rm.a_min_seen == rm.a_min_seen,
+        }
+        arrays = {
+            "coord": array("d", k_vals),
+            "step_prefix": step_prefix[:n],
+            "abs_prefix": abs_prefix,
+            "min_a": _tree(a_leaves, min),
+            "max_step": _tree(step_costs, max),
+            "a_starts": a_runs[0], "a_ends": a_runs[1], "a_before": a_runs[2],
+            "s_starts": s_runs[0], "s_ends": s_runs[1], "s_before": s_runs[2],
+        }
+        return cls(meta, arrays)
+
+    _LAYOUT = (("coord", "d", 0, 0), ("step_prefix", "d", 0, 0), ("abs_prefix", "d", 0, 1),
+               ("min_a", "d", 1, 0), ("max_step", "d", 1, -1),
+               ("a_starts", "q", 2, 0), ("a_ends", "q", 2, 0), ("a_before", "q", 2, 0),
+               ("s_starts", "q", 3, 0), ("s_ends", "q", 3, 0), ("s_before", "q", 3, 0))
+
+    @staticmethod
+    def _length(kind: int, extra: int, n: int, n_runs_a: int, n_runs_s: int) -> int:
+        # kind 0: n + extra values; 1: segment tree over n + extra leaves; 2/3: run arrays
+        if kind == 0:
+            return n + extra
+        if kind == 1:
+            return 2 * max(0, n + extra)
+        return n_runs_a if kind == 2 else n_runs_s
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        meta_bytes = json.dumps(self.meta).encode("utf-8")
+        meta_bytes += b"\0" * _pad8(len(meta_bytes))
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, len(meta_bytes), self.n, len(self.a_starts), len(self.s_starts)))
+                f.write(meta_bytes)
+                for name, _, _, _ in self._LAYOUT:
+                    f.write(_le_bytes(getattr(self, name)))
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> "RouteIndex":
+        """Memory-map a saved index; raises ValueError when the file is not a usable index."""
+        path = Path(path)
+        with path.open("rb") as f:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                raise ValueError(f"Not an SSR segment index: {path.as_posix()}")
+            magic, meta_len, n, n_runs_a, n_runs_s = _HEADER.unpack(head)
+            if magic != _MAGIC:
+                raise ValueError(f"Not an SSR segment index: {path.as_posix()}")
+            meta = json.loads(f.read(meta_len).rstrip(b"\0").decode("utf-8"))
+            if meta.get("version") != INDEX_VERSION:
+                raise ValueError(f"SSR segment index version mismatch: {path.as_posix()}")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        off = _HEADER.size + meta_len
+        arrays = {}
+        for name, typecode, kind, extra in cls._LAYOUT:
+            count = cls._length(kind, extra, n, n_runs_a, n_runs_s)
+            if off + 8 * count > len(mm):
+                raise ValueError(f"Truncated SSR segment index: {path.as_posix()}")
+            view = memoryview(mm)[off:off + 8 * count]
+            if sys.byteorder != "little":
+                col = array(typecode, view.tobytes())
+                col.byteswap()
+                arrays[name] = col
+            else:
+                arrays[name] = view.cast(typecode)
+            off += 8 * count
+        return cls(meta, arrays)
+
+    def matches(self, trace: Path, gate: GateConfig, eps: float, profile: str) -> bool:
+        """True when the index was built from this trace content with these settings."""
+        if (self.meta["eps"], self.meta["profile"], self.meta["gate"]) != (repr(float(eps)), profile, asdict(gate)):
+            return False
+        saved = self.meta["trace"]
+        st = Path(trace).stat()
+        if (saved["size"], saved["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return True
+        return saved["size"] == st.st_size and saved["hash"] == content_hash(trace)
+
+    def query(self, start: int, end: int) -> SegmentMetrics:
+        """Metrics and gate decision of rows [start, end] (inclusive)."""
+        n = self.n
+        if not 0 <= start <= end < n:
+            raise ValueError(f"Row range [{start}, {end}] outside 0..{n - 1}")
+        rows = end - start + 1
+        L_steps = self.step_prefix[end] - self.step_prefix[start]
+        L_classical = self.abs_prefix[end + 1] - self.abs_prefix[start] if self.profile.delta_coord else 0.0
+        progress, L_struct, eta = self.profile.totals(self.coord[start], self.coord[end], L_steps, L_classical)
+
+        a_min_seen = _tree_query(self.min_a, n, start, end, min, _INF)
+        if a_min_seen == _INF:
+            a_min_seen = float("nan")
+        max_step = _tree_query(self.max_step, n - 1, start, end - 1, max, 0.0) if end > start else 0.0
+
+        count_a, first_a = _runs_query(self.a_starts, self.a_ends, self.a_before, start, end)
+        count_s, first_s = (_runs_query(self.s_starts, self.s_ends, self.s_before, start, end - 1)
+                            if end > start else (0, None))
+        if first_s is not None:
+            first_s += 1  # a step violation is reported at the row it arrives at
+
+        firsts = [x for x in (first_a, first_s) if x is not None]
+
+        # Gate through the router's rules on a scratch record so reasons read the same.
+        r = RouteMetrics(route=self.route, rows=rows, progress=progress, L_struct=L_struct, eta=eta, denied=0,
+                         deny_reason="", deny_class="", a_min_seen=a_min_seen if self.meta["a_gated"] else math.nan,
+                         deny_count_a=0, median_step=math.nan, p95_step=math.nan, max_step=max_step,
+                         max_R=math.nan, max_Psi=math.nan)
+        apply_gates(r, self.gate, count_a, count_s, rows - 1, self.thr)
+
+        return SegmentMetrics(
+            route=self.route,
+            start=start,
+            end=end,
+            rows=rows,
+            progress=progress,
+            L_struct=L_struct,
+            eta=eta,
+            a_min_seen=a_min_seen,
+            max_step=max_step,
+            deny_count_a=count_a,
+            deny_count_step=count_s,
+            first_violation=min(firsts) if firsts else None,
+            denied=r.denied,
+            deny_reason=r.deny_reason,
+        )
+
+
+def open_index(trace: Path, gate: GateConfig, eps: float = 1e-12, profile: str = "canonical",
+               rebuild: bool = False) -> Tuple[RouteIndex, bool]:
+    """(index, built): the saved index next to the trace, rebuilt and saved when missing or stale."""
+    path = index_path(trace)
+    if not rebuild and path.exists():
+        try:
+            idx = RouteIndex.load(path)
+            if idx.matches(trace, gate, eps, profile):
+                return idx, False
+        except (OSError, ValueError, KeyError, TypeError, struct.error):
+            pass
+    idx = RouteIndex.build(trace, gate, eps, profile)
+    idx.save(path)
+    return idx, True
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build per-route segment indexes and query sub-route ranges")
+    ap.add_argument("--in", dest="inputs", nargs="+", required=True, help="Route traces (.csv or .ssrc)")
+    ap.add_argument("--range", dest="ranges", nargs=2, type=int, action="append", default=[],
+                    metavar=("START", "END"), help="Row range to query (0-based, inclusive); repeatable")
+
+    add_gate_args(ap)
+    ap.add_argument("--metric_profile", choices=list(PROFILES), default="canonical")
+    ap.add_argument("--eps", type=float, default=1e-12)
+
+    ap.add_argument("--rebuild", action="store_true", help="Rebuild indexes even when they are current")
+    ap.add_argument("--out", default=None, help="Also write the query results to this CSV")
+    args = ap.parse_args()
+
+    gate = gate_from_args(args)
+
+    results: List[SegmentMetrics] = []
+    for p in args.inputs:
+        trace = Path(p)
+        if not trace.exists():
+            raise SystemExit(f"Not found: {p}")
+        idx, built = open_index(trace, gate, args.eps, args.metric_profile, args.rebuild)
+        print(("INDEXED " if built else "INDEX OK ") + index_path(trace).as_posix() + f" ({idx.n} rows)")
+        for start, end in args.ranges:
+            try:
+                seg = idx.query(start, end)
+            except ValueError as e:
+                raise SystemExit(f"{trace.name}: {e}")
+            results.append(seg)
+            verdict = f"DENIED ({seg.deny_reason})" if seg.denied else "ALLOWED"
+            first = "-" if seg.first_violation is None else seg.first_violation
+            print(f"  [{start}, {end}]  L_struct={seg.L_struct:.6g}  eta={seg.eta:.6g}  "
+                  f"min_a={seg.a_min_seen:.6g}  max_step={seg.max_step:.6g}  first_violation={first}  {verdict}")
+
+    if args.out:
+        fields = list(SegmentMetrics.__dataclass_fields__)
+        with Path(args.out).open("w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            for seg in results:
+                row = asdict(seg)
+                row["first_violation"] = "" if seg.first_violation is None else seg.first_violation
+                w.writerow(row)
+        print(f"WROTE {Path(args.out).as_posix()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import heapq
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, deque
+from typing import Dict, Iterable
+
+DEFAULT_ALPHA = 1e-3
+DEFAULT_MAX_BUCKETS = 8192
+
+
+class QuantileSketch:
+    """Deterministic, mergeable relative-error quantile sketch for step costs.
+
+    Non-negative values are counted in logarithmic buckets (gamma**(i-1), gamma**i]
+    with gamma = (1 + alpha) / (1 - alpha); zeros are counted separately. Memory is
+    bounded by max_buckets regardless of how many values are added.
+
+    Error bound: while the bucket cap has not been hit, every order statistic
+    returned by value_at_rank() satisfies |est - exact| <= alpha * exact, and so
+    does percentile(), because it interpolates two such estimates with the same
+    non-negative weights as ssr_structural_safety_routing.percentile(). The minimum
+    and maximum are tracked exactly. When the cap is hit, the lowest buckets are
+    collapsed upward; only quantiles inside the collapsed range lose the bound.
+
+    Merging adds bucket counts, so a sketch built from any split of the data into
+    parts is identical to the sketch built from the whole, in any merge order.
+    """
+
+    __slots__ = ("alpha", "gamma", "log_gamma", "max_buckets", "buckets", "zero_count", "count", "min", "max")
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA, max_buckets: int = DEFAULT_MAX_BUCKETS):
+        if not (0.0 < alpha < 1.0):
+            raise ValueError(f"alpha must be in (0, 1): {alpha}")
+        self.alpha = float(alpha)
+        self.gamma = (1.0 + self.alpha) / (1.0 - self.alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max(2, int(max_buckets))
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def key(self, x: float) -> int:
+        return int(math.ceil(math.log(x) / self.log_gamma))
+
+    def bucket_value(self, key: int) -> float:
+        return 2.0 * math.exp(key * self.log_gamma) / (self.gamma + 1.0)
+
+    def add(self, x: float) -> None:
+        if x != x:
+            return
+        if x < 0.0:
+            raise ValueError(f"QuantileSketch only accepts non-negative values: {x}")
+        self.count += 1
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if x == 0.0:
+            self.zero_count += 1
+            return
+        k = self.key(x)
+        b = self.buckets
+        b[k] = b.get(k, 0) + 1
+        if len(b) > self.max_buckets:
+            self._collapse()
+
+    def update(self, values: Iterable[float]) -> None:
+        """Add many values at once: the same sketch as add() on each, at a fraction of the cost."""
+        vals = [x for x in values if x == x]
+        if not vals:
+            return
+        lo = min(vals)
+        if lo < 0.0:
+            raise ValueError(f"QuantileSketch only accepts non-negative values: {lo}")
+        self.count += len(vals)
+        if lo < self.min:
+            self.min = lo
+        hi = max(vals)
+        if hi > self.max:
+            self.max = hi
+        pos = [x for x in vals if x > 0.0]
+        self.zero_count += len(vals) - len(pos)
+        ceil, log, lg = math.ceil, math.log, self.log_gamma
+        b = self.buckets
+        for k, c in Counter([int(ceil(log(x) / lg)) for x in pos]).items():
+            b[k] = b.get(k, 0) + c
+        if len(b) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches with different alpha")
+        b = self.buckets
+        for k, c in other.buckets.items():
+            b[k] = b.get(k, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(b) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        keys = sorted(self.buckets)
+        extra = len(keys) - self.max_buckets
+        if extra <= 0:
+            return
+        target = keys[extra]
+        moved = 0
+        for k in keys[:extra]:
+            moved += self.buckets.pop(k)
+        self.buckets[target] += moved
+
+    def value_at_rank(self, rank: int) -> float:
+        if self.count == 0:
+            return 0.0
+        if rank <= 0:
+            return self.min
+        if rank >= self.count - 1:
+            return self.max
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if rank < seen:
+                return clamp_range(self.bucket_value(k), self.min, self.max)
+        return self.max
+
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        if p <= 0:
+            return self.min
+        if p >= 100:
+            return self.max
+        k = (self.count - 1) * (p / 100.0)
+        f = math.floor(k)
+        c = math.ceil(k)
+        if f == c:
+            return self.value_at_rank(int(k))
+        return self.value_at_rank(f) * (c - k) + self.value_at_rank(c) * (k - f)
+
+    def count_above(self, thr: float) -> int:
+        """Conservative count of values > thr: never undercounts, and only values
+        sharing thr's bucket (within a factor gamma below thr) can be overcounted."""
+        if self.count == 0 or not (self.max > thr):
+            return 0
+        if thr < 0.0:
+            return self.count
+        n = 0
+        kt = self.key(thr) if thr > 0.0 else None
+        for k, c in self.buckets.items():
+            if kt is None or k >= kt:
+                n += c
+        return max(1, n)
+
+
+def clamp_range(x: float, lo: float, hi: float) -> float:
+    if x < lo:
+        return lo
+    if x > hi:
+        return hi
+    return x
+
+
+class RollingQuantile:
+    """Percentile p of the last `window` values pushed, in O(log window) per push.
+
+    Two heaps split the window at the interpolation ranks of
+    ssr_structural_safety_routing.percentile(): with k = (window - 1) * p / 100, `lo` (a max-heap)
+    holds the floor(k) + 1 smallest values and `hi` (a min-heap) the rest, so both ranks are heap
+    tops. Evicted values are deleted lazily. Once the window is full, value() equals
+    percentile(sorted(window), p) exactly.
+    """
+
+    __slots__ = ("window", "p", "values", "lo", "hi", "lo_size", "hi_size", "delayed", "_k", "_f", "_c")
+
+    def __init__(self, window: int, p: float):
+        if window < 1:
+            raise ValueError(f"window must be >= 1: {window}")
+        self.window = int(window)
+        self.p = float(p)
+        k = (self.window - 1) * (self.p / 100.0)
+        if self.p <= 0:
+            k = 0.0
+        elif self.p >= 100:
+            k = float(self.window - 1)
+        self._k = k
+        self._f = math.floor(k)
+        self._c = math.ceil(k)
+        self.values = deque()
+        self.lo = []
+        self.hi = []
+        self.lo_size = 0
+        self.hi_size = 0
+        self.delayed: Dict[float, int] = {}
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.window
+
+    def push(self, x: float) -> None:
+        self.values.append(x)
+        if self.lo_size == 0 or x <= -self.lo[0]:
+            heapq.heappush(self.lo, -x)
+            self.lo_size += 1
+        else:
+            heapq.heappush(self.hi, x)
+            self.hi_size += 1
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._rebalance()
+
+    def value(self) -> float:
+        """Percentile of the current window (exact against percentile() when full)."""
+        if not self.values:
+            return 0.0
+        lo = -self.lo[0]
+        if self._f == self._c or not self.full:
+            return lo
+        return lo * (self._c - self._k) + self.hi[0] * (self._k - self._f)
+
+    def _remove(self, x: float) -> None:
+        self.delayed[x] = self.delayed.get(x, 0) + 1
+        if x <= -self.lo[0]:
+            self.lo_size -= 1
+            if x == -self.lo[0]:
+                self._prune(self.lo, -1.0)
+        else:
+            self.hi_size -= 1
+            if x == self.hi[0]:
+                self._prune(self.hi, 1.0)
+
+    def _prune(self, heap, sign: float) -> None:
+        delayed = self.delayed
+        while heap:
+            x = sign * heap[0]
+            n = delayed.get(x)
+            if not n:
+                return
+            heapq.heappop(heap)
+            if n == 1:
+                del delayed[x]
+            else:
+                delayed[x] = n - 1
+
+    def _rebalance(self) -> None:
+        target = min(self.lo_size + self.hi_size, self._f + 1)
+        while self.lo_size > target:
+            heapq.heappush(self.hi, -heapq.heappop(self.lo))
+            self.lo_size -= 1
+            self.hi_size += 1
+            self._prune(self.lo, -1.0)
+        while self.lo_size < target:
+            heapq.heappush(self.lo, -heapq.heappop(self.hi))
+            self.hi_size -= 1
+            self.lo_size += 1
+            self._prune(self.hi, 1.0)
+
+
+class SortedSteps:
+    """A growing multiset of values kept in ascending order, for repeated exact percentile and
+    count-above queries (OnlineRouter with exact quantiles).
+
+    Values live in sorted blocks of at most 2 * block values: an insert bisects the block maxima
+    and insorts into one block (O(log n + block)); indexing and count_above() walk the block
+    lengths (O(n / block)). Indexing is positional, so percentile() accepts it like a sorted list.
+    """
+
+    __slots__ = ("block", "blocks", "maxes", "n")
+
+    def __init__(self, block: int = 1024):
+        self.block = int(block)
+        self.blocks = []
+        self.maxes = []
+        self.n = 0
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __iter__(self):
+        for b in self.blocks:
+            yield from b
+
+    def __getitem__(self, i: int) -> float:
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError("SortedSteps index out of range")
+        if i >= self.n // 2:
+            i -= self.n
+            for b in reversed(self.blocks):
+                if -i <= len(b):
+                    return b[i]
+                i += len(b)
+        for b in self.blocks:
+            if i < len(b):
+                return b[i]
+            i -= len(b)
+        raise IndexError("SortedSteps index out of range")
+
+    def append(self, x: float) -> None:
+        self.n += 1
+        if not self.blocks:
+            self.blocks.append([x])
+            self.maxes.append(x)
+            return
+        i = bisect_left(self.maxes, x)
+        if i == len(self.blocks):
+            i -= 1
+            self.blocks[i].append(x)
+            self.maxes[i] = x
+        else:
+            insort(self.blocks[i], x)
+        b = self.blocks[i]
+        if len(b) > 2 * self.block:
+            half = len(b) // 2
+            self.blocks[i:i + 1] = [b[:half], b[half:]]
+            self.maxes[i:i + 1] = [b[half - 1], b[-1]]
+
+    def extend(self, values: Iterable[float]) -> None:
+        for x in values:
+            self.append(x)
+
+    def count_above(self, thr: float) -> int:
+        """Number of values > thr."""
+        i = bisect_right(self.maxes, thr)
+        if i == len(self.blocks):
+            return 0
+        return len(self.blocks[i]) - bisect_right(self.blocks[i], thr) + sum(len(b) for b in self.blocks[i + 1:])
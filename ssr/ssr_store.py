@@ -0,0 +1,313 @@
+"""Routing history in a local SQLite database: one row per run, one row per route result.
+
+`ssr_structural_safety_routing.py --store results.db` appends every run (timestamp, engine,
+metric profile, gate, label) and its per-route metrics. Each result also records the route's
+decision in the previous run that contained it (prev_denied), so decision flips are found through
+a partial index instead of by comparing runs. The queries below are index lookups:
+
+- `python ssr_store.py --db results.db --runs`
+- `python ssr_store.py --db results.db --history routeA_corridor.csv`
+- `python ssr_store.py --db results.db --diff` (last two runs) or `--diff 12 15`
+- `python ssr_store.py --db results.db --flips --since 7d --to denied`
+"""
+
+import argparse
+import csv
+import json
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from ssr_structural_safety_routing import EngineConfig, GateConfig, RouteMetrics, spike_threshold
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,           -- UTC, ISO 8601
+    label TEXT,
+    engine TEXT NOT NULL,
+    metric_profile TEXT NOT NULL,
+    gate TEXT NOT NULL,                 -- GateConfig as JSON
+    rank TEXT,
+    command TEXT,
+    routes INTEGER NOT NULL,
+    denied INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started_at);
+
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    route TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    complete INTEGER NOT NULL,
+    denied INTEGER NOT NULL,
+    prev_denied INTEGER,                -- decision in the route's previous run (NULL: first seen)
+    deny_class TEXT,
+    deny_reason TEXT,
+    progress REAL,
+    L_struct REAL,
+    eta REAL,
+    L_classical REAL,
+    a_min_seen REAL,
+    deny_count_a INTEGER,
+    median_step REAL,
+    p95_step REAL,
+    max_step REAL,
+    spike_thr REAL,
+    max_R REAL,
+    max_Psi REAL
+);
+CREATE INDEX IF NOT EXISTS results_route ON results(route, run_id);
+CREATE INDEX IF NOT EXISTS results_run ON results(run_id, route);
+CREATE INDEX IF NOT EXISTS results_denied ON results(denied, run_id);
+CREATE INDEX IF NOT EXISTS results_flips ON results(run_id, denied) WHERE denied != prev_denied;
+
+-- Last recorded decision per route, the source of prev_denied.
+CREATE TABLE IF NOT EXISTS latest (
+    route TEXT PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    denied INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+RESULT_FIELDS = ["rows", "complete", "denied", "prev_denied", "deny_class", "deny_reason", "progress", "L_struct",
+                 "eta", "L_classical", "a_min_seen", "deny_count_a", "median_step", "p95_step", "max_step",
+                 "spike_thr", "max_R", "max_Psi"]
+
+_LOOKUP_BATCH = 500
+
+
+def open_store(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        raise SystemExit(f"{Path(path).as_posix()}: results store schema v{version}, expected v{SCHEMA_VERSION}")
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return conn
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _real(x: Optional[float]) -> Optional[float]:
+    return None if x is None or x != x else x
+
+
+def record_run(conn: sqlite3.Connection, routes: Sequence[RouteMetrics], gate: GateConfig, ecfg: EngineConfig,
+               rank: Optional[str] = None, label: Optional[str] = None, command: Optional[str] = None,
+               started_at: Optional[str] = None) -> int:
+    """Append one run and its route results in a single transaction; returns the run_id."""
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO runs (started_at, label, engine, metric_profile, gate, rank, command, routes, denied) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (started_at or utc_now(), label, ecfg.engine, ecfg.profile, json.dumps(asdict(gate), sort_keys=True),
+             rank, command, len(routes), sum(1 for r in routes if r.denied == 1)))
+        run_id = cur.lastrowid
+
+        names = list(dict.fromkeys(r.route for r in routes))
+        prev = {}
+        for i in range(0, len(names), _LOOKUP_BATCH):
+            batch = names[i:i + _LOOKUP_BATCH]
+            marks = ",".join("?" * len(batch))
+            prev.update(conn.execute(f"SELECT route, denied FROM latest WHERE route IN ({marks})", batch))
+
+        conn.executemany(
+            f"INSERT INTO results (run_id, route, {', '.join(RESULT_FIELDS)}) "
+            f"VALUES ({', '.join('?' * (len(RESULT_FIELDS) + 2))})",
+            ((run_id, r.route, r.rows, r.complete, r.denied, prev.get(r.route), r.deny_class, r.deny_reason,
+              _real(r.progress), _real(r.L_struct), _real(r.eta), _real(r.L_classical), _real(r.a_min_seen),
+              r.deny_count_a, _real(r.median_step), _real(r.p95_step), _real(r.max_step),
+              _real(spike_threshold(gate, r)), _real(r.max_R), _real(r.max_Psi)) for r in routes))
+        conn.executemany(
+            "INSERT INTO latest (route, run_id, denied) VALUES (?, ?, ?) "
+            "ON CONFLICT(route) DO UPDATE SET run_id = excluded.run_id, denied = excluded.denied",
+            ((r.route, run_id, r.denied) for r in routes))
+    return run_id
+
+
+# ---------- queries: (header, rows) ----------
+
+Table = Tuple[List[str], List[tuple]]
+
+
+def query_runs(conn: sqlite3.Connection, limit: int = 20) -> Table:
+    rows = conn.execute(
+        "SELECT run_id, started_at, label, engine, metric_profile, routes, denied, gate FROM runs ORDER BY run_id DESC LIMIT ?", (limit,)).fetchall()
+    header = ["run_id", "started_at", "label", "engine", "metric_profile", "routes", "denied", "gate"]
+    return header, [r[:7] + (gate_summary(r[7]),) for r in rows]
+
+
+def gate_summary(gate_json: str) -> str:
+    g = json.loads(gate_json)
+    mode = g.get("step_spike_mode")
+    parts = [f"a_min={g.get('a_min')}", f"spike={mode}"]
+    if mode == "abs":
+        parts.append(f"step_spike={g.get('step_spike')}")
+    elif mode != "none":
+        parts.append(f"k={g.get('step_spike_k')}")
+        if mode == "rel_window":
+            parts.append(f"W={g.get('step_spike_window')}/{g.get('step_spike_window_stat')}")
+    parts.append(f"deny={g.get('deny_mode')}" + (f"/{g.get('deny_frac')}" if g.get("deny_mode") == "fraction" else ""))
+    return " ".join(parts)
+
+
+def query_history(conn: sqlite3.Connection, route: str, limit: Optional[int] = None) -> Table:
+    sql = ("SELECT r.run_id, u.started_at, u.label, r.denied, r.deny_reason, r.L_struct, r.eta, r.p95_step, "
+           "r.max_step FROM results r JOIN runs u ON u.run_id = r.run_id WHERE r.route = ? ORDER BY r.run_id DESC")
+    args: tuple = (route,)
+    if limit is not None:
+        sql += " LIMIT ?"
+        args += (limit,)
+    rows = conn.execute(sql, args).fetchall()
+    rows.reverse()
+    return ["run_id", "started_at", "label", "denied", "deny_reason", "L_struct", "eta", "p95_step", "max_step"], rows
+
+
+def last_runs(conn: sqlite3.Connection, n: int = 2) -> List[int]:
+    return [r[0] for r in conn.execute("SELECT run_id FROM runs ORDER BY run_id DESC LIMIT ?", (n,))][::-1]
+
+
+def query_diff(conn: sqlite3.Connection, a: int, b: int, changed_only: bool = True) -> Table:
+    """Routes whose decision differs between runs a and b, and routes present in only one of them."""
+    changed = " AND (y.route IS NULL OR x.denied != y.denied)" if changed_only else ""
+    sql = (
+        "SELECT route, change, denied_a, denied_b, L_struct_a, L_struct_b, reason_b FROM ("
+        " SELECT x.route AS route, CASE WHEN y.route IS NULL THEN 'removed' WHEN x.denied = y.denied THEN 'same' "
+        "  WHEN y.denied = 1 THEN 'ALLOWED->DENIED' ELSE 'DENIED->ALLOWED' END AS change,"
+        "  x.denied AS denied_a, y.denied AS denied_b, x.L_struct AS L_struct_a, y.L_struct AS L_struct_b,"
+        "  y.deny_reason AS reason_b"
+        f" FROM results x LEFT JOIN results y ON y.run_id = ? AND y.route = x.route WHERE x.run_id = ?{changed}"
+        " UNION ALL"
+        " SELECT y.route, 'added', NULL, y.denied, NULL, y.L_struct, y.deny_reason FROM results y"
+        " WHERE y.run_id = ? AND NOT EXISTS (SELECT 1 FROM results x WHERE x.run_id = ? AND x.route = y.route)"
+        ") ORDER BY route")
+    rows = conn.execute(sql, (b, a, b, a)).fetchall()
+    return ["route", "change", f"denied@{a}", f"denied@{b}", f"L_struct@{a}", f"L_struct@{b}", f"reason@{b}"], rows
+
+
+def parse_time(s: str) -> str:
+    """ISO date/time (UTC unless it has an offset) or a span back from now: 90m, 12h, 7d, 2w."""
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([mhdw])", s.strip())
+    if m:
+        unit = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}[m.group(2)]
+        t = datetime.now(timezone.utc) - timedelta(**{unit: float(m.group(1))})
+    else:
+        try:
+            t = datetime.fromisoformat(s)
+        except ValueError:
+            raise SystemExit(f"Not a time: {s!r} (ISO date/time, or a span such as 7d, 12h)")
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+    return t.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+def query_flips(conn: sqlite3.Connection, since: Optional[str] = None, until: Optional[str] = None,
+                to: str = "any", route: Optional[str] = None) -> Table:
+    """Results whose decision differs from the same route's previous run, for runs in [since, until).
+
+    Runs in the window are the outer loop (CROSS JOIN fixes the order) and the flips of each run
+    come from the partial index, so the cost follows the number of flips, not of results.
+    """
+    where = ["r.denied != r.prev_denied"]
+    args: list = []
+    if since is not None:
+        where.append("u.started_at >= ?")
+        args.append(since)
+    if until is not None:
+        where.append("u.started_at < ?")
+        args.append(until)
+    if to != "any":
+        where.append("r.denied = ?")
+        args.append(1 if to == "denied" else 0)
+    if route is not None:
+        where.append("r.route = ?")
+        args.append(route)
+    sql = ("SELECT r.run_id, u.started_at, r.route, "
+           "CASE r.denied WHEN 1 THEN 'ALLOWED->DENIED' ELSE 'DENIED->ALLOWED' END, r.deny_reason, r.L_struct "
+           "FROM runs u CROSS JOIN results r INDEXED BY results_flips ON r.run_id = u.run_id "
+           f"WHERE {' AND '.join(where)} ORDER BY r.run_id, r.route")
+    return ["run_id", "started_at", "route", "change", "deny_reason", "L_struct"], conn.execute(sql, args).fetchall()
+
+
+def print_table(table: Table, limit: Optional[int] = None) -> None:
+    header, rows = table
+    shown = rows if limit is None else rows[:limit]
+    cells = [[("" if v is None else f"{v:.6g}" if isinstance(v, float) else str(v)) for v in row] for row in shown]
+    widths = [max([len(h)] + [len(c[i]) for c in cells]) for i, h in enumerate(header)]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)).rstrip())
+    for c in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(c, widths)).rstrip())
+    if len(shown) < len(rows):
+        print(f"... {len(rows) - len(shown)} more (--out writes all)")
+
+
+def write_table(path: Path, table: Table) -> None:
+    header, rows = table
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query the routing results store (written by --store)")
+    ap.add_argument("--db", required=True, help="SQLite results store")
+    q = ap.add_mutually_exclusive_group(required=True)
+    q.add_argument("--runs", action="store_true", help="List the latest runs")
+    q.add_argument("--history", metavar="ROUTE", help="Decision and metrics of ROUTE in every run")
+    q.add_argument("--diff", nargs="*", type=int, metavar="RUN",
+                   help="Decision changes between two runs (default: the last two)")
+    q.add_argument("--flips", action="store_true", help="Routes whose decision changed from their previous run")
+    ap.add_argument("--since", default=None, help="(flips) runs at or after: ISO date/time or a span such as 7d")
+    ap.add_argument("--until", default=None, help="(flips) runs before: ISO date/time or a span")
+    ap.add_argument("--to", choices=["any", "denied", "allowed"], default="any", help="(flips) direction")
+    ap.add_argument("--route", default=None, help="(flips) only this route")
+    ap.add_argument("--all", action="store_true", help="(diff) also list routes whose decision did not change")
+    ap.add_argument("--limit", type=int, default=50, help="Rows printed (runs: rows queried)")
+    ap.add_argument("--out", default=None, help="Also write the full result as CSV")
+    args = ap.parse_args()
+
+    path = Path(args.db)
+    if not path.exists():
+        raise SystemExit(f"Not found: {path.as_posix()}")
+    conn = open_store(path)
+    t0 = time.perf_counter()
+    if args.runs:
+        table = query_runs(conn, args.limit)
+    elif args.history is not None:
+        table = query_history(conn, args.history)
+    elif args.diff is not None:
+        if len(args.diff) not in (0, 2):
+            raise SystemExit("--diff takes two run ids, or none for the last two runs")
+        a, b = args.diff if args.diff else (last_runs(conn) + [None, None])[:2]
+        if b is None:
+            raise SystemExit("--diff needs two runs in the store")
+        table = query_diff(conn, a, b, changed_only=not args.all)
+    else:
+        since = parse_time(args.since) if args.since else None
+        until = parse_time(args.until) if args.until else None
+        table = query_flips(conn, since, until, args.to, args.route)
+    ms = (time.perf_counter() - t0) * 1000.0
+    conn.close()
+
+    print_table(table, args.limit)
+    print(f"({len(table[1])} rows, {ms:.1f} ms)", file=sys.stderr)
+    if args.out:
+        write_table(Path(args.out), table)
+        print(f"WROTE {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,47 @@
 import argparse
+import atexit
+import cProfile
 import csv
+import heapq
+import json
 import math
-from dataclasses import dataclass
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field, fields as dataclass_fields, replace
+from functools import partial
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from ssr_bundle import BundleRoute, is_bundle, open_bundle, route_rows
+from ssr_cache import DEFAULT_MAX_BYTES, BaseCache, content_hash
+from ssr_columnar import SUFFIX as COLUMNAR_SUFFIX, ColumnarTrace, is_columnar
+from ssr_compressed import SUFFIXES as COMPRESSED_SUFFIXES, is_compressed, open_text
+from ssr_sketch import DEFAULT_ALPHA, QuantileSketch, RollingQuantile, SortedSteps
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 EPS = 1e-12
 
+# --engine numpy reproduces the reference RouteMetrics within this relative tolerance:
+# rows, counts, max_step, max_R, max_Psi, a_min_seen and progress are bit-identical when
+# u,v are read from the trace; L_struct (pairwise summation) and anything derived from
+# np.log (u,v computed from a,s) may differ in the last bits.
+NUMPY_RTOL = 1e-9
+
+# Step costs the stream engine buffers before folding them into its quantile sketch at once.
+SKETCH_BATCH = 4096
+
 
 def to_float(x, default=None):
     try:
@@ -30,7 +65,7 @@ def atanh_safe(x: float, eps: float = 1e-12) -> float:
 
 
 def percentile(sorted_vals: List[float], p: float) -> float:
-    if not sorted_vals:
+    if len(sorted_vals) == 0:
         return 0.0
     if p <= 0:
         return sorted_vals[0]
@@ -69,82 +104,167 @@ class RouteMetrics:
     max_R: float
     max_Psi: float
 
+    complete: int = 1
+    malformed: Dict[str, int] = field(default_factory=dict)
+    L_classical: float = 0.0
 
-def read_rows(path: Path) -> Tuple[List[Dict[str, str]], List[str]]:
-    with path.open("r", newline="", encoding="utf-8") as f:
-        rdr = csv.DictReader(f)
-        rows = list(rdr)
-        if not rows:
-            raise SystemExit(f"Empty CSV: {path.as_posix()}")
-        cols = rdr.fieldnames or []
-    return rows, cols
 
+@dataclass(frozen=True)
+class MetricProfile:
+    """How a trace's progress coordinate enters the metrics.
 
-def compute_base(path: Path, eps_atanh: float) -> Tuple[RouteMetrics, List[float], List[float]]:
-    rows, cols = read_rows(path)
+    canonical: 'k' is a position. Step i uses k[i+1] - k[i], progress = k_last - k_first and
+               eta = progress / L_struct (higher ranks first).
+    mission:   'dx' is a per-row displacement and is required. Step i uses dx[i], L_struct also
+               adds |dx[-1]|, L_classical = sum |dx|, eta = L_struct / L_classical (lower ranks
+               first) and Psi = 0.5 * (u^2 + v^2). Deny classes are not reported.
+    """
+    name: str
+    coord: str
+    delta_coord: bool
+    psi_scale: float
+    eta_higher_is_better: bool
+    deny_classes: bool
 
-    has_u = "u" in cols
-    has_v = "v" in cols
-    has_a = "a" in cols
-    has_s = "s" in cols
-    has_k = "k" in cols
+    def coord_default(self, idx: int) -> float:
+        return 0.0 if self.delta_coord else float(idx)
 
-    if not ((has_u and has_v) or (has_a and has_s)):
-        raise SystemExit(f"{path.name}: need either ('u','v') OR ('a','s') columns.")
+    def require_columns(self, has: Callable[[str], bool], name: str) -> bool:
+        """Validate a trace's columns; returns True when u,v are read directly (else from a,s)."""
+        if self.delta_coord and not has(self.coord):
+            raise SystemExit(f"Missing required column '{self.coord}' in {name}")
+        use_uv = has("u") and has("v")
+        if not (use_uv or (has("a") and has("s"))):
+            extra = f", along with '{self.coord}'" if self.delta_coord else ""
+            raise SystemExit(f"{name}: need either ('u','v') OR ('a','s') columns{extra}.")
+        return use_uv
 
-    k_vals: List[float] = []
-    u: List[float] = []
-    v: List[float] = []
-    a_vals: List[float] = []
+    def totals(self, first: float, last: float, L_steps: float, L_classical: float) -> Tuple[float, float, float]:
+        """(progress, L_struct, eta) from the first/last coordinate values and the summed step costs."""
+        if self.delta_coord:
+            L_struct = L_steps + abs(last)
+            return 0.0, L_struct, L_struct / (L_classical + EPS)
+        progress = last - first
+        return progress, L_steps, progress / (L_steps + EPS)
 
-    R: List[float] = []
-    Psi: List[float] = []
+    def rank_key(self, rank: str) -> Callable[[RouteMetrics], float]:
+        if rank == "eta" and not self.eta_higher_is_better:
+            return lambda r: r.eta
+        return RANK_KEYS[rank]
 
-    for idx, r in enumerate(rows):
-        if has_k:
-            k_i = to_float(r.get("k"), float(idx))
-        else:
-            k_i = float(idx)
+
+CANONICAL = MetricProfile("canonical", coord="k", delta_coord=False, psi_scale=1.0,
+                          eta_higher_is_better=True, deny_classes=True)
+MISSION = MetricProfile("mission", coord="dx", delta_coord=True, psi_scale=0.5,
+                        eta_higher_is_better=False, deny_classes=False)
+PROFILES = {p.name: p for p in (CANONICAL, MISSION)}
+
+
+def load_columns(path: Path, eps_atanh: float, bad: Optional[Dict[str, int]] = None,
+                 profile: MetricProfile = CANONICAL):
+    """Return (k, u, v, a) columns of a trace using the reference parsing rules (k is the profile's coordinate)."""
+    if is_columnar(path):
+        return load_columns_columnar(path, eps_atanh, bad, profile)
+
+    k_vals, u, v, a_vals = array("d"), array("d"), array("d"), array("d")
+    for k_i, u_i, v_i, a_i in iter_trace(path, eps_atanh, bad, profile):
         k_vals.append(k_i)
+        u.append(u_i)
+        v.append(v_i)
+        a_vals.append(a_i)
+    return k_vals, u, v, a_vals
 
-        if has_u and has_v:
-            u_i = to_float(r.get("u"), 0.0) or 0.0
-            v_i = to_float(r.get("v"), 0.0) or 0.0
-            u.append(u_i)
-            v.append(v_i)
-            if has_a:
-                a_vals.append(to_float(r.get("a"), float("nan")))
-            else:
-                a_vals.append(float("nan"))
-        else:
-            a_i = to_float(r.get("a"), 0.0) or 0.0
-            s_i = to_float(r.get("s"), 0.0) or 0.0
-            a_vals.append(a_i)
-            u.append(atanh_safe(a_i, eps=eps_atanh))
-            v.append(atanh_safe(s_i, eps=eps_atanh))
-
-        r_i = math.sqrt(u[-1] * u[-1] + v[-1] * v[-1])
-        psi_i = (u[-1] * u[-1] + v[-1] * v[-1])
+
+def load_columns_columnar(path: Path, eps_atanh: float, bad: Optional[Dict[str, int]] = None,
+                           profile: MetricProfile = CANONICAL):
+    # u, v, a and k are zero-copy views into the memory-mapped file whenever the trace stores them.
+    # The malformed-cell counts recorded at conversion are added to bad for the columns read.
+    t = ColumnarTrace(path)
+    if t.nrows == 0:
+        raise SystemExit(f"Empty CSV: {path.as_posix()}")
+    use_uv = profile.require_columns(t.__contains__, path.name)
+    if bad is not None:
+        for col in (profile.coord, *(("u", "v", "a") if use_uv else ("a", "s"))):
+            if t.malformed.get(col):
+                bad[col] = bad.get(col, 0) + t.malformed[col]
+
+    k_vals = t.column(profile.coord) if profile.coord in t else array("d", map(float, range(t.nrows)))
+    if use_uv:
+        u = t.column("u")
+        v = t.column("v")
+        a_vals = t.column("a") if "a" in t else array("d", [float("nan")]) * t.nrows
+    else:
+        a_vals = t.column("a")
+        u = array("d", (atanh_safe(x, eps=eps_atanh) for x in a_vals))
+        v = array("d", (atanh_safe(x, eps=eps_atanh) for x in t.column("s")))
+    return k_vals, u, v, a_vals
+
+
+def compute_base(path: Path, eps_atanh: float,
+                 profile: MetricProfile = CANONICAL) -> Tuple[RouteMetrics, List[float], List[float]]:
+    bad: Dict[str, int] = {}
+    k_vals, u, v, a_vals = load_columns(path, eps_atanh, bad, profile)
+    rm, step_costs, a_vals = compute_columns(path.name, k_vals, u, v, a_vals, profile)
+    rm.malformed = bad
+    return rm, step_costs, a_vals
+
+
+def radius_columns(u, v, psi_scale: float = 1.0) -> Tuple[List[float], List[float]]:
+    R: List[float] = []
+    Psi: List[float] = []
+    for i in range(len(u)):
+        r_i = math.sqrt(u[i] * u[i] + v[i] * v[i])
+        psi_i = psi_scale * (u[i] * u[i] + v[i] * v[i])
         R.append(r_i)
         Psi.append(psi_i)
+    return R, Psi
+
 
+def step_columns(k_vals, u, v, deltas: bool = False) -> Tuple[List[float], float]:
+    """Step costs and their sum; with deltas=True, k_vals holds per-row displacements (mission dx)."""
     step_costs: List[float] = []
     L_struct = 0.0
-    for i in range(len(rows) - 1):
+    if deltas:
+        for i in range(len(k_vals) - 1):
+            dm = k_vals[i]
+            du = u[i + 1] - u[i]
+            dv = v[i + 1] - v[i]
+            step = math.sqrt(dm * dm + du * du + dv * dv)
+            step_costs.append(step)
+            L_struct += step
+        return step_costs, L_struct
+
+    for i in range(len(k_vals) - 1):
         dm = k_vals[i + 1] - k_vals[i]
         du = u[i + 1] - u[i]
         dv = v[i + 1] - v[i]
         step = math.sqrt(dm * dm + du * du + dv * dv)
         step_costs.append(step)
         L_struct += step
+    return step_costs, L_struct
+
+
+def step_quantiles(step_costs) -> Tuple[float, float, float]:
+    """(median, p95, max) step cost; sorts a copy."""
+    sc_sorted = sorted(step_costs) if len(step_costs) else [0.0]
+    return percentile(sc_sorted, 50.0), percentile(sc_sorted, 95.0), sc_sorted[-1]
 
-    progress = k_vals[-1] - k_vals[0]
-    eta = progress / (L_struct + EPS)
 
-    sc_sorted = sorted(step_costs) if step_costs else [0.0]
-    med_step = percentile(sc_sorted, 50.0)
-    p95_step = percentile(sc_sorted, 95.0)
-    max_step = sc_sorted[-1] if sc_sorted else 0.0
+def compute_columns(route: str, k_vals, u, v, a_vals,
+                    profile: MetricProfile = CANONICAL) -> Tuple[RouteMetrics, List[float], List[float]]:
+    R, Psi = radius_columns(u, v, profile.psi_scale)
+    step_costs, L_steps = step_columns(k_vals, u, v, profile.delta_coord)
+    quantiles = step_quantiles(step_costs)
+    return columns_metrics(route, k_vals, R, Psi, L_steps, quantiles, a_vals, profile), step_costs, a_vals
+
+
+def columns_metrics(route: str, k_vals, R, Psi, L_steps: float, quantiles: Tuple[float, float, float],
+                    a_vals, profile: MetricProfile = CANONICAL) -> RouteMetrics:
+    n = len(k_vals)
+    L_classical = sum(abs(x) for x in k_vals) if profile.delta_coord else 0.0
+    progress, L_struct, eta = profile.totals(k_vals[0], k_vals[-1], L_steps, L_classical)
+
+    med_step, p95_step, max_step = quantiles
 
     a_min_seen = float("inf")
     for av in a_vals:
@@ -153,9 +273,9 @@ def compute_base(path: Path, eps_atanh: float) -> Tuple[RouteMetrics, List[float
     if a_min_seen == float("inf"):
         a_min_seen = float("nan")
 
-    rm = RouteMetrics(
-        route=path.name,
-        rows=len(rows),
+    return RouteMetrics(
+        route=route,
+        rows=n,
         progress=progress,
         L_struct=L_struct,
         eta=eta,
@@ -169,8 +289,1555 @@ def compute_base(path: Path, eps_atanh: float) -> Tuple[RouteMetrics, List[float
         max_step=max_step,
         max_R=max(R) if R else 0.0,
         max_Psi=max(Psi) if Psi else 0.0,
+        L_classical=L_classical,
     )
-    return rm, step_costs, a_vals
+
+
+RowParser = Callable[[List[str], int], Tuple[float, float, float, float]]
+
+
+def row_parser(cols: List[str], eps_atanh: float, bad: Dict[str, int], name: str,
+               profile: MetricProfile = CANONICAL) -> RowParser:
+    """Build a parser for raw CSV rows of a trace with header cols, resolving column indices once.
+
+    The parser maps (row, idx) to (k, u, v, a) with the reference rules, k being the profile's
+    coordinate column. Cells that are missing or not numbers get the reference defaults and are
+    counted per column in bad.
+    """
+    pos = {c: i for i, c in enumerate(cols)}
+    use_uv = profile.require_columns(pos.__contains__, name)
+    coord = profile.coord
+    i_k = pos.get(coord)
+    i_u = pos.get("u")
+    i_v = pos.get("v")
+    i_a = pos.get("a")
+    i_s = pos.get("s")
+
+    nan = float("nan")
+
+    def cell(row, i, col, default):
+        if i is None:
+            return default
+        if i < len(row):
+            try:
+                return float(row[i])
+            except ValueError:
+                pass
+        bad[col] = bad.get(col, 0) + 1
+        return default
+
+    def parse(row: List[str], idx: int) -> Tuple[float, float, float, float]:
+        try:
+            k_i = float(row[i_k]) if i_k is not None else float(idx)
+            if use_uv:
+                u_i = float(row[i_u]) or 0.0
+                v_i = float(row[i_v]) or 0.0
+                a_i = float(row[i_a]) if i_a is not None else nan
+                return k_i, u_i, v_i, a_i
+            a_i = float(row[i_a]) or 0.0
+            s_i = float(row[i_s]) or 0.0
+        except (ValueError, IndexError):
+            k_i = cell(row, i_k, coord, profile.coord_default(idx)) if i_k is not None else float(idx)
+            if use_uv:
+                u_i = cell(row, i_u, "u", 0.0) or 0.0
+                v_i = cell(row, i_v, "v", 0.0) or 0.0
+                a_i = cell(row, i_a, "a", nan)
+                return k_i, u_i, v_i, a_i
+            a_i = cell(row, i_a, "a", 0.0) or 0.0
+            s_i = cell(row, i_s, "s", 0.0) or 0.0
+        return k_i, atanh_safe(a_i, eps=eps_atanh), atanh_safe(s_i, eps=eps_atanh), a_i
+
+    return parse
+
+
+def iter_trace(path: Path, eps_atanh: float, bad: Optional[Dict[str, int]] = None,
+               profile: MetricProfile = CANONICAL) -> Iterator[Tuple[float, float, float, float]]:
+    """Yield (k, u, v, a) per row with the reference parsing rules, one row at a time."""
+    if is_columnar(path):
+        yield from zip(*load_columns_columnar(path, eps_atanh, bad, profile))
+        return
+
+    if bad is None:
+        bad = {}
+
+    with open_text(path) as f:
+        rdr = csv.reader(f)
+        cols = next(rdr, None)
+        first = next((row for row in rdr if row), None)
+        if cols is None or first is None:
+            raise SystemExit(f"Empty CSV: {path.as_posix()}")
+
+        parse = row_parser(cols, eps_atanh, bad, path.name, profile)
+        yield parse(first, 0)
+        idx = 1
+        for row in rdr:
+            if row:
+                yield parse(row, idx)
+                idx += 1
+
+
+class RouteAccumulator:
+    """Single-pass, bounded-memory evaluation of one route.
+
+    Keeps running L_struct, progress (or L_classical), max_R/max_Psi, a_min_seen and violation
+    counts. Step costs go into a QuantileSketch (median/p95 within relative error alpha, see
+    ssr_sketch.py) in batches of SKETCH_BATCH, or into a compact array('d') when exact=True. With
+    keep_sorted, exact step costs are kept in a SortedSteps instead, for accumulators whose metrics
+    are read repeatedly.
+    """
+
+    def __init__(self, route: str, a_min: Optional[float] = None, spike_abs: Optional[float] = None,
+                 exact: bool = False, alpha: float = DEFAULT_ALPHA, profile: MetricProfile = CANONICAL,
+                 spike_window: Optional[Tuple[int, float, float]] = None, keep_sorted: bool = False):
+        self.route = route
+        self.a_min = a_min
+        self.spike_abs = spike_abs
+        self.exact = exact
+        self.profile = profile
+        self.deltas = profile.delta_coord
+        self.psi_scale = profile.psi_scale
+
+        self.rows = 0
+        self.k_first = 0.0
+        self.u_first = 0.0
+        self.v_first = 0.0
+        self.k_prev = 0.0
+        self.u_prev = 0.0
+        self.v_prev = 0.0
+
+        self.L_struct = 0.0
+        self.L_classical = 0.0
+        self.max_step = 0.0
+        self.max_R = 0.0
+        self.max_Psi = 0.0
+        self.a_min_seen = float("inf")
+        self.deny_count_a = 0
+        self.deny_count_step_abs = 0
+
+        self.steps = (SortedSteps() if keep_sorted else array("d")) if exact else None
+        self._sketch = None if exact else QuantileSketch(alpha=alpha)
+        self.pending: List[float] = []
+
+        # rel_window gate: (W, percentile, k). The first W steps are kept so that chunked
+        # evaluation can re-gate them against the steps before the chunk.
+        self.window = RollingQuantile(spike_window[0], spike_window[1]) if spike_window else None
+        self.window_k = spike_window[2] if spike_window else 0.0
+        self.window_head = array("d")
+        self.deny_count_step_window = 0
+
+    @property
+    def sketch(self) -> Optional[QuantileSketch]:
+        """The step-cost sketch, with the steps still batched in pending folded in."""
+        if self.pending:
+            self._sketch.update(self.pending)
+            self.pending = []
+        return self._sketch
+
+    @property
+    def n_steps(self) -> int:
+        return max(0, self.rows - 1)
+
+    def add(self, k: float, u: float, v: float, a: float) -> None:
+        psi = u * u + v * v
+        r = math.sqrt(psi)
+        psi = self.psi_scale * psi
+        if self.deltas:
+            self.L_classical += abs(k)
+        if self.rows == 0:
+            self.k_first = k
+            self.u_first = u
+            self.v_first = v
+            self.max_R = r
+            self.max_Psi = psi
+        else:
+            if r > self.max_R:
+                self.max_R = r
+            if psi > self.max_Psi:
+                self.max_Psi = psi
+
+            dm = self.k_prev if self.deltas else k - self.k_prev
+            du = u - self.u_prev
+            dv = v - self.v_prev
+            step = math.sqrt(dm * dm + du * du + dv * dv)
+            self.L_struct += step
+            if step > self.max_step:
+                self.max_step = step
+            if self.steps is not None:
+                self.steps.append(step)
+            else:
+                pending = self.pending
+                pending.append(step)
+                if len(pending) >= SKETCH_BATCH:
+                    self._sketch.update(pending)
+                    del pending[:]
+            if self.spike_abs is not None and step > self.spike_abs:
+                self.deny_count_step_abs += 1
+            window = self.window
+            if window is not None:
+                if window.full and step > self.window_k * window.value():
+                    self.deny_count_step_window += 1
+                elif len(self.window_head) < window.window:
+                    self.window_head.append(step)
+                window.push(step)
+
+        if a == a:
+            if a < self.a_min_seen:
+                self.a_min_seen = a
+            if self.a_min is not None and a < self.a_min:
+                self.deny_count_a += 1
+
+        self.rows += 1
+        self.k_prev = k
+        self.u_prev = u
+        self.v_prev = v
+
+    def add_rows(self, rows: Iterable[Tuple[float, float, float, float]]) -> None:
+        """add() every (k, u, v, a) row, keeping the running state in locals between rows.
+
+        The stream engine's inner loop: the same arithmetic in the same order as add(), so the
+        result is bit-identical, without a method call and a dozen attribute updates per row.
+        """
+        rows = iter(rows)
+        if self.rows == 0:
+            first = next(rows, None)
+            if first is None:
+                return
+            self.add(*first)
+        sqrt = math.sqrt
+        deltas, psi_scale = self.deltas, self.psi_scale
+        k_prev, u_prev, v_prev = self.k_prev, self.u_prev, self.v_prev
+        L_struct, L_classical = self.L_struct, self.L_classical
+        max_step, max_R, max_Psi = self.max_step, self.max_R, self.max_Psi
+        a_min, a_min_seen, deny_a = self.a_min, self.a_min_seen, self.deny_count_a
+        a_gated = a_min is not None
+        spike_abs, deny_abs = self.spike_abs, self.deny_count_step_abs
+        abs_gated = spike_abs is not None
+        window = self.window
+        record = self.steps.append if self.steps is not None else None
+        pending = self.pending
+        n = 0
+        for k, u, v, a in rows:
+            psi = u * u + v * v
+            r = sqrt(psi)
+            psi = psi_scale * psi
+            if deltas:
+                L_classical += abs(k)
+                dm = k_prev
+            else:
+                dm = k - k_prev
+            if r > max_R:
+                max_R = r
+            if psi > max_Psi:
+                max_Psi = psi
+            du = u - u_prev
+            dv = v - v_prev
+            step = sqrt(dm * dm + du * du + dv * dv)
+            L_struct += step
+            if step > max_step:
+                max_step = step
+            if record is not None:
+                record(step)
+            else:
+                pending.append(step)
+                if len(pending) >= SKETCH_BATCH:
+                    self._sketch.update(pending)
+                    del pending[:]
+            if abs_gated and step > spike_abs:
+                deny_abs += 1
+            if window is not None:
+                if window.full and step > self.window_k * window.value():
+                    self.deny_count_step_window += 1
+                elif len(self.window_head) < window.window:
+                    self.window_head.append(step)
+                window.push(step)
+            if a == a:
+                if a < a_min_seen:
+                    a_min_seen = a
+                if a_gated and a < a_min:
+                    deny_a += 1
+            n += 1
+            k_prev, u_prev, v_prev = k, u, v
+        self.rows += n
+        self.k_prev, self.u_prev, self.v_prev = k_prev, u_prev, v_prev
+        self.L_struct, self.L_classical = L_struct, L_classical
+        self.max_step, self.max_R, self.max_Psi = max_step, max_R, max_Psi
+        self.a_min_seen, self.deny_count_a = a_min_seen, deny_a
+        self.deny_count_step_abs = deny_abs
+
+    def count_steps_above(self, thr: float) -> int:
+        if self.spike_abs is not None and thr == self.spike_abs:
+            return self.deny_count_step_abs
+        if not (self.max_step > thr):
+            return 0
+        if isinstance(self.steps, SortedSteps):
+            return self.steps.count_above(thr)
+        if self.steps is not None:
+            return sum(1 for st in self.steps if st > thr)
+        return self.sketch.count_above(thr)
+
+    def metrics(self) -> RouteMetrics:
+        if self.steps is not None:
+            if not self.steps:
+                sc_sorted = [0.0]
+            else:
+                sc_sorted = self.steps if isinstance(self.steps, SortedSteps) else sorted(self.steps)
+            med_step = percentile(sc_sorted, 50.0)
+            p95_step = percentile(sc_sorted, 95.0)
+        else:
+            med_step = self.sketch.percentile(50.0)
+            p95_step = self.sketch.percentile(95.0)
+
+        progress, L_struct, eta = self.profile.totals(self.k_first, self.k_prev, self.L_struct, self.L_classical)
+        a_min_seen = self.a_min_seen if self.a_min_seen != float("inf") else float("nan")
+        return RouteMetrics(
+            route=self.route,
+            rows=self.rows,
+            progress=progress,
+            L_struct=L_struct,
+            eta=eta,
+            denied=0,
+            deny_reason="",
+            deny_class="",
+            a_min_seen=a_min_seen,
+            deny_count_a=0,
+            median_step=med_step,
+            p95_step=p95_step,
+            max_step=self.max_step,
+            max_R=self.max_R,
+            max_Psi=self.max_Psi,
+            L_classical=self.L_classical,
+        )
+
+
+def gate_accumulator(route: str, gate: "GateConfig", exact: bool = False, alpha: float = DEFAULT_ALPHA,
+                     profile: MetricProfile = CANONICAL, keep_sorted: bool = False) -> RouteAccumulator:
+    """RouteAccumulator counting the permission gate and the online spike gates (abs, rel_window) of gate."""
+    spike_abs = float(gate.step_spike) if gate.step_spike_mode == "abs" else None
+    return RouteAccumulator(route, a_min=gate.a_min, spike_abs=spike_abs, exact=exact, alpha=alpha,
+                            profile=profile, spike_window=spike_window(gate), keep_sorted=keep_sorted)
+
+
+def known_row_count(path: Path) -> Optional[int]:
+    """Data rows of a trace when they are known without reading it (the .ssrc header), else None."""
+    return ColumnarTrace(path).nrows if is_columnar(path) else None
+
+
+def early_deny_check(path: Path, gate: "GateConfig",
+                     rows: Optional[int] = None) -> Optional[Callable[[RouteAccumulator], bool]]:
+    """Return a predicate that is True once the route is provably denied whatever the remaining rows
+    hold, or None when no decision can be final before the last row.
+
+    Only the permission gate and the abs/rel_window spike gates can be decided early; global spike
+    thresholds depend on the whole route. In fraction mode the denominators are the route's row
+    count, so an early decision needs it up front: .ssrc traces and bundle routes (rows) know it.
+    CSV traces are read to the end, as counting their rows first would be a second pass over the
+    file (and a full decompression of a .gz/.bz2/.xz trace).
+    """
+    if gate.deny_mode == "any":
+        return lambda acc: acc.deny_count_a > 0 or acc.deny_count_step_abs > 0 or acc.deny_count_step_window > 0
+
+    rows = known_row_count(path) if rows is None else rows
+    if rows is None:
+        return None
+    rows = max(1, rows)
+    steps = max(1, rows - 1)
+    frac = gate.deny_frac
+    return lambda acc: (acc.deny_count_a / rows > frac) or (
+        max(acc.deny_count_step_abs, acc.deny_count_step_window) / steps > frac)
+
+
+def accumulate_rows(acc: RouteAccumulator, rows: Iterator[Tuple[float, float, float, float]],
+                    decided: Optional[Callable[[RouteAccumulator], bool]] = None) -> int:
+    """Add (k, u, v, a) rows to acc until they run out or decided(acc); returns 1 if every row was read."""
+    if decided is None:
+        acc.add_rows(rows)
+        return 1
+    for k_i, u_i, v_i, a_i in rows:
+        acc.add(k_i, u_i, v_i, a_i)
+        if decided(acc):
+            complete = int(next(rows, None) is None)
+            rows.close()
+            return complete
+    return 1
+
+
+def compute_base_stream(path: Path, eps_atanh: float, gate: "GateConfig", exact: bool = False,
+                        alpha: float = DEFAULT_ALPHA, early_exit: bool = False,
+                        profile: MetricProfile = CANONICAL) -> Tuple[RouteMetrics, RouteAccumulator]:
+    acc = gate_accumulator(path.name, gate, exact=exact, alpha=alpha, profile=profile)
+    decided = early_deny_check(path, gate) if early_exit else None
+    bad: Dict[str, int] = {}
+    complete = accumulate_rows(acc, iter_trace(path, eps_atanh, bad, profile), decided)
+    rm = acc.metrics()
+    rm.complete = complete
+    rm.malformed = bad
+    return rm, acc
+
+
+def trace_ranges(path: Path, chunk_bytes: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """Header columns and line-aligned byte ranges of about chunk_bytes covering the data rows.
+
+    The cut points depend only on the file and chunk_bytes. Rows must not contain quoted newlines.
+    """
+    with path.open("rb") as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        bounds = [f.tell()]
+        while bounds[-1] + chunk_bytes < size:
+            f.seek(bounds[-1] + chunk_bytes - 1)
+            f.readline()
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+    cols = next(csv.reader([header.decode("utf-8")]), None)
+    if cols is None:
+        raise SystemExit(f"Empty CSV: {path.as_posix()}")
+    return cols, list(zip(bounds, bounds[1:] + [size]))
+
+
+def range_lines(path: Path, start: int, end: int) -> Iterator[str]:
+    with path.open("rb") as f:
+        f.seek(start)
+        pos = start
+        for line in f:
+            if pos >= end:
+                break
+            pos += len(line)
+            yield line.decode("utf-8")
+
+
+def accumulate_range(path: Path, cols: List[str], start: int, end: int, idx0: int, eps_atanh: float,
+                     gate: "GateConfig", exact: bool = False, alpha: float = DEFAULT_ALPHA,
+                     profile: MetricProfile = CANONICAL) -> Tuple[RouteAccumulator, Dict[str, int]]:
+    """RouteAccumulator over the rows in bytes [start, end); idx0 is the index of the first of them."""
+    bad: Dict[str, int] = {}
+    parse = row_parser(cols, eps_atanh, bad, path.name, profile)
+    acc = gate_accumulator(path.name, gate, exact=exact, alpha=alpha, profile=profile)
+    rows = (row for row in csv.reader(range_lines(path, start, end)) if row)
+    acc.add_rows(parse(row, idx) for idx, row in enumerate(rows, idx0))
+    return acc, bad
+
+
+def merge_accumulators(parts: List[RouteAccumulator]) -> RouteAccumulator:
+    """Fold accumulators of consecutive row ranges (in row order) into the first one.
+
+    The step between adjacent ranges is computed from the last row of one and the first row of
+    the next. L_struct and L_classical are math.fsum reductions of the per-range sums, so the
+    result depends only on where the trace was cut, not on which worker computed which range.
+    Each range still sums its steps left to right, so the merged sums equal the single-pass
+    engines' only within summation rounding (relative ~1e-13): routes whose L_struct is tied to
+    the last ulps may rank in a different order than in a sequential run.
+    """
+    parts = [p for p in parts if p.rows]
+    acc = parts[0]
+    boundary = []
+    for prev, nxt in zip(parts, parts[1:]):
+        dm = prev.k_prev if prev.deltas else nxt.k_first - prev.k_prev
+        du = nxt.u_first - prev.u_prev
+        dv = nxt.v_first - prev.v_prev
+        boundary.append(math.sqrt(dm * dm + du * du + dv * dv))
+
+    acc.L_struct = math.fsum([p.L_struct for p in parts] + boundary)
+    acc.L_classical = math.fsum(p.L_classical for p in parts)
+    acc.max_step = max([p.max_step for p in parts] + boundary)
+    acc.max_R = max(p.max_R for p in parts)
+    acc.max_Psi = max(p.max_Psi for p in parts)
+    acc.a_min_seen = min(p.a_min_seen for p in parts)
+    acc.deny_count_a = sum(p.deny_count_a for p in parts)
+    acc.deny_count_step_abs = sum(p.deny_count_step_abs for p in parts)
+    if acc.spike_abs is not None:
+        acc.deny_count_step_abs += sum(1 for st in boundary if st > acc.spike_abs)
+    for p in parts[1:]:
+        if acc.steps is not None:
+            acc.steps.extend(p.steps)
+        else:
+            acc.sketch.merge(p.sketch)
+    if acc.steps is not None:
+        acc.steps.extend(boundary)
+    else:
+        acc.sketch.update(boundary)
+
+    if acc.window is not None:
+        # A range gates only steps with a full window inside the range; its first W steps (and
+        # the boundary step before it) are gated here against the true preceding steps.
+        acc.deny_count_step_window = sum(p.deny_count_step_window for p in parts)
+        history = acc.window
+        for st, p in zip(boundary, parts[1:]):
+            for x in [st] + list(p.window_head):
+                if history.full and x > acc.window_k * history.value():
+                    acc.deny_count_step_window += 1
+                history.push(x)
+            if p.n_steps > p.window.window:
+                history = p.window
+        acc.window = history
+
+    last = parts[-1]
+    acc.rows = sum(p.rows for p in parts)
+    acc.k_prev, acc.u_prev, acc.v_prev = last.k_prev, last.u_prev, last.v_prev
+    return acc
+
+
+# Worker pools of the chunked engine, kept for the whole run: starting one per trace costs more
+# than evaluating a small trace.
+_chunk_pools: Dict[int, ProcessPoolExecutor] = {}
+
+
+def chunk_pool(workers: int) -> ProcessPoolExecutor:
+    ex = _chunk_pools.get(workers)
+    if ex is None:
+        ex = _chunk_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return ex
+
+
+def close_chunk_pools() -> None:
+    while _chunk_pools:
+        _chunk_pools.popitem()[1].shutdown()
+
+
+atexit.register(close_chunk_pools)
+
+
+def compute_base_chunked(path: Path, eps_atanh: float, gate: "GateConfig", chunk_bytes: int, workers: int = 1,
+                         exact: bool = False, alpha: float = DEFAULT_ALPHA,
+                         profile: MetricProfile = CANONICAL) -> Tuple[RouteMetrics, RouteAccumulator]:
+    """compute_base_stream for one CSV trace split into byte ranges evaluated by worker processes.
+
+    Counts, extrema and quantile state merge exactly; sums are fsum-reduced per range (see
+    merge_accumulators), so the metrics are the same for any number of workers and L_struct /
+    L_classical equal the sequential engine's within rtol, not bit for bit. As the result does not
+    depend on the worker count, workers is capped at the CPU count; one worker evaluates in process.
+    """
+    cols, ranges = trace_ranges(path, chunk_bytes)
+    starts = [s for s, _ in ranges]
+    ends = [e for _, e in ranges]
+    run = partial(accumulate_range, path, cols, eps_atanh=eps_atanh, gate=gate, exact=exact, alpha=alpha,
+                  profile=profile)
+
+    workers = min(workers, len(ranges), os.cpu_count() or 1)
+    mapper = chunk_pool(workers).map if workers > 1 else map
+    results = list(mapper(run, starts, ends, [0] * len(ranges)))
+    # Canonical rows with a missing/malformed 'k' use their row index, which a range only
+    # knows once the rows before it are counted: redo those ranges with the true offset.
+    offsets = [0]
+    for acc, _ in results[:-1]:
+        offsets.append(offsets[-1] + acc.rows)
+    coord = profile.coord
+    redo = [i for i, (_, bad) in enumerate(results)
+            if i > 0 and not profile.delta_coord and (coord not in cols or bad.get(coord))]
+    if redo:
+        again = mapper(run, [starts[i] for i in redo], [ends[i] for i in redo], [offsets[i] for i in redo])
+        for i, res in zip(redo, again):
+            results[i] = res
+
+    if not any(acc.rows for acc, _ in results):
+        raise SystemExit(f"Empty CSV: {path.as_posix()}")
+    acc = merge_accumulators([acc for acc, _ in results])
+    bad: Dict[str, int] = {}
+    for _, part_bad in results:
+        for col, n in part_bad.items():
+            bad[col] = bad.get(col, 0) + n
+    rm = acc.metrics()
+    rm.malformed = bad
+    return rm, acc
+
+
+def load_columns_numpy(path: Path, eps_atanh: float, bad: Optional[Dict[str, int]] = None,
+                       profile: MetricProfile = CANONICAL):
+    if is_columnar(path):
+        k, u, v, a = load_columns_columnar(path, eps_atanh, bad, profile)
+        return tuple(np.frombuffer(c, dtype=np.float64) for c in (k, u, v, a))
+
+    with open_text(path) as f:
+        cols = next(csv.reader(f), None) or []
+
+    pos = {name: i for i, name in enumerate(cols)}
+    use_uv = profile.require_columns(pos.__contains__, path.name)
+
+    coord = profile.coord
+    names = ([coord] if coord in pos else []) + (["u", "v"] if use_uv else []) + (["a"] if "a" in pos else [])
+    if not use_uv:
+        names.append("s")
+
+    try:
+        with (open_text(path) if is_compressed(path) else nullcontext(path)) as src:
+            data = np.loadtxt(src, delimiter=",", skiprows=1, usecols=[pos[n] for n in names],
+                              dtype=np.float64, ndmin=2, comments=None, encoding="utf-8")
+    except ValueError:
+        data = None
+
+    if data is None:
+        # Empty or malformed cells: fall back to the reference parsing rules.
+        return tuple(np.frombuffer(c, dtype=np.float64) for c in load_columns(path, eps_atanh, bad, profile))
+
+    if data.shape[0] == 0:
+        raise SystemExit(f"Empty CSV: {path.as_posix()}")
+
+    col = {n: data[:, i] for i, n in enumerate(names)}
+    n = data.shape[0]
+    k = col[coord] if coord in col else np.arange(n, dtype=np.float64)
+    if use_uv:
+        u = col["u"]
+        v = col["v"]
+        a = col["a"] if "a" in col else np.full(n, np.nan)
+    else:
+        a = col["a"]
+        lo, hi = -1.0 + eps_atanh, 1.0 - eps_atanh
+        xa = np.clip(a, lo, hi)
+        xs = np.clip(col["s"], lo, hi)
+        u = 0.5 * np.log((1.0 + xa) / (1.0 - xa))
+        v = 0.5 * np.log((1.0 + xs) / (1.0 - xs))
+    return k, u, v, a
+
+
+def radius_arrays(u, v, psi_scale: float = 1.0):
+    psi = u * u + v * v
+    return np.sqrt(psi), (psi_scale * psi if psi_scale != 1.0 else psi)
+
+
+def step_arrays(k, u, v, deltas: bool = False):
+    dm = k[:-1] if deltas else np.diff(k)
+    du = np.diff(u)
+    dv = np.diff(v)
+    step_costs = np.sqrt(dm * dm + du * du + dv * dv)
+    return step_costs, float(step_costs.sum())
+
+
+def step_quantiles_arrays(step_costs) -> Tuple[float, float, float]:
+    sc_sorted = np.sort(step_costs) if step_costs.size else np.zeros(1)
+    return float(percentile(sc_sorted, 50.0)), float(percentile(sc_sorted, 95.0)), float(sc_sorted[-1])
+
+
+def compute_base_numpy(path: Path, eps_atanh: float, profile: MetricProfile = CANONICAL):
+    bad: Dict[str, int] = {}
+    k, u, v, a = load_columns_numpy(path, eps_atanh, bad, profile)
+    return compute_arrays(path.name, k, u, v, a, bad, profile)
+
+
+def compute_arrays(route: str, k, u, v, a, bad: Optional[Dict[str, int]] = None, profile: MetricProfile = CANONICAL):
+    R, psi = radius_arrays(u, v, profile.psi_scale)
+    step_costs, L_steps = step_arrays(k, u, v, profile.delta_coord)
+    quantiles = step_quantiles_arrays(step_costs)
+    rm = arrays_metrics(route, k, R, psi, L_steps, quantiles, a, profile)
+    rm.malformed = bad if bad is not None else {}
+    return rm, step_costs, a
+
+
+def arrays_metrics(route: str, k, R, psi, L_steps: float, quantiles: Tuple[float, float, float], a,
+                   profile: MetricProfile = CANONICAL) -> RouteMetrics:
+    L_classical = float(np.abs(k).sum()) if profile.delta_coord else 0.0
+    progress, L_struct, eta = profile.totals(float(k[0]), float(k[-1]), L_steps, L_classical)
+
+    med_step, p95_step, max_step = quantiles
+
+    a_ok = a[a == a]
+    a_min_seen = float(a_ok.min()) if a_ok.size else float("nan")
+
+    return RouteMetrics(
+        route=route,
+        rows=int(k.shape[0]),
+        progress=progress,
+        L_struct=L_struct,
+        eta=eta,
+        denied=0,
+        deny_reason="",
+        deny_class="",
+        a_min_seen=a_min_seen,
+        deny_count_a=0,
+        median_step=med_step,
+        p95_step=p95_step,
+        max_step=max_step,
+        max_R=float(R.max()),
+        max_Psi=float(psi.max()),
+        L_classical=L_classical,
+    )
+
+
+@dataclass
+class GateConfig:
+    a_min: float = 0.05
+    step_spike_mode: str = "none"
+    step_spike: Optional[float] = None
+    step_spike_k: float = 1.2
+    deny_mode: str = "any"
+    deny_frac: float = 0.01
+    step_spike_window: int = 100
+    step_spike_window_stat: str = "p95"
+
+
+WINDOW_STATS = {"median": 50.0, "p95": 95.0}
+
+
+def spike_window(gate: GateConfig) -> Optional[Tuple[int, float, float]]:
+    """(W, percentile, k) for the rel_window gate: step i is a violation if it exceeds k times the
+    percentile of the W steps before it. The first W steps (no full window yet) are not gated."""
+    if gate.step_spike_mode != "rel_window":
+        return None
+    if gate.step_spike_window < 1:
+        raise SystemExit("--step_spike_window must be >= 1")
+    return int(gate.step_spike_window), WINDOW_STATS[gate.step_spike_window_stat], float(gate.step_spike_k)
+
+
+def window_violation_steps(step_costs: Iterable[float], gate: GateConfig) -> Iterator[int]:
+    """Indices of the steps that violate the rel_window gate, in order; O(n log W)."""
+    w, p, k = spike_window(gate)
+    rolling = RollingQuantile(w, p)
+    for i, st in enumerate(step_costs):
+        if rolling.full and st > k * rolling.value():
+            yield i
+        rolling.push(st)
+
+
+def window_violations(step_costs: Iterable[float], gate: GateConfig) -> int:
+    """rel_window violations over ordered step costs."""
+    return sum(1 for _ in window_violation_steps(step_costs, gate))
+
+
+def spike_threshold(gate: GateConfig, r: RouteMetrics) -> Optional[float]:
+    if gate.step_spike_mode == "abs":
+        if gate.step_spike is None:
+            raise SystemExit("--step_spike required when --step_spike_mode abs")
+        return float(gate.step_spike)
+    if not r.complete:
+        # Relative thresholds are undefined for a route that was only partially read.
+        return None
+    if gate.step_spike_mode == "rel_p95":
+        return float(gate.step_spike_k) * float(r.p95_step)
+    if gate.step_spike_mode == "rel_median":
+        return float(gate.step_spike_k) * float(r.median_step)
+    return None
+
+
+def apply_gates(r: RouteMetrics, gate: GateConfig, deny_count_a: int, deny_count_step: int, n_steps: int,
+                thr: Optional[float]) -> None:
+    r.deny_count_a = deny_count_a
+    # rel_window has a threshold per step rather than one per route.
+    step_gated = thr is not None or gate.step_spike_mode == "rel_window"
+
+    denied = 0
+    reasons: List[str] = []
+
+    if gate.deny_mode == "any":
+        if deny_count_a > 0:
+            reasons.append(f"a<a_min ({deny_count_a})")
+        if step_gated and deny_count_step > 0:
+            reasons.append(f"step>thr ({deny_count_step})")
+        if reasons:
+            denied = 1
+    else:
+        # A route stopped by --early_exit has only partial counts: report them, not a fraction.
+        if r.a_min_seen == r.a_min_seen:
+            frac_a = deny_count_a / max(1, r.rows)
+            if frac_a > gate.deny_frac:
+                reasons.append(f"a<a_min frac={frac_a:.6g}>{gate.deny_frac}" if r.complete else
+                               f"a<a_min frac>{gate.deny_frac} ({deny_count_a} before early exit)")
+        if step_gated:
+            frac_s = deny_count_step / max(1, max(1, n_steps))
+            if frac_s > gate.deny_frac:
+                reasons.append(f"step>thr frac={frac_s:.6g}>{gate.deny_frac}" if r.complete else
+                               f"step>thr frac>{gate.deny_frac} ({deny_count_step} before early exit)")
+        if reasons:
+            denied = 1
+
+    r.denied = denied
+    r.deny_reason = "; ".join(reasons)
+    r.deny_class = classify_deny(r.deny_reason)
+
+
+def gate_route(r: RouteMetrics, step_costs: List[float], a_vals: List[float], gate: GateConfig) -> None:
+    deny_count_a = 0
+    if r.a_min_seen == r.a_min_seen:
+        for av in a_vals:
+            if av == av and av < gate.a_min:
+                deny_count_a += 1
+
+    thr = spike_threshold(gate, r)
+
+    deny_count_step = 0
+    if thr is not None:
+        for st in step_costs:
+            if st > thr:
+                deny_count_step += 1
+    elif gate.step_spike_mode == "rel_window":
+        deny_count_step = window_violations(step_costs, gate)
+
+    apply_gates(r, gate, deny_count_a, deny_count_step, len(step_costs), thr)
+
+
+def gate_arrays(r: RouteMetrics, step_costs, a_vals, gate: GateConfig) -> None:
+    deny_count_a = 0
+    if r.a_min_seen == r.a_min_seen:
+        deny_count_a = int(np.count_nonzero(a_vals < gate.a_min))
+
+    thr = spike_threshold(gate, r)
+    deny_count_step = int(np.count_nonzero(step_costs > thr)) if thr is not None else 0
+    if gate.step_spike_mode == "rel_window":
+        deny_count_step = window_violations(step_costs.tolist(), gate)
+
+    apply_gates(r, gate, deny_count_a, deny_count_step, int(step_costs.size), thr)
+
+
+def gate_sorted(r: RouteMetrics, steps_sorted, a_sorted, gate: GateConfig,
+                window_count: Optional[int] = None) -> None:
+    # Counts by binary search over ascending step costs / non-NaN a-values. rel_window needs the
+    # steps in route order, so its count is computed by the caller (window_violations).
+    if gate.step_spike_mode == "rel_window" and window_count is None:
+        raise ValueError("rel_window gating needs step costs in route order, not sorted")
+    deny_count_a = bisect_left(a_sorted, gate.a_min) if r.a_min_seen == r.a_min_seen else 0
+
+    thr = spike_threshold(gate, r)
+    deny_count_step = len(steps_sorted) - bisect_right(steps_sorted, thr) if thr is not None else 0
+    if gate.step_spike_mode == "rel_window":
+        deny_count_step = window_count
+
+    apply_gates(r, gate, deny_count_a, deny_count_step, len(steps_sorted), thr)
+
+
+def gate_stream(r: RouteMetrics, acc: RouteAccumulator, gate: GateConfig) -> None:
+    thr = spike_threshold(gate, r)
+    deny_count_step = acc.count_steps_above(thr) if thr is not None else 0
+    if gate.step_spike_mode == "rel_window":
+        deny_count_step = acc.deny_count_step_window
+    apply_gates(r, gate, acc.deny_count_a, deny_count_step, acc.n_steps, thr)
+
+
+class OnlineRouter:
+    """Incremental router for one append-only route.
+
+    Rows can be added one at a time or in batches; each row costs O(1) amortized. The gated
+    metrics (and so the admit/deny decision) can be read at any moment with metrics(). Relative
+    spike gates use the accumulator's quantile sketch, so they follow the sketch error bound.
+    With exact=True the step costs are kept sorted as they arrive (SortedSteps), so a
+    metrics() call costs O(n / 1024) instead of a sort of every step.
+    """
+
+    def __init__(self, route: str, gate: GateConfig, exact: bool = False, alpha: float = DEFAULT_ALPHA,
+                 profile: MetricProfile = CANONICAL):
+        self.route = route
+        self.gate = gate
+        self.exact = exact
+        self.alpha = alpha
+        self.profile = profile
+        self.reset()
+
+    def reset(self) -> None:
+        self.acc = gate_accumulator(self.route, self.gate, exact=self.exact, alpha=self.alpha, profile=self.profile,
+                                    keep_sorted=True)
+        self.malformed: Dict[str, int] = {}
+
+    @property
+    def rows(self) -> int:
+        return self.acc.rows
+
+    def add(self, k: float, u: float, v: float, a: float) -> None:
+        self.acc.add(k, u, v, a)
+
+    def extend(self, rows: Iterable[Tuple[float, float, float, float]]) -> None:
+        add = self.acc.add
+        for k, u, v, a in rows:
+            add(k, u, v, a)
+
+    def metrics(self) -> RouteMetrics:
+        if self.acc.rows == 0:
+            raise ValueError(f"{self.route}: no rows yet")
+        rm = self.acc.metrics()
+        rm.malformed = dict(self.malformed)
+        gate_stream(rm, self.acc, self.gate)
+        return rm
+
+    @property
+    def denied(self) -> bool:
+        return self.acc.rows > 0 and self.metrics().denied == 1
+
+
+def follow_rows(path: Path, eps_atanh: float, bad: Dict[str, int], interval: float = 0.5,
+                idle_timeout: Optional[float] = None,
+                profile: MetricProfile = CANONICAL) -> Iterator[Optional[List[Tuple[float, float, float, float]]]]:
+    """Tail an append-only trace CSV, yielding batches of parsed rows as complete lines arrive.
+
+    Yields None when the file shrinks (truncated or replaced); reading then restarts from the top.
+    Returns once the file has not grown for idle_timeout seconds (never, if None).
+    """
+    pos = 0
+    buf = b""
+    parse: Optional[RowParser] = None
+    idx = 0
+    last_growth = time.monotonic()
+
+    while True:
+        size = path.stat().st_size if path.exists() else 0
+        if size < pos:
+            pos, buf, parse, idx = 0, b"", None, 0
+            bad.clear()
+            yield None
+            continue
+
+        if size == pos:
+            if idle_timeout is not None and time.monotonic() - last_growth >= idle_timeout:
+                return
+            time.sleep(interval)
+            continue
+
+        with path.open("rb") as f:
+            f.seek(pos)
+            data = f.read(size - pos)
+        pos += len(data)
+        buf += data
+        last_growth = time.monotonic()
+
+        cut = buf.rfind(b"\n")
+        if cut < 0:
+            continue
+        lines = buf[:cut + 1].decode("utf-8").splitlines()
+        buf = buf[cut + 1:]
+
+        batch = []
+        for row in csv.reader(lines):
+            if parse is None:
+                parse = row_parser(row, eps_atanh, bad, path.name, profile)
+                continue
+            if row:
+                batch.append(parse(row, idx))
+                idx += 1
+        if batch:
+            yield batch
+
+
+@dataclass
+class EngineConfig:
+    engine: str = "python"
+    eps: float = 1e-12
+    exact_quantiles: bool = False
+    sketch_alpha: float = DEFAULT_ALPHA
+    early_exit: bool = False
+    cache_dir: Optional[str] = None
+    cache_max_bytes: int = DEFAULT_MAX_BYTES
+    profile: str = "canonical"
+    chunk_bytes: int = 0
+    chunk_workers: int = 1
+
+    @property
+    def metrics(self) -> MetricProfile:
+        return PROFILES[self.profile]
+
+    @property
+    def cacheable(self) -> bool:
+        return bool(self.cache_dir) and self.engine in ("python", "numpy") and not self.early_exit
+
+
+_caches: Dict[Tuple[str, int], BaseCache] = {}
+
+
+def open_cache(ecfg: EngineConfig) -> BaseCache:
+    key = (ecfg.cache_dir, ecfg.cache_max_bytes)
+    cache = _caches.get(key)
+    if cache is None:
+        cache = _caches[key] = BaseCache(Path(ecfg.cache_dir), ecfg.cache_max_bytes)
+    return cache
+
+
+def compute_base_cached(path: Path, ecfg: EngineConfig):
+    """compute_base through the on-disk cache; returns (metrics, sorted step costs, sorted non-NaN a)."""
+    cache = open_cache(ecfg)
+    key = cache.key_for(path, ecfg.eps, f"{ecfg.engine}/{ecfg.profile}")
+    hit = cache.get(key)
+    if hit is not None:
+        meta, steps_sorted, a_sorted = hit
+        return RouteMetrics(**meta), steps_sorted, a_sorted
+
+    rm, steps_sorted, a_sorted = compute_base_sorted(path, replace(ecfg, cache_dir=None))
+    cache.put(key, asdict(rm), steps_sorted, a_sorted)
+    return rm, steps_sorted, a_sorted
+
+
+def compute_base_sorted(path: Path, ecfg: EngineConfig):
+    """(metrics, ascending step costs, ascending non-NaN a-values) for gate_sorted; cached when enabled."""
+    if ecfg.cacheable:
+        return compute_base_cached(path, ecfg)
+
+    if ecfg.engine == "numpy":
+        rm, step_costs, a_vals = compute_base_numpy(path=path, eps_atanh=ecfg.eps, profile=ecfg.metrics)
+        steps_sorted = np.sort(step_costs)
+        a_sorted = np.sort(a_vals[a_vals == a_vals])
+    else:
+        rm, step_costs, a_vals = compute_base(path=path, eps_atanh=ecfg.eps, profile=ecfg.metrics)
+        steps_sorted = array("d", sorted(step_costs))
+        a_sorted = array("d", sorted(av for av in a_vals if av == av))
+    return rm, steps_sorted, a_sorted
+
+
+def stream_base(path: Path, gate: GateConfig, ecfg: EngineConfig) -> Tuple[RouteMetrics, RouteAccumulator]:
+    exact = ecfg.exact_quantiles or ecfg.engine != "stream"
+    if ecfg.chunk_bytes and not ecfg.early_exit and not is_columnar(path) and not is_compressed(path):
+        return compute_base_chunked(path, ecfg.eps, gate, ecfg.chunk_bytes, ecfg.chunk_workers,
+                                    exact=exact, alpha=ecfg.sketch_alpha, profile=ecfg.metrics)
+    return compute_base_stream(path=path, eps_atanh=ecfg.eps, gate=gate, exact=exact, alpha=ecfg.sketch_alpha,
+                               early_exit=ecfg.early_exit, profile=ecfg.metrics)
+
+
+def evaluate_bundle_route(ref: BundleRoute, gate: GateConfig, ecfg: EngineConfig) -> RouteMetrics:
+    """evaluate_route for one route of a bundle. The rows come from one read in the open bundle and
+    follow the reference parsing rules; the cache is not used (its entries are keyed by file)."""
+    bad: Dict[str, int] = {}
+    parse = row_parser(list(ref.header), ecfg.eps, bad, ref.name, ecfg.metrics)
+    rows = (parse(row, i) for i, row in enumerate(route_rows(ref)))
+    if ecfg.engine == "stream" or ecfg.early_exit:
+        acc = gate_accumulator(ref.name, gate, exact=ecfg.exact_quantiles or ecfg.engine != "stream",
+                               alpha=ecfg.sketch_alpha, profile=ecfg.metrics)
+        decided = early_deny_check(ref.bundle, gate, ref.rows) if ecfg.early_exit else None
+        complete = accumulate_rows(acc, rows, decided)
+        if not acc.rows:
+            raise SystemExit(f"Empty route: {ref.name} in {ref.bundle.as_posix()}")
+        rm = acc.metrics()
+        rm.complete = complete
+        rm.malformed = bad
+        gate_stream(rm, acc, gate)
+        return rm
+
+    cols = tuple(array("d", c) for c in zip(*rows))
+    if not cols:
+        raise SystemExit(f"Empty route: {ref.name} in {ref.bundle.as_posix()}")
+    if ecfg.engine == "numpy" and np is not None:
+        rm, step_costs, a_vals = compute_arrays(ref.name, *(np.frombuffer(c, dtype=np.float64) for c in cols),
+                                                bad, ecfg.metrics)
+        gate_arrays(rm, step_costs, a_vals, gate)
+    else:
+        rm, step_costs, a_vals = compute_columns(ref.name, *cols, ecfg.metrics)
+        rm.malformed = bad
+        gate_route(rm, step_costs, a_vals, gate)
+    return rm
+
+
+def evaluate_route(path: Path, gate: GateConfig, ecfg: EngineConfig) -> RouteMetrics:
+    """compute_base + gating for one route; only the compact RouteMetrics is returned."""
+    if isinstance(path, BundleRoute):
+        return evaluate_bundle_route(path, gate, ecfg)
+    if ecfg.cacheable and gate.step_spike_mode != "rel_window":
+        rm, steps_sorted, a_sorted = compute_base_cached(path, ecfg)
+        gate_sorted(rm, steps_sorted, a_sorted, gate)
+    elif ecfg.engine == "stream" or ecfg.early_exit:
+        rm, acc = stream_base(path, gate, ecfg)
+        gate_stream(rm, acc, gate)
+    elif ecfg.engine == "numpy":
+        rm, step_costs, a_vals = compute_base_numpy(path=path, eps_atanh=ecfg.eps, profile=ecfg.metrics)
+        gate_arrays(rm, step_costs, a_vals, gate)
+    else:
+        rm, step_costs, a_vals = compute_base(path=path, eps_atanh=ecfg.eps, profile=ecfg.metrics)
+        gate_route(rm, step_costs, a_vals, gate)
+    return rm
+
+
+STAGES = ["parse", "transform", "steps", "percentiles", "gating", "output"]
+
+
+class StageProfiler:
+    """Wall time and allocation peak per stage; lap(stage) charges everything since the last lap.
+
+    The allocation peak of a stage is the tracemalloc peak above the memory already traced when
+    the stage began; it is only recorded while tracemalloc is tracing.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+        self.peaks: Dict[str, int] = {}
+        self.max_traced = 0
+        self.restart()
+
+    def restart(self) -> None:
+        self._base = 0
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+        self._t = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.times[stage] = self.times.get(stage, 0.0) + (now - self._t)
+        if tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peaks[stage] = max(self.peaks.get(stage, 0), peak - self._base)
+            self.max_traced = max(self.max_traced, peak)
+        self.restart()
+
+    def merge(self, other: "StageProfiler") -> None:
+        for stage, t in other.times.items():
+            self.times[stage] = self.times.get(stage, 0.0) + t
+        for stage, peak in other.peaks.items():
+            self.peaks[stage] = max(self.peaks.get(stage, 0), peak)
+        self.max_traced = max(self.max_traced, other.max_traced)
+
+    def stages(self) -> Dict[str, Dict[str, object]]:
+        names = STAGES + sorted(set(self.times) - set(STAGES))
+        return {s: {"wall_s": self.times[s], "alloc_peak_bytes": self.peaks.get(s)} for s in names if s in self.times}
+
+
+def evaluate_route_staged(path: Path, gate: GateConfig, ecfg: EngineConfig, clock: StageProfiler) -> RouteMetrics:
+    """evaluate_route built from its pieces, with clock.lap() after each stage.
+
+    'parse' includes the a,s -> u,v transform (it happens while rows are decoded). Engines that
+    fuse stages (stream, --early_exit, cache hits) charge the fused time to 'parse'.
+    """
+    if ecfg.cacheable and gate.step_spike_mode != "rel_window":
+        rm, steps_sorted, a_sorted = compute_base_cached(path, ecfg)
+        clock.lap("parse")
+        gate_sorted(rm, steps_sorted, a_sorted, gate)
+        clock.lap("gating")
+        return rm
+
+    profile = ecfg.metrics
+    if ecfg.engine == "stream" or ecfg.early_exit:
+        rm, acc = stream_base(path, gate, ecfg)
+        clock.lap("parse")
+        gate_stream(rm, acc, gate)
+        clock.lap("gating")
+        return rm
+
+    bad: Dict[str, int] = {}
+    if ecfg.engine == "numpy":
+        k, u, v, a = load_columns_numpy(path, ecfg.eps, bad, profile)
+        clock.lap("parse")
+        R, psi = radius_arrays(u, v, profile.psi_scale)
+        clock.lap("transform")
+        step_costs, L_steps = step_arrays(k, u, v, profile.delta_coord)
+        clock.lap("steps")
+        quantiles = step_quantiles_arrays(step_costs)
+        clock.lap("percentiles")
+        rm = arrays_metrics(path.name, k, R, psi, L_steps, quantiles, a, profile)
+        gate_arrays(rm, step_costs, a, gate)
+    else:
+        k, u, v, a = load_columns(path, ecfg.eps, bad, profile)
+        clock.lap("parse")
+        R, psi = radius_columns(u, v, profile.psi_scale)
+        clock.lap("transform")
+        step_costs, L_steps = step_columns(k, u, v, profile.delta_coord)
+        clock.lap("steps")
+        quantiles = step_quantiles(step_costs)
+        clock.lap("percentiles")
+        rm = columns_metrics(path.name, k, R, psi, L_steps, quantiles, a, profile)
+        gate_route(rm, step_costs, a, gate)
+    rm.malformed = bad
+    clock.lap("gating")
+    return rm
+
+
+def profile_route(path: Path, gate: GateConfig, ecfg: EngineConfig,
+                  trace_memory: bool = True) -> Tuple[RouteMetrics, StageProfiler]:
+    """evaluate_route_staged under a fresh StageProfiler (tracemalloc is started if not already tracing)."""
+    started = trace_memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        clock = StageProfiler()
+        rm = evaluate_route_staged(path, gate, ecfg, clock)
+    finally:
+        if started:
+            tracemalloc.stop()
+    return rm, clock
+
+
+def iter_evaluate(paths: List[Path], gate: GateConfig, ecfg: EngineConfig, workers: int = 1,
+                  evaluate: Callable = evaluate_route) -> Iterator:
+    """Yield evaluate(path, gate, ecfg) (gated metrics by default) route by route, in input order.
+
+    A route's per-row data is released inside evaluate_route, so at most one route per worker is
+    held in memory at a time.
+    """
+    if workers <= 1:
+        for path in paths:
+            yield evaluate(path, gate, ecfg)
+        return
+    # Executor.map yields in submission order, so output never depends on completion order.
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        yield from ex.map(evaluate, paths, repeat(gate), repeat(ecfg), chunksize=chunksize)
+
+
+def evaluate_parallel(paths: List[Path], gate: GateConfig, ecfg: EngineConfig, workers: int) -> List[RouteMetrics]:
+    return list(iter_evaluate(paths, gate, ecfg, workers))
+
+
+class RouteRecord:
+    """Compact copy of a gated RouteMetrics: the same attributes in __slots__, no per-row data."""
+
+    __slots__ = tuple(f.name for f in dataclass_fields(RouteMetrics))
+
+    def __init__(self, r: RouteMetrics):
+        for name in self.__slots__:
+            setattr(self, name, getattr(r, name))
+
+
+# In-memory traces: column name -> numbers (list, array('d') or NumPy array), one value per row.
+TraceColumns = Mapping[str, Sequence[float]]
+
+
+def trace_columns(headers: Sequence[str], rows: Iterable[Sequence]) -> Dict[str, array]:
+    """Numeric columns of a trace given as header + rows (e.g. ssr_tracegen.make_trace()).
+
+    Text columns (such as 'event') are skipped; they are not used by the router.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return {}
+    keep = [(i, h) for i, h in enumerate(headers) if i < len(first) and to_float(first[i]) is not None]
+    cols = {h: array("d", [float(first[i])]) for i, h in keep}
+    for row in rows:
+        for i, h in keep:
+            cols[h].append(float(row[i]))
+    return cols
+
+
+def columns_from_buffers(route: str, cols: TraceColumns, eps_atanh: float, profile: MetricProfile = CANONICAL,
+                         numpy_arrays: bool = False):
+    """(k, u, v, a) from in-memory columns, following load_columns: u,v when both are present
+    (a is NaN if absent), otherwise atanh of clamped a,s; a missing coordinate column is the row index."""
+    use_uv = profile.require_columns(cols.__contains__, route)
+    n = len(cols["u"] if use_uv else cols["a"])
+    if n == 0:
+        raise SystemExit(f"Empty trace: {route}")
+    for name in (profile.coord, "u", "v", "a", "s"):
+        if name in cols and len(cols[name]) != n:
+            raise SystemExit(f"{route}: column '{name}' has {len(cols[name])} values, expected {n}")
+
+    if numpy_arrays:
+        k = np.asarray(cols[profile.coord], dtype=np.float64) if profile.coord in cols \
+            else np.arange(n, dtype=np.float64)
+        if use_uv:
+            u = np.asarray(cols["u"], dtype=np.float64)
+            v = np.asarray(cols["v"], dtype=np.float64)
+            a = np.asarray(cols["a"], dtype=np.float64) if "a" in cols else np.full(n, np.nan)
+        else:
+            a = np.asarray(cols["a"], dtype=np.float64)
+            lo, hi = -1.0 + eps_atanh, 1.0 - eps_atanh
+            xa = np.clip(a, lo, hi)
+            xs = np.clip(np.asarray(cols["s"], dtype=np.float64), lo, hi)
+            u = 0.5 * np.log((1.0 + xa) / (1.0 - xa))
+            v = 0.5 * np.log((1.0 + xs) / (1.0 - xs))
+        return k, u, v, a
+
+    def as_array(col) -> array:
+        return col if isinstance(col, array) and col.typecode == "d" else array("d", map(float, col))
+
+    k = as_array(cols[profile.coord]) if profile.coord in cols else array("d", map(float, range(n)))
+    if use_uv:
+        u = as_array(cols["u"])
+        v = as_array(cols["v"])
+        a = as_array(cols["a"]) if "a" in cols else array("d", [float("nan")]) * n
+    else:
+        a = as_array(cols["a"])
+        u = array("d", (atanh_safe(x, eps=eps_atanh) for x in a))
+        v = array("d", (atanh_safe(x, eps=eps_atanh) for x in as_array(cols["s"])))
+    return k, u, v, a
+
+
+def evaluate_columns(route: str, cols: TraceColumns, gate: GateConfig, ecfg: EngineConfig) -> RouteMetrics:
+    """evaluate_route for a trace held in memory: no file, no CSV parsing.
+
+    --engine numpy uses the vectorized engine; every other engine runs the reference engine, which
+    gives the exact quantiles the stream engine approximates.
+    """
+    if ecfg.engine == "numpy" and np is not None:
+        k, u, v, a = columns_from_buffers(route, cols, ecfg.eps, ecfg.metrics, numpy_arrays=True)
+        rm, step_costs, a_vals = compute_arrays(route, k, u, v, a, profile=ecfg.metrics)
+        gate_arrays(rm, step_costs, a_vals, gate)
+    else:
+        k, u, v, a = columns_from_buffers(route, cols, ecfg.eps, ecfg.metrics)
+        rm, step_costs, a_vals = compute_columns(route, k, u, v, a, ecfg.metrics)
+        gate_route(rm, step_costs, a_vals, gate)
+    return rm
+
+
+def rank_routes(routes: Iterable[RouteMetrics], rank: str = "L_struct",
+                profile: MetricProfile = CANONICAL) -> List[RouteMetrics]:
+    """Allowed routes, best first (the order of the report and of ssr_sweep)."""
+    return sorted((r for r in routes if r.denied == 0), key=profile.rank_key(rank))
+
+
+@dataclass
+class RoutingResult:
+    routes: List[RouteMetrics]      # gated metrics in input order
+    gate: GateConfig
+    rank: str
+    profile: MetricProfile
+
+    @property
+    def ranked(self) -> List[RouteMetrics]:
+        return rank_routes(self.routes, self.rank, self.profile)
+
+    @property
+    def denied(self) -> List[RouteMetrics]:
+        return [r for r in self.routes if r.denied == 1]
+
+    def route(self, name: str) -> RouteMetrics:
+        for r in self.routes:
+            if r.route == name:
+                return r
+        raise KeyError(name)
+
+    def summary_rows(self) -> List[Dict[str, object]]:
+        """The summary CSV rows the CLI would write, as dicts."""
+        names = summary_fields(self.profile)
+        return [{k: v for k, v in summary_row(r, self.gate).items() if k in names} for r in self.routes]
+
+
+def evaluate_routes(traces: Union[Mapping[str, Union[TraceColumns, Path, str]], Iterable[Union[Path, str, BundleRoute]]],
+                    gate: Optional[GateConfig] = None, ecfg: Optional[EngineConfig] = None,
+                    rank: str = "L_struct", workers: int = 1,
+                    on_route: Optional[Callable[[RouteMetrics], None]] = None,
+                    compact: bool = False) -> RoutingResult:
+    """Evaluate, gate and rank routes in one call; the library form of the CLI batch run.
+
+    traces maps route names to in-memory columns (TraceColumns: sequences, array('d') or NumPy
+    arrays keyed by column name) or to trace files, or is an iterable of trace files and bundle
+    routes (expand_inputs). Files and bundle routes go through evaluate_route, in `workers` processes when workers > 1; columns never touch disk.
+    on_route is called with each result in input order as soon as it is ready; compact keeps
+    RouteRecords instead of RouteMetrics.
+    """
+    gate = gate if gate is not None else GateConfig()
+    ecfg = ecfg if ecfg is not None else EngineConfig()
+    spike_window(gate)
+    if isinstance(traces, Mapping):
+        items = list(traces.items())
+    else:
+        items = [(p.name, p) if isinstance(p, BundleRoute) else (Path(p).name, Path(p)) for p in traces]
+
+    stored = (str, Path, BundleRoute)
+    files = [t if isinstance(t, BundleRoute) else Path(t) for _, t in items if isinstance(t, stored)]
+    from_files = iter_evaluate(files, gate, ecfg, workers)
+    routes: List[RouteMetrics] = []
+    for name, t in items:
+        if isinstance(t, stored):
+            r = next(from_files)
+        else:
+            r = evaluate_columns(name, t, gate, ecfg)
+        if on_route is not None:
+            on_route(r)
+        routes.append(RouteRecord(r) if compact else r)
+    return RoutingResult(routes, gate, rank, ecfg.metrics)
+
+
+# Relative slack on L_struct lower bounds: the engines sum rounded step costs, so a computed
+# L_struct can fall short of the exact bound by a few ulps per step.
+BOUND_RTOL = 1e-6
+
+
+def trace_endpoints(path: Path) -> Tuple[List[str], Optional[List[str]], Optional[List[str]], bool]:
+    """(header, first data row, last data row, single_row) of a CSV trace, reading only its two ends."""
+    with path.open("rb") as f:
+        header = f.readline()
+        first = b""
+        while not first.strip():
+            first = f.readline()
+            if not first:
+                return next(csv.reader([header.decode("utf-8")]), []), None, None, False
+        first_end = f.tell()
+
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        block = 4096
+        data = b""
+        while True:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+            tail = data.rstrip()
+            nl = tail.rfind(b"\n")
+            if nl >= 0 or pos == 0:
+                break
+            block *= 2
+        last_start = pos + nl + 1
+
+    def parse(line: bytes) -> List[str]:
+        return next(csv.reader([line.decode("utf-8")]), [])
+
+    return parse(header), parse(first), parse(tail[nl + 1:]), last_start < first_end
+
+
+def l_struct_lower_bound(path: Path, profile: MetricProfile = CANONICAL) -> Optional[float]:
+    """Cheap lower bound on a route's L_struct from its first and last rows, or None if unavailable.
+
+    Every step costs at least its coordinate term: canonical steps at least |k[i+1] - k[i]|, so
+    L_struct >= |k_last - k_first|; mission step i at least |dx[i]|, plus the final |dx[-1]|.
+    Plain CSV and .ssrc traces have one; bundle routes and compressed traces (whose last row is
+    only reachable by decompressing the whole trace) do not, nor do traces without the coordinate.
+    """
+    coord = profile.coord
+    if isinstance(path, BundleRoute) or is_compressed(path):
+        return None
+    if is_columnar(path):
+        t = ColumnarTrace(path)
+        if coord not in t or t.nrows == 0:
+            return None
+        col = t.column(coord)
+        first, last, single = col[0], col[-1], t.nrows == 1
+    else:
+        cols, first_row, last_row, single = trace_endpoints(path)
+        if coord not in cols or first_row is None:
+            return None
+        i = cols.index(coord)
+        try:
+            first, last = float(first_row[i]), float(last_row[i])
+        except (ValueError, IndexError):
+            return None
+
+    if profile.delta_coord:
+        bound = abs(last) if single else abs(first) + abs(last)
+    else:
+        bound = abs(last - first)
+    if bound != bound:
+        return None
+    return bound * (1.0 - BOUND_RTOL)
+
+
+def evaluate_top(paths: List[Path], gate: GateConfig, ecfg: EngineConfig, top: int, rank: str,
+                 workers: int = 1) -> Tuple[List[RouteMetrics], int, int]:
+    """Evaluate just enough routes to know the top K allowed ones by rank.
+
+    For rank L_struct, routes are evaluated in order of their L_struct lower bound; once a bound
+    exceeds the K-th best L_struct so far, no remaining route can enter the top K and the rest are
+    skipped. Routes without a bound (see l_struct_lower_bound) are always evaluated, and other rank
+    keys have no cheap bound, so then every route is evaluated. Ties keep input order, as in the
+    full ranking. Returns (evaluated routes in input order, number pruned, number with a bound).
+    """
+    key = ecfg.metrics.rank_key(rank)
+    if rank == "L_struct":
+        bounds = [l_struct_lower_bound(p, ecfg.metrics) for p in paths]
+        bounded = sum(1 for b in bounds if b is not None)
+        bounds = [-math.inf if b is None else b for b in bounds]
+    else:
+        bounds = [-math.inf] * len(paths)
+        bounded = 0
+    order = sorted(range(len(paths)), key=lambda i: (bounds[i], i))
+
+    worst: List[Tuple[float, int]] = []   # K best (key, idx) as a max-heap of (-key, -idx)
+    evaluated: Dict[int, RouteMetrics] = {}
+
+    def admit(i: int, r: RouteMetrics) -> None:
+        evaluated[i] = r
+        if r.denied:
+            return
+        item = (-key(r), -i)
+        if len(worst) < top:
+            heapq.heappush(worst, item)
+        elif item > worst[0]:
+            heapq.heapreplace(worst, item)
+
+    def pruned_from(pos: int) -> bool:
+        return len(worst) == top and bounds[order[pos]] > -worst[0][0]
+
+    pos = 0
+    if workers > 1:
+        batch = workers * 2
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            while pos < len(order) and not pruned_from(pos):
+                idx = order[pos:pos + batch]
+                for i, r in zip(idx, ex.map(evaluate_route, [paths[i] for i in idx], repeat(gate), repeat(ecfg))):
+                    admit(i, r)
+                pos += len(idx)
+    else:
+        while pos < len(order) and not pruned_from(pos):
+            i = order[pos]
+            admit(i, evaluate_route(paths[i], gate, ecfg))
+            pos += 1
+
+    return [evaluated[i] for i in sorted(evaluated)], len(paths) - len(evaluated), bounded
+
+
+WATCH_SUFFIXES = (".csv", COLUMNAR_SUFFIX) + tuple(".csv" + s for s in COMPRESSED_SUFFIXES)
+
+
+def evaluate_or_error(path: Path, gate: GateConfig, ecfg: EngineConfig) -> Tuple[Optional[RouteMetrics], str]:
+    """evaluate_route that reports unreadable traces (vanished, half-written, bad header) instead of raising."""
+    try:
+        return evaluate_route(path, gate, ecfg), ""
+    except (OSError, ValueError, SystemExit) as e:
+        return None, str(e)
+
+
+class TraceWatcher:
+    """Incrementally evaluated set of traces in one or more directories.
+
+    Every trace is tracked by (size, mtime, content hash). scan() re-evaluates only new or
+    modified traces (a touch that leaves the content unchanged is not re-evaluated) and drops
+    removed ones, so its cost scales with the changed files rather than the directory. The gated
+    metrics of every trace are kept in memory between scans.
+    """
+
+    def __init__(self, dirs: List[Path], gate: GateConfig, ecfg: EngineConfig, workers: int = 1,
+                 exclude: Iterable[Path] = ()):
+        self.dirs = [Path(d) for d in dirs]
+        self.gate = gate
+        self.ecfg = ecfg
+        self.exclude = {Path(p).resolve() for p in exclude}
+        self.files: Dict[Path, Tuple[int, int, str]] = {}
+        self.routes: Dict[Path, RouteRecord] = {}
+        self.errors: Dict[Path, str] = {}
+        self._ex = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def close(self) -> None:
+        if self._ex is not None:
+            self._ex.shutdown()
+            self._ex = None
+
+    def list_traces(self) -> List[Path]:
+        found = []
+        for d in self.dirs:
+            for p in d.iterdir():
+                if p.name.endswith(WATCH_SUFFIXES) and not is_bundle(p) and p.resolve() not in self.exclude and p.is_file():
+                    found.append(p)
+        return sorted(found)
+
+    def scan(self) -> Tuple[List[Path], List[Path], List[Path]]:
+        """Bring the in-memory state up to date; returns (added, modified, removed) traces."""
+        current = self.list_traces()
+        present = set(current)
+        removed = [p for p in self.files if p not in present]
+        for p in removed:
+            del self.files[p]
+            self.routes.pop(p, None)
+            self.errors.pop(p, None)
+
+        added: List[Path] = []
+        modified: List[Path] = []
+        for p in current:
+            try:
+                st = p.stat()
+                old = self.files.get(p)
+                if old is not None and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                    continue
+                digest = content_hash(p)
+            except OSError:
+                continue
+            self.files[p] = (st.st_size, st.st_mtime_ns, digest)
+            if old is None:
+                added.append(p)
+            elif old[2] != digest:
+                modified.append(p)
+
+        changed = added + modified
+        if self._ex is not None and len(changed) > 1:
+            results = self._ex.map(evaluate_or_error, changed, repeat(self.gate), repeat(self.ecfg))
+        else:
+            results = (evaluate_or_error(p, self.gate, self.ecfg) for p in changed)
+        for p, (rm, err) in zip(changed, results):
+            if rm is None:
+                self.routes.pop(p, None)
+                self.errors[p] = err
+            else:
+                self.routes[p] = RouteRecord(rm)
+                self.errors.pop(p, None)
+        return added, modified, removed
+
+    def records(self) -> List[RouteRecord]:
+        return [self.routes[p] for p in sorted(self.routes)]
+
+
+RANK_KEYS = {
+    "L_struct": lambda r: r.L_struct,
+    "eta": lambda r: -r.eta,
+    "p95_step": lambda r: r.p95_step,
+    "max_step": lambda r: r.max_step,
+}
 
 
 def classify_deny(deny_reason: str) -> str:
@@ -185,168 +1852,124 @@ def classify_deny(deny_reason: str) -> str:
     return "NONE"
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--in", dest="inputs", nargs="+", required=True, help="One or more route trace CSVs")
+SUMMARY_FIELDS = [
+    "route", "rows",
+    "denied", "deny_class", "deny_reason",
+    "progress", "L_struct", "eta",
+    "a_min_seen", "deny_count_a",
+    "median_step", "p95_step", "max_step",
+    "max_R", "max_Psi",
+    "spike_mode", "spike_thr"
+]
 
-    ap.add_argument("--a_min", type=float, default=0.05, help="Permission gate: deny if a < a_min (if 'a' present)")
-    ap.add_argument("--eps", type=float, default=1e-12, help="atanh clamp epsilon (if computing u,v from a,s)")
+MISSION_SUMMARY_FIELDS = [
+    "route", "rows",
+    "denied", "deny_reason",
+    "L_classical", "L_struct", "eta",
+    "a_min_seen", "deny_count_a",
+    "median_step", "p95_step", "max_step",
+    "max_R", "max_Psi",
+    "spike_mode", "spike_thr"
+]
 
-    ap.add_argument(
-        "--step_spike_mode",
-        choices=["none", "abs", "rel_p95", "rel_median"],
-        default="none",
-        help="Spike gate mode",
-    )
-    ap.add_argument("--step_spike", type=float, default=None, help="(abs mode) deny if any step > step_spike")
-    ap.add_argument("--step_spike_k", type=float, default=1.2, help="(relative modes) threshold multiplier")
 
-    ap.add_argument("--deny_mode", choices=["any", "fraction"], default="any", help="Deny on any violation, or by fraction")
-    ap.add_argument("--deny_frac", type=float, default=0.01, help="(fraction mode) deny if violations/rows > deny_frac")
+def summary_fields(profile: MetricProfile) -> List[str]:
+    return list(MISSION_SUMMARY_FIELDS if profile.delta_coord else SUMMARY_FIELDS)
 
-    ap.add_argument("--rank", choices=["L_struct", "eta", "p95_step", "max_step"], default="L_struct",
-                    help="Ranking metric among allowed routes")
-    ap.add_argument("--out", default="ssr_routing_summary.csv", help="Output summary CSV")
 
-    args = ap.parse_args()
+def summary_row(r: RouteMetrics, gate: GateConfig) -> Dict[str, object]:
+    thr = spike_threshold(gate, r)
+    thr_s = "" if thr is None else f"{thr:.15g}"
+    return {
+        "route": r.route,
+        "rows": r.rows,
+        "denied": r.denied,
+        "deny_class": r.deny_class,
+        "deny_reason": r.deny_reason,
+        "progress": f"{r.progress:.15g}",
+        "L_classical": f"{r.L_classical:.15g}",
+        "L_struct": f"{r.L_struct:.15g}",
+        "eta": f"{r.eta:.15g}",
+        "a_min_seen": "" if (r.a_min_seen != r.a_min_seen) else f"{r.a_min_seen:.15g}",
+        "deny_count_a": r.deny_count_a,
+        "median_step": f"{r.median_step:.15g}",
+        "p95_step": f"{r.p95_step:.15g}",
+        "max_step": f"{r.max_step:.15g}",
+        "max_R": f"{r.max_R:.15g}",
+        "max_Psi": f"{r.max_Psi:.15g}",
+        "spike_mode": gate.step_spike_mode,
+        "spike_thr": thr_s,
+    }
 
-    routes: List[RouteMetrics] = []
-    steps_map: Dict[str, List[float]] = {}
-    a_map: Dict[str, List[float]] = {}
 
-    for p in args.inputs:
-        path = Path(p)
-        if not path.exists():
-            raise SystemExit(f"Not found: {p}")
-        rm, step_costs, a_vals = compute_base(path=path, eps_atanh=args.eps)
-        routes.append(rm)
-        steps_map[rm.route] = step_costs
-        a_map[rm.route] = a_vals
+class SummaryWriter:
+    """Writes the summary CSV one route at a time (header on construction)."""
 
-    for r in routes:
-        a_vals = a_map[r.route]
-        step_costs = steps_map[r.route]
+    def __init__(self, f, gate: GateConfig, profile: MetricProfile = CANONICAL, with_complete: bool = False):
+        self.gate = gate
+        self.with_complete = with_complete
+        names = summary_fields(profile) + (["complete"] if with_complete else [])
+        self.w = csv.DictWriter(f, fieldnames=names, extrasaction="ignore")
+        self.w.writeheader()
 
-        deny_count_a = 0
-        if r.a_min_seen == r.a_min_seen:
-            for av in a_vals:
-                if av == av and av < args.a_min:
-                    deny_count_a += 1
-
-        thr: Optional[float] = None
-        if args.step_spike_mode == "abs":
-            if args.step_spike is None:
-                raise SystemExit("--step_spike required when --step_spike_mode abs")
-            thr = float(args.step_spike)
-        elif args.step_spike_mode == "rel_p95":
-            thr = float(args.step_spike_k) * float(r.p95_step)
-        elif args.step_spike_mode == "rel_median":
-            thr = float(args.step_spike_k) * float(r.median_step)
-
-        deny_count_step = 0
-        if thr is not None:
-            for st in step_costs:
-                if st > thr:
-                    deny_count_step += 1
-
-        r.deny_count_a = deny_count_a
-
-        denied = 0
-        reasons: List[str] = []
-
-        if args.deny_mode == "any":
-            if deny_count_a > 0:
-                reasons.append(f"a<a_min ({deny_count_a})")
-            if thr is not None and deny_count_step > 0:
-                reasons.append(f"step>thr ({deny_count_step})")
-            if reasons:
-                denied = 1
-        else:
-            if r.a_min_seen == r.a_min_seen:
-                frac_a = deny_count_a / max(1, r.rows)
-                if frac_a > args.deny_frac:
-                    reasons.append(f"a<a_min frac={frac_a:.6g}>{args.deny_frac}")
-            if thr is not None:
-                frac_s = deny_count_step / max(1, max(1, len(step_costs)))
-                if frac_s > args.deny_frac:
-                    reasons.append(f"step>thr frac={frac_s:.6g}>{args.deny_frac}")
-            if reasons:
-                denied = 1
-
-        r.denied = denied
-        r.deny_reason = "; ".join(reasons)
-        r.deny_class = classify_deny(r.deny_reason)
-
-    keymap = {
-        "L_struct": lambda r: r.L_struct,
-        "eta": lambda r: -r.eta,
-        "p95_step": lambda r: r.p95_step,
-        "max_step": lambda r: r.max_step,
-    }
+    def write(self, r: RouteMetrics) -> None:
+        row = summary_row(r, self.gate)
+        if self.with_complete:
+            row["complete"] = r.complete
+        self.w.writerow(row)
 
-    fields = [
-        "route", "rows",
-        "denied", "deny_class", "deny_reason",
-        "progress", "L_struct", "eta",
-        "a_min_seen", "deny_count_a",
-        "median_step", "p95_step", "max_step",
-        "max_R", "max_Psi",
-        "spike_mode", "spike_thr"
-    ]
 
-    out_path = Path(args.out)
+def write_summary(out_path: Path, routes: List[RouteMetrics], gate: GateConfig, with_complete: bool = False,
+                  profile: MetricProfile = CANONICAL) -> None:
     with out_path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fields)
-        w.writeheader()
+        out = SummaryWriter(f, gate, profile, with_complete)
         for r in routes:
-            thr_s = ""
-            if args.step_spike_mode == "abs" and args.step_spike is not None:
-                thr_s = f"{float(args.step_spike):.15g}"
-            elif args.step_spike_mode == "rel_p95":
-                thr_s = f"{(float(args.step_spike_k) * float(r.p95_step)):.15g}"
-            elif args.step_spike_mode == "rel_median":
-                thr_s = f"{(float(args.step_spike_k) * float(r.median_step)):.15g}"
-
-            w.writerow({
-                "route": r.route,
-                "rows": r.rows,
-                "denied": r.denied,
-                "deny_class": r.deny_class,
-                "deny_reason": r.deny_reason,
-                "progress": f"{r.progress:.15g}",
-                "L_struct": f"{r.L_struct:.15g}",
-                "eta": f"{r.eta:.15g}",
-                "a_min_seen": "" if (r.a_min_seen != r.a_min_seen) else f"{r.a_min_seen:.15g}",
-                "deny_count_a": r.deny_count_a,
-                "median_step": f"{r.median_step:.15g}",
-                "p95_step": f"{r.p95_step:.15g}",
-                "max_step": f"{r.max_step:.15g}",
-                "max_R": f"{r.max_R:.15g}",
-                "max_Psi": f"{r.max_Psi:.15g}",
-                "spike_mode": args.step_spike_mode,
-                "spike_thr": thr_s,
-            })
-
-    allowed = [r for r in routes if r.denied == 0]
+            out.write(r)
+
+
+def write_summary_atomic(out_path: Path, routes: List[RouteMetrics], gate: GateConfig, with_complete: bool = False,
+                         profile: MetricProfile = CANONICAL) -> None:
+    """write_summary via a temporary file and rename, so readers never see a partial summary."""
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    try:
+        write_summary(tmp, routes, gate, with_complete, profile)
+        os.replace(tmp, out_path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def print_report(routes: List[RouteMetrics], gate: GateConfig, rank: str, out_path: Path,
+                 profile: MetricProfile = CANONICAL, top: Optional[int] = None, pruned: int = 0,
+                 bounded: int = 0) -> None:
+    allowed = rank_routes(routes, rank, profile)
     denied = [r for r in routes if r.denied == 1]
-    allowed.sort(key=keymap[args.rank])
+    if top is not None:
+        allowed = allowed[:top]
+    classes = profile.deny_classes
 
     print("SSUM-SSR — Structural Safety Routing (deterministic, observation-only)")
-    print(f"Gate: a_min={args.a_min} | spike_mode={args.step_spike_mode} | deny_mode={args.deny_mode} | rank={args.rank}")
-    if args.step_spike_mode == "abs":
-        print(f"Spike abs: step_spike={args.step_spike}")
-    elif args.step_spike_mode in ("rel_p95", "rel_median"):
-        print(f"Spike relative: k={args.step_spike_k}")
+    print(f"Gate: a_min={gate.a_min} | spike_mode={gate.step_spike_mode} | deny_mode={gate.deny_mode} | rank={rank}")
+    if gate.step_spike_mode == "abs":
+        print(f"Spike abs: step_spike={gate.step_spike}")
+    elif gate.step_spike_mode in ("rel_p95", "rel_median"):
+        print(f"Spike relative: k={gate.step_spike_k}")
+    elif gate.step_spike_mode == "rel_window":
+        print(f"Spike window: k={gate.step_spike_k} x {gate.step_spike_window_stat} of previous "
+              f"{gate.step_spike_window} steps")
     print("")
 
     if allowed:
-        print("ALLOWED (ranked):")
+        print("ALLOWED (ranked):" if top is None else f"ALLOWED (ranked, top {top}):")
         for i, r in enumerate(allowed, 1):
             print(
                 f"{i:02d}  {r.route}  "
                 f"L_struct={r.L_struct:.6g}  eta={r.eta:.6g}  "
-                f"p95_step={r.p95_step:.6g}  max_step={r.max_step:.6g}  max_R={r.max_R:.6g}  "
-                f"class={r.deny_class}"
+                f"p95_step={r.p95_step:.6g}  max_step={r.max_step:.6g}  max_R={r.max_R:.6g}"
+                + (f"  class={r.deny_class}" if classes else "")
             )
     else:
         print("ALLOWED: none")
@@ -357,12 +1980,41 @@ def main():
         for r in denied:
             a_seen = "NA" if (r.a_min_seen != r.a_min_seen) else f"{r.a_min_seen:.6g}"
             print(
-                f"- {r.route}  class={r.deny_class}  reason={r.deny_reason}  "
+                f"- {r.route}  " + (f"class={r.deny_class}  " if classes else "") + f"reason={r.deny_reason}  "
                 f"a_min_seen={a_seen}  L_struct={r.L_struct:.6g}  eta={r.eta:.6g}"
+                + ("" if r.complete else f"  [partial: stopped after {r.rows} rows]")
             )
     else:
         print("DENIED: none")
 
+    if top is not None:
+        print("")
+        if bounded:
+            unbounded = len(routes) + pruned - bounded
+            print(f"TOP-K: evaluated {len(routes)} routes, pruned {pruned} "
+                  f"(L_struct lower bound cannot reach the top {top})"
+                  + (f"; {unbounded} without a bound (bundle routes, compressed traces) always evaluated"
+                     if unbounded else ""))
+        else:
+            why = f"--rank {rank}" if rank != "L_struct" else "these inputs"
+            print(f"TOP-K: evaluated {len(routes)} routes (no L_struct lower bound for {why}; nothing pruned)")
+
+    flagged = [r for r in routes if r.malformed]
+    if flagged:
+        print("")
+        print("VALIDATION (missing/malformed cells, reference defaults applied):")
+        for r in flagged:
+            detail = ", ".join(f"{c}={n}" for c, n in sorted(r.malformed.items()))
+            print(f"- {r.route}: {sum(r.malformed.values())} cells ({detail})")
+
+    if classes:
+        print_interpretation(routes)
+
+    print("")
+    print(f"WROTE {out_path.as_posix()}")
+
+
+def print_interpretation(routes: List[RouteMetrics]) -> None:
     print("")
     print("INTERPRETATION:")
     for r in sorted(routes, key=lambda x: x.route):
@@ -377,8 +2029,402 @@ def main():
             why = "permission + spike violations (inadmissible and unsafe)"
         print(f"- {r.route}: {status} | {r.deny_class} | {why}")
 
+
+def follow_main(args, gate: GateConfig, profile: MetricProfile) -> None:
+    if len(args.inputs) != 1:
+        raise SystemExit("--follow takes exactly one --in trace")
+    path = Path(args.inputs[0])
+    if is_columnar(path):
+        raise SystemExit("--follow reads append-only CSV traces, not .ssrc")
+    if is_compressed(path) or is_bundle(path):
+        raise SystemExit("--follow reads one append-only CSV trace, not compressed traces or bundles")
+
+    router = OnlineRouter(path.name, gate, exact=args.exact_quantiles, alpha=args.sketch_alpha, profile=profile)
+    print(f"SSUM-SSR — following {path.as_posix()} (Ctrl-C to stop)")
+    last = None
+    try:
+        for batch in follow_rows(path, args.eps, router.malformed, interval=args.follow_interval,
+                                 idle_timeout=args.follow_idle, profile=profile):
+            if batch is None:
+                router.reset()
+                print(f"RESET {path.name}: file shrank, re-reading from the start")
+                continue
+            router.extend(batch)
+            r = router.metrics()
+            status = "ALLOWED" if r.denied == 0 else f"DENIED ({r.deny_reason})"
+            if status != last:
+                print(f"[rows={r.rows}] {status}")
+                last = status
+            print(f"[rows={r.rows}] L_struct={r.L_struct:.6g}  eta={r.eta:.6g}  "
+                  f"p95_step={r.p95_step:.6g}  max_step={r.max_step:.6g}  max_R={r.max_R:.6g}")
+    except KeyboardInterrupt:
+        pass
+
     print("")
-    print(f"WROTE {out_path.as_posix()}")
+    if router.rows == 0:
+        print(f"No rows read from {path.as_posix()}")
+        return
+    r = router.metrics()
+    out_path = Path(args.out)
+    write_summary(out_path, [r], gate, profile=profile)
+    print_report([r], gate, args.rank, out_path, profile)
+
+
+def watch_main(args, gate: GateConfig, ecfg: EngineConfig, profile: MetricProfile) -> None:
+    dirs = [Path(p) for p in args.inputs]
+    for d in dirs:
+        if not d.is_dir():
+            raise SystemExit(f"--watch takes directories: {d.as_posix()}")
+
+    out_path = Path(args.out)
+    watcher = TraceWatcher(dirs, gate, ecfg, workers=args.workers, exclude=[out_path])
+    print(f"SSUM-SSR — watching {', '.join(d.as_posix() for d in dirs)} (Ctrl-C to stop)")
+    last_change = time.monotonic()
+    first = True
+    try:
+        while True:
+            t0 = time.perf_counter()
+            added, modified, removed = watcher.scan()
+            if first or added or modified or removed:
+                routes = watcher.records()
+                write_summary_atomic(out_path, routes, gate, args.early_exit, profile)
+                if args.store:
+                    store_run(args, routes, gate, ecfg, quiet=True)
+                allowed = sorted((r for r in routes if r.denied == 0), key=profile.rank_key(args.rank))
+                print(f"[{time.strftime('%H:%M:%S')}] +{len(added)} ~{len(modified)} -{len(removed)}  "
+                      f"routes={len(routes)}  allowed={len(allowed)}  "
+                      f"top={allowed[0].route if allowed else '-'}  ({time.perf_counter() - t0:.3f}s)")
+                for p in added + modified:
+                    if p in watcher.errors:
+                        print(f"  SKIP {p.name}: {watcher.errors[p]}")
+                last_change = time.monotonic()
+                first = False
+            elif args.watch_idle is not None and time.monotonic() - last_change >= args.watch_idle:
+                break
+            time.sleep(args.watch_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+    print("")
+    print_report(watcher.records(), gate, args.rank, out_path, profile)
+
+
+PROFILE_VERSION = 1
+CPROFILE_TOP = 40
+
+
+def cprofile_top(prof: cProfile.Profile, limit: int = CPROFILE_TOP) -> List[Dict[str, object]]:
+    rows = []
+    for (filename, line, func), (_, ncalls, tottime, cumtime, _) in pstats.Stats(prof).stats.items():
+        rows.append({"function": f"{Path(filename).name}:{line}({func})", "ncalls": ncalls,
+                     "tottime_s": tottime, "cumtime_s": cumtime})
+    rows.sort(key=lambda d: d["cumtime_s"], reverse=True)
+    return rows[:limit]
+
+
+def profile_main(args, paths: List[Path], gate: GateConfig, ecfg: EngineConfig, profile: MetricProfile) -> None:
+    """The batch run, instrumented: per-stage and per-route wall time and allocation peaks as JSON."""
+    out_path = Path(args.out)
+    report_path = Path(args.profile) if args.profile else out_path.with_suffix(".profile.json")
+    if args.profile_memory:
+        tracemalloc.start()
+    prof = cProfile.Profile() if args.cprofile else None
+    if prof is not None:
+        prof.enable()
+
+    t0 = time.perf_counter()
+    total = StageProfiler()
+    per_route = []
+    routes = []
+    evaluate = partial(profile_route, trace_memory=args.profile_memory)
+    with out_path.open("w", newline="", encoding="utf-8") as f:
+        out = SummaryWriter(f, gate, profile, with_complete=args.early_exit)
+        for path, (r, clock) in zip(paths, iter_evaluate(paths, gate, ecfg, args.workers, evaluate)):
+            clock.restart()
+            out.write(r)
+            clock.lap("output")
+            total.merge(clock)
+            per_route.append({"route": r.route, "path": path.as_posix(), "rows": r.rows,
+                              "complete": r.complete, "wall_s": sum(clock.times.values()),
+                              "stages": clock.stages()})
+            routes.append(RouteRecord(r))
+
+    clock = StageProfiler()
+    print_report(routes, gate, args.rank, out_path, profile)
+    if args.store:
+        store_run(args, routes, gate, ecfg)
+    clock.lap("report")
+    total.merge(clock)
+    wall = time.perf_counter() - t0
+
+    if prof is not None:
+        prof.disable()
+    if args.profile_memory:
+        tracemalloc.stop()
+
+    rows = sum(r.rows for r in routes)
+    report = {
+        "version": PROFILE_VERSION,
+        "command": sys.argv,
+        "engine": ecfg.engine,
+        "metric_profile": ecfg.profile,
+        "workers": args.workers,
+        "tracemalloc": bool(args.profile_memory),
+        "routes_evaluated": len(routes),
+        "rows": rows,
+        "wall_s": wall,
+        "rows_per_s": rows / wall if wall > 0 else None,
+        "traced_peak_bytes": total.max_traced if args.profile_memory else None,
+        "stages": total.stages(),
+        "routes": per_route,
+        "cprofile": None,
+    }
+    if prof is not None:
+        stats_path = report_path.with_suffix(".prof")
+        prof.dump_stats(str(stats_path))
+        report["cprofile"] = {"scope": "main process", "stats_file": stats_path.as_posix(), "top": cprofile_top(prof)}
+
+    report_path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print("PROFILE: " + "  ".join(f"{s}={v['wall_s']:.3f}s" for s, v in report["stages"].items())
+          + f"  total={wall:.3f}s")
+    print(f"WROTE {report_path.as_posix()}")
+
+
+def store_run(args, routes: Sequence[RouteMetrics], gate: GateConfig, ecfg: EngineConfig, quiet: bool = False) -> None:
+    """Append the run to the --store results database (see ssr_store.py)."""
+    from ssr_store import open_store, record_run
+
+    conn = open_store(Path(args.store))
+    try:
+        run_id = record_run(conn, routes, gate, ecfg, args.rank, args.store_label, " ".join(sys.argv))
+    finally:
+        conn.close()
+    if not quiet:
+        print(f"STORED run {run_id} in {Path(args.store).as_posix()} ({len(routes)} routes)")
+
+
+def verify_main(args, paths: List[Path], gate: GateConfig, ecfg: EngineConfig, profile: MetricProfile) -> None:
+    """The batch run plus a reference-engine run of the same traces; exits 1 on any divergence."""
+    from ssr_verify import Tolerances, print_verify, verify_run
+
+    out_path = Path(args.out)
+    report = verify_run(paths, gate, ecfg, args.rank, args.workers, Tolerances.for_engine(ecfg, args.verify_rtol),
+                        label=ecfg.engine + (" (chunked)" if ecfg.chunk_bytes else ""))
+    write_summary(out_path, report.fast_routes, gate, with_complete=args.early_exit, profile=profile)
+    print_report(report.fast_routes, gate, args.rank, out_path, profile)
+    if args.store:
+        store_run(args, report.fast_routes, gate, ecfg)
+    print_verify(report)
+    if not report.ok:
+        raise SystemExit(1)
+
+
+def expand_inputs(inputs: Sequence[str], select: Optional[Sequence[str]] = None) -> List[Union[Path, BundleRoute]]:
+    """--in paths, each bundle replaced by its routes matching select (all if None), in bundle order."""
+    out: List[Union[Path, BundleRoute]] = []
+    bundles = 0
+    for p in inputs:
+        path = Path(p)
+        if not path.exists():
+            raise SystemExit(f"Not found: {p}")
+        if is_bundle(path):
+            out.extend(open_bundle(path).select(select))
+            bundles += 1
+        elif is_compressed(path) and is_bundle(path.with_suffix("")):
+            raise SystemExit(f"{p}: bundles are read by byte offset; decompress it first")
+        else:
+            out.append(path)
+    if select and not bundles:
+        raise SystemExit("--routes selects routes inside bundles (*.bundle.csv)")
+    return out
+
+
+def add_gate_args(ap: argparse.ArgumentParser, multi: bool = False) -> None:
+    """Gate options shared by the router and the tools built on it (see gate_from_args).
+
+    With multi=True every option takes one or more values and defaults to a one-element list
+    (the grids of ssr_sweep.py); each resulting GateConfig is checked with check_gate.
+    """
+    def add(flag: str, **kw) -> None:
+        if multi:
+            kw["nargs"] = "+"
+            if kw.get("default") is not None:
+                kw["default"] = [kw["default"]]
+        ap.add_argument(flag, **kw)
+
+    add("--a_min", type=float, default=0.05, help="Permission gate: deny if a < a_min (if 'a' present)")
+    add(
+        "--step_spike_mode",
+        choices=["none", "abs", "rel_p95", "rel_median", "rel_window"],
+        default="none",
+        help="Spike gate mode",
+    )
+    add("--step_spike", type=float, default=None, help="(abs mode) deny if any step > step_spike")
+    add("--step_spike_k", type=float, default=1.2, help="(relative modes) threshold multiplier")
+    add("--step_spike_window", type=int, default=100, help="(rel_window) compare each step with the previous W steps")
+    add("--step_spike_window_stat", choices=list(WINDOW_STATS), default="p95",
+        help="(rel_window) rolling statistic the threshold multiplies")
+
+    add("--deny_mode", choices=["any", "fraction"], default="any", help="Deny on any violation, or by fraction")
+    add("--deny_frac", type=float, default=0.01, help="(fraction mode) deny if violations/rows > deny_frac")
+
+
+def check_gate(gate: GateConfig) -> GateConfig:
+    """Reject gate settings the engines cannot evaluate (the CLI's validation)."""
+    if gate.step_spike_mode == "abs" and gate.step_spike is None:
+        raise SystemExit("--step_spike required when --step_spike_mode abs")
+    spike_window(gate)
+    return gate
+
+
+def gate_from_args(args: argparse.Namespace) -> GateConfig:
+    return check_gate(GateConfig(
+        a_min=args.a_min,
+        step_spike_mode=args.step_spike_mode,
+        step_spike=args.step_spike,
+        step_spike_k=args.step_spike_k,
+        deny_mode=args.deny_mode,
+        deny_frac=args.deny_frac,
+        step_spike_window=args.step_spike_window,
+        step_spike_window_stat=args.step_spike_window_stat,
+    ))
+
+
+def main(metric_profile: str = "canonical"):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inputs", nargs="+", required=True,
+                    help="One or more route trace CSVs (plain or .csv.gz/.csv.bz2/.csv.xz, or .ssrc columnar traces), "
+                         "or route bundles (*.bundle.csv)")
+    ap.add_argument("--routes", nargs="+", default=None, metavar="NAME",
+                    help="Evaluate only these bundle routes (names or fnmatch patterns such as 'route000*')")
+
+    add_gate_args(ap)
+    ap.add_argument("--eps", type=float, default=1e-12, help="atanh clamp epsilon (if computing u,v from a,s)")
+
+    ap.add_argument("--rank", choices=["L_struct", "eta", "p95_step", "max_step"], default="L_struct",
+                    help="Ranking metric among allowed routes")
+    ap.add_argument("--out", default="ssr_routing_summary.csv", help="Output summary CSV")
+    ap.add_argument("--metric_profile", choices=list(PROFILES), default=metric_profile,
+                    help="canonical: progress from 'k' (eta = progress/L_struct); "
+                         "mission: progress from 'dx' (eta = L_struct/L_classical)")
+
+    ap.add_argument("--engine", choices=["python", "stream", "numpy"], default="python",
+                    help="python: reference in-memory engine; stream: single pass, bounded memory; "
+                         "numpy: vectorized (falls back to python if NumPy is not installed)")
+    ap.add_argument("--exact_quantiles", action="store_true",
+                    help="(stream engine) keep step costs for exact median/p95 instead of the sketch")
+    ap.add_argument("--sketch_alpha", type=float, default=DEFAULT_ALPHA,
+                    help="(stream engine) relative error bound of the median/p95 step sketch")
+    ap.add_argument("--early_exit", action="store_true",
+                    help="Triage: stop reading a trace once it is provably denied (partial metrics, complete=0)")
+    ap.add_argument("--cache_dir", "--cache-dir", dest="cache_dir", default=None,
+                    help="Reuse base metrics across runs (python/numpy engines); gate changes need no re-parse")
+    ap.add_argument("--cache_max_mb", type=float, default=DEFAULT_MAX_BYTES / (1 << 20),
+                    help="Cache size bound; least recently used entries are evicted")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Evaluate routes in N worker processes (output order is unchanged)")
+    ap.add_argument("--chunk_mb", type=float, default=None,
+                    help="(stream engine) split each CSV trace into line-aligned chunks of this size; "
+                         "--workers then evaluate the chunks of one trace in parallel")
+    ap.add_argument("--top", type=int, default=None,
+                    help="Report only the K best allowed routes; with --rank L_struct, routes whose "
+                         "lower bound cannot reach the top K are skipped")
+    ap.add_argument("--follow", action="store_true",
+                    help="Tail one append-only trace CSV and report the live admit/deny decision")
+    ap.add_argument("--follow_interval", type=float, default=0.5, help="(follow) poll interval in seconds")
+    ap.add_argument("--follow_idle", type=float, default=None,
+                    help="(follow) stop after this many seconds without new rows (default: run until Ctrl-C)")
+    ap.add_argument("--profile", nargs="?", const="", default=None, metavar="JSON",
+                    help="Record per-stage/per-route wall time and allocation peaks; JSON report "
+                         "(default: <out>.profile.json)")
+    ap.add_argument("--no_profile_memory", dest="profile_memory", action="store_false",
+                    help="(profile) skip tracemalloc, whose overhead inflates wall times")
+    ap.add_argument("--cprofile", action="store_true",
+                    help="(profile) also run under cProfile: top functions in the report, full stats in .prof")
+    ap.add_argument("--watch", action="store_true",
+                    help="Treat --in as directories; re-evaluate only new/modified traces and rewrite --out on change")
+    ap.add_argument("--watch_interval", type=float, default=2.0, help="(watch) poll interval in seconds")
+    ap.add_argument("--watch_idle", type=float, default=None,
+                    help="(watch) stop after this many seconds without changes (default: run until Ctrl-C)")
+    ap.add_argument("--store", default=None, metavar="DB",
+                    help="Append this run (gate, engine, timestamp, per-route metrics) to a SQLite results store; "
+                         "query it with ssr_store.py")
+    ap.add_argument("--store_label", default=None, help="(store) label recorded with the run")
+    ap.add_argument("--verify", action="store_true",
+                    help="Also run the reference engine on the same traces: compare every summary field, "
+                         "admit/deny decisions and ranking, and report the speedup (exit 1 on divergence)")
+    ap.add_argument("--verify_rtol", type=float, default=1e-9,
+                    help="(verify) relative tolerance for float fields (sketch quantiles: sketch_alpha)")
+
+    args = ap.parse_args()
+
+    gate = gate_from_args(args)
+    profile = PROFILES[args.metric_profile]
+    if args.cprofile and args.profile is None:
+        args.profile = ""
+    if args.profile is not None and (args.follow or args.watch or args.top is not None):
+        raise SystemExit("--profile applies to batch runs (not --follow, --watch or --top)")
+    if args.verify and (args.follow or args.watch or args.top is not None or args.profile is not None):
+        raise SystemExit("--verify applies to batch runs (not --follow, --watch, --top or --profile)")
+    if args.follow:
+        if args.store:
+            raise SystemExit("--store records batch and --watch runs (not --follow)")
+        follow_main(args, gate, profile)
+        return
+    if args.top is not None and args.top < 1:
+        raise SystemExit("--top must be >= 1")
+    if args.engine == "numpy" and np is None:
+        print("NOTE: NumPy not installed; --engine numpy falls back to --engine python", file=sys.stderr)
+        args.engine = "python"
+
+    ecfg = EngineConfig(engine=args.engine, eps=args.eps, exact_quantiles=args.exact_quantiles,
+                        sketch_alpha=args.sketch_alpha, early_exit=args.early_exit,
+                        cache_dir=args.cache_dir, cache_max_bytes=int(args.cache_max_mb * (1 << 20)),
+                        profile=profile.name)
+    if args.chunk_mb is not None:
+        if args.engine != "stream":
+            raise SystemExit("--chunk_mb requires --engine stream")
+        if args.chunk_mb <= 0:
+            raise SystemExit("--chunk_mb must be > 0")
+        # Workers split each trace into chunks instead of taking whole traces.
+        ecfg = replace(ecfg, chunk_bytes=max(1, int(args.chunk_mb * (1 << 20))), chunk_workers=args.workers)
+        args.workers = 1
+    if args.cache_dir and not ecfg.cacheable:
+        print("NOTE: --cache_dir applies to --engine python/numpy without --early_exit; cache not used",
+              file=sys.stderr)
+    if args.watch:
+        if args.top is not None or args.routes:
+            raise SystemExit("--watch does not combine with --top or --routes")
+        watch_main(args, gate, ecfg, profile)
+        return
+
+    paths = expand_inputs(args.inputs, args.routes)
+    if args.profile is not None:
+        if any(isinstance(p, BundleRoute) for p in paths):
+            raise SystemExit("--profile takes trace files, not bundles")
+        profile_main(args, paths, gate, ecfg, profile)
+        return
+    if args.verify:
+        verify_main(args, paths, gate, ecfg, profile)
+        return
+
+    out_path = Path(args.out)
+    pruned = bounded = 0
+    if args.top is not None:
+        routes, pruned, bounded = evaluate_top(paths, gate, ecfg, args.top, args.rank, args.workers)
+        write_summary(out_path, routes, gate, with_complete=args.early_exit, profile=profile)
+    else:
+        # Each route is parsed, gated and written before the next is loaded; only compact records are kept.
+        with out_path.open("w", newline="", encoding="utf-8") as f:
+            out = SummaryWriter(f, gate, profile, with_complete=args.early_exit)
+            routes = evaluate_routes(paths, gate, ecfg, args.rank, args.workers, on_route=out.write,
+                                     compact=True).routes
+
+    print_report(routes, gate, args.rank, out_path, profile, top=args.top, pruned=pruned, bounded=bounded)
+    if args.store:
+        store_run(args, routes, gate, ecfg)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+import argparse
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from itertools import product, repeat
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from ssr_structural_safety_routing import (
+    PROFILES,
+    RANK_KEYS,
+    WINDOW_STATS,
+    EngineConfig,
+    GateConfig,
+    RouteMetrics,
+    add_gate_args,
+    check_gate,
+    compute_base,
+    compute_base_sorted,
+    gate_sorted,
+    spike_threshold,
+)
+from ssr_sketch import RollingQuantile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Per route and gate config: (denied, deny_class, deny_reason, deny_count_a, spike_thr)
+GateOutcome = Tuple[int, str, str, int, str]
+
+
+def build_grid(args) -> List[GateConfig]:
+    spikes = []
+    windows = [(args.step_spike_window[0], args.step_spike_window_stat[0])]
+    for mode in args.step_spike_mode:
+        if mode == "none":
+            spikes.append((mode, None, args.step_spike_k[0], windows[0]))
+        elif mode == "abs":
+            if not args.step_spike:
+                raise SystemExit("--step_spike required when --step_spike_mode includes abs")
+            spikes.extend((mode, thr, args.step_spike_k[0], windows[0]) for thr in args.step_spike)
+        elif mode == "rel_window":
+            spikes.extend((mode, None, k, win) for k, win in
+                          product(args.step_spike_k, product(args.step_spike_window, args.step_spike_window_stat)))
+        else:
+            spikes.extend((mode, None, k, windows[0]) for k in args.step_spike_k)
+
+    denies = []
+    for mode in args.deny_mode:
+        if mode == "any":
+            denies.append((mode, args.deny_frac[0]))
+        else:
+            denies.extend((mode, frac) for frac in args.deny_frac)
+
+    return [
+        check_gate(GateConfig(a_min=a_min, step_spike_mode=sm, step_spike=ss, step_spike_k=sk, deny_mode=dm,
+                              deny_frac=df, step_spike_window=w, step_spike_window_stat=ws))
+        for a_min, (sm, ss, sk, (w, ws)), (dm, df) in product(args.a_min, spikes, denies)
+    ]
+
+
+def window_pairs(step_costs, window: int, stat: str) -> List[Tuple[float, float]]:
+    # (step, rolling statistic of the previous `window` steps) for every gated step; a rel_window
+    # gate with multiplier k counts the pairs with step > k * statistic.
+    rolling = RollingQuantile(window, WINDOW_STATS[stat])
+    pairs = []
+    for st in step_costs:
+        if rolling.full:
+            pairs.append((st, rolling.value()))
+        rolling.push(st)
+    return pairs
+
+
+def sweep_route(path: Path, grid: List[GateConfig], ecfg: EngineConfig) -> Tuple[RouteMetrics, List[GateOutcome]]:
+    # Sort once per route; every grid point is then answered by binary search. rel_window points
+    # need the steps in route order: one rolling pass per (window, stat), shared by all k.
+    rm, steps_sorted, a_sorted = compute_base_sorted(path, ecfg)
+    ordered = None
+    pairs: Dict[Tuple[int, str], List[Tuple[float, float]]] = {}
+    outcomes: List[GateOutcome] = []
+    for gate in grid:
+        r = replace(rm)
+        window_count = None
+        if gate.step_spike_mode == "rel_window":
+            key = (gate.step_spike_window, gate.step_spike_window_stat)
+            if key not in pairs:
+                if ordered is None:
+                    ordered = compute_base(path, ecfg.eps, ecfg.metrics)[1]
+                pairs[key] = window_pairs(ordered, *key)
+            k = gate.step_spike_k
+            window_count = sum(1 for st, q in pairs[key] if st > k * q)
+        gate_sorted(r, steps_sorted, a_sorted, gate, window_count)
+        thr = spike_threshold(gate, r)
+        outcomes.append((r.denied, r.deny_class, r.deny_reason, r.deny_count_a,
+                         "" if thr is None else f"{thr:.15g}"))
+    return rm, outcomes
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Evaluate a grid of SSR gate configurations in one pass")
+    ap.add_argument("--in", dest="inputs", nargs="+", required=True, help="Route traces (.csv or .ssrc)")
+
+    add_gate_args(ap, multi=True)
+    ap.add_argument("--rank", nargs="+", default=["L_struct"], choices=list(RANK_KEYS))
+
+    ap.add_argument("--metric_profile", choices=list(PROFILES), default="canonical")
+    ap.add_argument("--eps", type=float, default=1e-12)
+    ap.add_argument("--engine", choices=["python", "numpy"], default="python")
+    ap.add_argument("--cache_dir", "--cache-dir", dest="cache_dir", default=None)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--out", default="ssr_sweep_results.csv", help="Long-format results CSV")
+    args = ap.parse_args()
+
+    if args.engine == "numpy" and np is None:
+        args.engine = "python"
+
+    paths: List[Path] = []
+    for p in args.inputs:
+        path = Path(p)
+        if not path.exists():
+            raise SystemExit(f"Not found: {p}")
+        paths.append(path)
+
+    grid = build_grid(args)
+    ecfg = EngineConfig(engine=args.engine, eps=args.eps, cache_dir=args.cache_dir, profile=args.metric_profile)
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as ex:
+            results = list(ex.map(sweep_route, paths, repeat(grid), repeat(ecfg)))
+    else:
+        results = [sweep_route(path, grid, ecfg) for path in paths]
+
+    fields = [
+        "config", "a_min", "spike_mode", "step_spike", "step_spike_k", "step_spike_window",
+        "step_spike_window_stat", "deny_mode", "deny_frac", "rank_by",
+        "route", "denied", "deny_class", "deny_reason", "deny_count_a", "spike_thr", "rank",
+    ]
+
+    out_path = Path(args.out)
+    summary = []
+    with out_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        cid = 0
+        for gi, gate in enumerate(grid):
+            windowed = gate.step_spike_mode == "rel_window"
+            allowed = [rm for rm, outcomes in results if outcomes[gi][0] == 0]
+            for rank_by in args.rank:
+                cid += 1
+                ranked = sorted(allowed, key=ecfg.metrics.rank_key(rank_by))
+                rank_of = {id(rm): i for i, rm in enumerate(ranked, 1)}
+                for rm, outcomes in results:
+                    denied, deny_class, deny_reason, deny_count_a, thr_s = outcomes[gi]
+                    w.writerow({
+                        "config": cid,
+                        "a_min": gate.a_min,
+                        "spike_mode": gate.step_spike_mode,
+                        "step_spike": "" if gate.step_spike is None else gate.step_spike,
+                        "step_spike_k": gate.step_spike_k if gate.step_spike_mode.startswith("rel") else "",
+                        "step_spike_window": gate.step_spike_window if windowed else "",
+                        "step_spike_window_stat": gate.step_spike_window_stat if windowed else "",
+                        "deny_mode": gate.deny_mode,
+                        "deny_frac": gate.deny_frac if gate.deny_mode == "fraction" else "",
+                        "rank_by": rank_by,
+                        "route": rm.route,
+                        "denied": denied,
+                        "deny_class": deny_class,
+                        "deny_reason": deny_reason,
+                        "deny_count_a": deny_count_a,
+                        "spike_thr": thr_s,
+                        "rank": rank_of.get(id(rm), ""),
+                    })
+                summary.append((cid, gate, rank_by, len(ranked), ranked[0].route if ranked else "-"))
+
+    print("SSUM-SSR — Gate sweep (deterministic, observation-only)")
+    print(f"Routes: {len(results)} | gate configs: {len(summary)}")
+    print("")
+    for cid, gate, rank_by, n_allowed, top in summary:
+        spike = gate.step_spike_mode
+        if gate.step_spike_mode == "abs":
+            spike += f"({gate.step_spike})"
+        elif gate.step_spike_mode == "rel_window":
+            spike += f"(k={gate.step_spike_k},W={gate.step_spike_window},{gate.step_spike_window_stat})"
+        elif gate.step_spike_mode != "none":
+            spike += f"(k={gate.step_spike_k})"
+        deny = gate.deny_mode if gate.deny_mode == "any" else f"fraction({gate.deny_frac})"
+        print(f"{cid:03d}  a_min={gate.a_min}  spike={spike}  deny={deny}  rank={rank_by}  "
+              f"allowed={n_allowed}/{len(results)}  top={top}")
+
+    print("")
+    print(f"WROTE {out_path.as_posix()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 import csv
+import math
 import sys
+import tempfile
+from pathlib import Path
 
 
 def read_summary(path):
@@ -35,13 +38,35 @@ def must_not_contains(label, got, needle):
         raise SystemExit(f"{label} must NOT contain '{needle}': got={got}")
 
 
+def in_memory_summary(n=60):
+    # tracegen -> routing with no files: the quick-run scenario set and gate, through the library API.
+    from ssr_structural_safety_routing import GateConfig, evaluate_routes, trace_columns
+    from ssr_tracegen import RouteSpec, make_trace
+
+    specs = [
+        RouteSpec("routeA_corridor.csv", n, "corridor"),
+        RouteSpec("routeB_permission_collapse.csv", n, "permission_collapse"),
+        RouteSpec("routeC_spike_hazard.csv", n, "spike_hazard"),
+        RouteSpec("routeD_spike_denied.csv", n, "spike_denied"),
+        RouteSpec("routeE_permission_denied_only.csv", n, "permission_denied_only"),
+    ]
+    traces = {spec.name: trace_columns(*make_trace(spec)) for spec in specs}
+    gate = GateConfig(a_min=0.05, step_spike_mode="rel_p95", step_spike_k=1.2, deny_mode="any")
+    return evaluate_routes(traces, gate, rank="max_step").summary_rows()
+
+
 def main():
     summary_csv = "ssr_routing_summary.csv"
     if len(sys.argv) >= 2:
         summary_csv = sys.argv[1]
 
-    rows = read_summary(summary_csv)
+    if summary_csv == "--features":
+        return run_feature_checks()
+    rows = in_memory_summary() if summary_csv == "--in_memory" else read_summary(summary_csv)
+    return check_summary(rows)
+
 
+def check_summary(rows):
     A = must_find(rows, "routeA_corridor.csv")
     B = must_find(rows, "routeB_permission_collapse.csv")
     C = must_find(rows, "routeC_spike_hazard.csv")
@@ -68,5 +93,786 @@ def main():
     return 0
 
 
+# ---------- feature checks (python ssr_tests.py --features): accelerated paths vs plain CSV runs ----------
+
+FEATURE_CHECKS = []
+
+
+def feature_check(fn):
+    FEATURE_CHECKS.append(fn)
+    return fn
+
+
+def write_trace(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+    return path
+
+
+def gated_fields(route):
+    from ssr_structural_safety_routing import GateConfig, summary_row
+    row = summary_row(route, GateConfig())
+    row.pop("route")
+    return row
+
+
+def must_match_routes(label, got, exp, close=(), rtol=1e-12):
+    # Summary fields must be equal as written, except those in close (equal within rtol).
+    must_equal(f"{label} routes", len(got), len(exp))
+    for g, e in zip(got, exp):
+        g_row, e_row = gated_fields(g), gated_fields(e)
+        for key in e_row:
+            if key in close:
+                if not math.isclose(float(g_row[key]), float(e_row[key]), rel_tol=rtol):
+                    raise SystemExit(f"{label} {e.route} {key} mismatch: got={g_row[key]} expected~{e_row[key]}")
+            else:
+                must_equal(f"{label} {e.route} {key}", g_row.get(key), e_row[key])
+
+
+def variant_traces(tmp, n, count):
+    from ssr_tracegen import make_trace, variant_spec
+    return [write_trace(tmp / spec.name, *make_trace(spec)) for spec in (variant_spec(i, n) for i in range(count))]
+
+
+@feature_check
+def check_columnar_matches_csv(tmp):
+    # A non-numeric first cell ('a' = NA) must not turn a router column into category codes.
+    from ssr_columnar import convert_csv
+    from ssr_structural_safety_routing import GateConfig, evaluate_routes
+
+    rows = [[i, 0.01 * i, 0.02, "NA" if i == 0 else 0.3 + 0.01 * (i % 5), 0.1, "burn" if i == 10 else ""]
+            for i in range(40)]
+    src = write_trace(tmp / "na_first.csv", ["k", "u", "v", "a", "s", "event"], rows)
+    dst = tmp / "na_first.ssrc"
+    convert_csv(src, dst)
+    gate = GateConfig(a_min=0.1)
+    exp = evaluate_routes([src], gate).routes
+    must_equal("csv denied", exp[0].denied, 0)
+    must_match_routes("ssrc", evaluate_routes([dst], gate).routes, exp)
+
+
+@feature_check
+def check_chunked_matches_stream(tmp):
+    # Byte-range chunks: identical for any worker count; equal to one pass except for summation rounding.
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_routes
+
+    paths = variant_traces(tmp, 3000, 5)
+    for gate in (GateConfig(step_spike_mode="abs", step_spike=1.5),
+                 GateConfig(step_spike_mode="rel_window", step_spike_window=20, step_spike_k=1.5),
+                 GateConfig(step_spike_mode="rel_p95", step_spike_k=1.2, deny_mode="fraction", deny_frac=0.02)):
+        stream = EngineConfig(engine="stream", exact_quantiles=True)
+        exp = evaluate_routes(paths, gate, stream).routes
+        one = evaluate_routes(paths, gate, EngineConfig(engine="stream", exact_quantiles=True, chunk_bytes=4096)).routes
+        two = evaluate_routes(paths, gate, EngineConfig(engine="stream", exact_quantiles=True, chunk_bytes=4096,
+                                                        chunk_workers=2)).routes
+        must_match_routes("chunked workers=2", two, one)
+        must_match_routes("chunked", one, exp, close=("L_struct", "eta"))
+
+
+@feature_check
+def check_early_exit(tmp):
+    # Early exit never changes a decision; in fraction mode only traces with a known row count stop early.
+    from ssr_columnar import convert_csv
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_routes
+
+    paths = variant_traces(tmp, 2000, 5)
+    columnar = []
+    for p in paths:
+        columnar.append(p.with_suffix(".ssrc"))
+        convert_csv(p, columnar[-1])
+    early = EngineConfig(engine="stream", exact_quantiles=True, early_exit=True)
+    for gate in (GateConfig(a_min=0.05, step_spike_mode="abs", step_spike=1.5),
+                 GateConfig(a_min=0.05, step_spike_mode="rel_p95", step_spike_k=1.2, deny_mode="fraction",
+                            deny_frac=0.02)):
+        for traces in (paths, columnar):
+            exp = evaluate_routes(traces, gate).routes
+            got = evaluate_routes(traces, gate, early).routes
+            for g, e in zip(got, exp):
+                must_equal(f"early_exit {e.route} denied", g.denied, e.denied)
+                if g.complete:
+                    must_match_routes("early_exit", [g], [e])
+            stopped = [g for g in got if not g.complete]
+            if gate.deny_mode == "any" or traces is columnar:
+                must_equal(f"early_exit {gate.deny_mode} stopped any", bool(stopped), True)
+            else:
+                must_equal("early_exit fraction csv stopped", len(stopped), 0)
+            for g in stopped:
+                if gate.deny_mode == "fraction":
+                    must_contains(f"early_exit {g.route} deny_reason", g.deny_reason, "before early exit")
+                    must_not_contains(f"early_exit {g.route} deny_reason", g.deny_reason, "frac=")
+
+
+@feature_check
+def check_cache(tmp):
+    # Hits match the reference, re-hash a trace only when its stamp changes, and respect a lowered cap.
+    import os
+    import ssr_cache
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_routes
+
+    paths = variant_traces(tmp, 1500, 5)
+    gate = GateConfig(a_min=0.05, step_spike_mode="rel_p95", step_spike_k=1.2)
+    exp = evaluate_routes(paths, gate).routes
+    cached = EngineConfig(cache_dir=str(tmp / "cache"))
+
+    hashed = []
+    content_hash = ssr_cache.content_hash
+    ssr_cache.content_hash = lambda p: hashed.append(p) or content_hash(p)
+    try:
+        must_match_routes("cache miss", evaluate_routes(paths, gate, cached).routes, exp)
+        must_match_routes("cache hit", evaluate_routes(paths, gate, cached).routes, exp)
+        must_equal("cache hashes (miss + hit)", len(hashed), len(paths))
+        st = paths[0].stat()
+        os.utime(paths[0], ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        must_match_routes("cache touched", evaluate_routes(paths, gate, cached).routes, exp)
+        must_equal("cache hashes (touched)", len(hashed), len(paths) + 1)
+    finally:
+        ssr_cache.content_hash = content_hash
+
+    entries = sorted((tmp / "cache").glob("*" + ssr_cache.ENTRY_SUFFIX))
+    must_equal("cache entries", len(entries), len(paths))
+    cap = entries[0].stat().st_size * 2
+    ssr_cache.BaseCache(tmp / "cache", cap)
+    left = sum(p.stat().st_size for p in (tmp / "cache").glob("*" + ssr_cache.ENTRY_SUFFIX))
+    if left > cap:
+        raise SystemExit(f"cache cap not enforced on open: {left} bytes > {cap}")
+
+
+@feature_check
+def check_online_router(tmp):
+    # --follow: batches tailed from a trace give the batch result, at the end and for every prefix.
+    from ssr_structural_safety_routing import GateConfig, OnlineRouter, evaluate_routes, follow_rows
+
+    src = variant_traces(tmp, 1200, 2)[1]
+    with open(src, newline="", encoding="utf-8") as f:
+        header, *rows = list(csv.reader(f))
+    gate = GateConfig(a_min=0.05, step_spike_mode="rel_p95", step_spike_k=1.2)
+    router = OnlineRouter(src.name, gate, exact=True)
+    for batch in follow_rows(src, 1e-12, router.malformed, interval=0.01, idle_timeout=0.05):
+        router.extend(batch)
+    must_match_routes("follow", [router.metrics()], evaluate_routes([src], gate).routes)
+
+    router.reset()
+    parsed = list(follow_rows(src, 1e-12, router.malformed, interval=0.01, idle_timeout=0.05))
+    parsed = [row for batch in parsed for row in batch]
+    for n in (2, 300, 777):
+        router.extend(parsed[router.rows:n])
+        prefix = write_trace(tmp / f"prefix_{n}.csv", header, rows[:n])
+        must_match_routes(f"follow prefix {n}", [router.metrics()], evaluate_routes([prefix], gate).routes)
+
+
+@feature_check
+def check_top_k(tmp):
+    # --top K gives the full ranking's first K; only L_struct with bounded inputs prunes.
+    import gzip
+    import shutil
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_routes, evaluate_top, rank_routes
+    from ssr_tracegen import make_trace, variant_spec
+
+    paths = [write_trace(tmp / spec.name, *make_trace(spec))
+             for spec in (variant_spec(i, 100 + 40 * (i % 7)) for i in range(20))]
+    with open(paths[-1], "rb") as f, gzip.open(tmp / (paths[-1].name + ".gz"), "wb") as g:
+        shutil.copyfileobj(f, g)
+    mixed = paths[:-1] + [tmp / (paths[-1].name + ".gz")]
+    gate = GateConfig(a_min=0.05, step_spike_mode="rel_p95", step_spike_k=1.2)
+    ecfg = EngineConfig()
+    for traces in (paths, mixed):
+        full = evaluate_routes(traces, gate, ecfg).routes
+        for rank in ("L_struct", "eta"):
+            routes, pruned, bounded = evaluate_top(traces, gate, ecfg, 3, rank)
+            must_equal(f"top {rank}", [r.route for r in rank_routes(routes, rank)[:3]],
+                       [r.route for r in rank_routes(full, rank)[:3]])
+            must_equal(f"top {rank} evaluated + pruned", len(routes) + pruned, len(traces))
+            if rank == "L_struct":
+                must_equal("top L_struct bounded", bounded, len(paths) - (traces is mixed))
+                must_equal("top L_struct pruned any", pruned > 0, True)
+                if traces is mixed:
+                    must_equal("top compressed evaluated", mixed[-1].name in {r.route for r in routes}, True)
+            else:
+                must_equal(f"top {rank} pruned", (pruned, bounded), (0, 0))
+
+
+@feature_check
+def check_bundle(tmp):
+    # Bundle routes give the per-file results; a rewritten bundle replaces its open handle.
+    import os
+    import ssr_bundle
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_routes
+
+    paths = variant_traces(tmp, 200, 6)
+    gate = GateConfig(a_min=0.05, step_spike_mode="rel_p95", step_spike_k=1.2)
+
+    def rows_of(p):
+        with open(p, newline="", encoding="utf-8") as f:
+            return list(csv.reader(f))[1:]
+
+    bundle = tmp / "family.bundle.csv"
+    with open(paths[0], newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f))
+    for rewrite in range(2):
+        order = paths if rewrite == 0 else paths[::-1]
+        ssr_bundle.write_bundle(bundle, header, ((p.name, rows_of(p)) for p in order))
+        st = bundle.stat()
+        os.utime(bundle, ns=(st.st_atime_ns, st.st_mtime_ns + rewrite * 1_000_000_000))
+        routes = ssr_bundle.open_bundle(bundle).select()
+        for ecfg in (EngineConfig(), EngineConfig(engine="stream", exact_quantiles=True)):
+            must_match_routes("bundle", evaluate_routes(routes, gate, ecfg).routes,
+                              evaluate_routes(order, gate, ecfg).routes)
+        must_equal("bundle open handles", len(ssr_bundle._files), 1)
+    ssr_bundle.close_bundles()
+    must_equal("bundle handles after close", len(ssr_bundle._files), 0)
+
+
+@feature_check
+def check_sweep(tmp):
+    # Every grid point equals a single router run; default flags give the router's default gate.
+    import argparse
+    from ssr_structural_safety_routing import (EngineConfig, add_gate_args, evaluate_routes, gate_from_args,
+                                              spike_threshold)
+    from ssr_sweep import build_grid, sweep_route
+
+    single, multi = argparse.ArgumentParser(), argparse.ArgumentParser()
+    add_gate_args(single)
+    add_gate_args(multi, multi=True)
+    must_equal("sweep default grid", build_grid(multi.parse_args([])), [gate_from_args(single.parse_args([]))])
+
+    paths = variant_traces(tmp, 400, 5)
+    grid = build_grid(multi.parse_args(
+        "--a_min 0.0 0.05 --step_spike_mode none abs rel_p95 rel_window --step_spike 1.5 --step_spike_k 1.2 1.5 "
+        "--step_spike_window 10 --deny_mode any fraction --deny_frac 0.02".split()))
+    ecfg = EngineConfig()
+    swept = [sweep_route(p, grid, ecfg)[1] for p in paths]
+    for gi, gate in enumerate(grid):
+        for route, outcomes in zip(evaluate_routes(paths, gate, ecfg).routes, swept):
+            thr = spike_threshold(gate, route)
+            must_equal(f"sweep {route.route} {gate}", outcomes[gi],
+                       (route.denied, route.deny_class, route.deny_reason, route.deny_count_a,
+                        "" if thr is None else f"{thr:.15g}"))
+
+
+@feature_check
+def check_rel_window(tmp):
+    # rel_window counts equal a brute-force rolling percentile, in every engine.
+    from ssr_structural_safety_routing import (WINDOW_STATS, EngineConfig, GateConfig, compute_base, evaluate_routes,
+                                              percentile)
+
+    paths = variant_traces(tmp, 600, 5)
+    engines = [EngineConfig(), EngineConfig(engine="numpy"), EngineConfig(engine="stream"),
+               EngineConfig(engine="stream", chunk_bytes=4096, chunk_workers=2)]
+    for w, stat in ((10, "p95"), (25, "median")):
+        gate = GateConfig(step_spike_mode="rel_window", step_spike_k=1.5, step_spike_window=w,
+                          step_spike_window_stat=stat)
+        expected = []
+        for p in paths:
+            steps = compute_base(p, 1e-12)[1]
+            expected.append(sum(1 for i in range(w, len(steps))
+                                if steps[i] > 1.5 * percentile(sorted(steps[i - w:i]), WINDOW_STATS[stat])))
+        for ecfg in engines:
+            for r, n in zip(evaluate_routes(paths, gate, ecfg).routes, expected):
+                if n:
+                    must_contains(f"rel_window {ecfg.engine} {r.route}", r.deny_reason, f"step>thr ({n})")
+                else:
+                    must_not_contains(f"rel_window {ecfg.engine} {r.route}", r.deny_reason, "step>thr")
+
+
+@feature_check
+def check_segment_index(tmp):
+    # A segment query equals evaluating the trace cut to those rows (permission and abs gates).
+    from ssr_index import open_index
+    from ssr_structural_safety_routing import GateConfig, evaluate_routes
+
+    gate = GateConfig(a_min=0.2, step_spike_mode="abs", step_spike=1.5)
+    for p in variant_traces(tmp, 400, 4):
+        idx, built = open_index(p, gate)
+        must_equal(f"index {p.name} built", built, True)
+        must_equal(f"index {p.name} reused", open_index(p, gate)[1], False)
+        with open(p, newline="", encoding="utf-8") as f:
+            header, *rows = list(csv.reader(f))
+        for i, j in ((0, 399), (0, 0), (17, 18), (50, 260), (123, 399), (399, 399)):
+            seg = idx.query(i, j)
+            cut = write_trace(tmp / f"cut_{i}_{j}_{p.name}", header, rows[i:j + 1])
+            r = evaluate_routes([cut], gate).routes[0]
+            label = f"segment {p.name} [{i}, {j}]"
+            must_equal(f"{label} rows", seg.rows, r.rows)
+            must_equal(f"{label} denied", seg.denied, r.denied)
+            must_equal(f"{label} deny_reason", seg.deny_reason, r.deny_reason)
+            must_equal(f"{label} a_min_seen", seg.a_min_seen, r.a_min_seen)
+            must_equal(f"{label} max_step", seg.max_step, r.max_step)
+            for key in ("progress", "L_struct", "eta"):
+                g, e = getattr(seg, key), getattr(r, key)
+                if not (math.isclose(g, e, rel_tol=1e-9, abs_tol=1e-12) or (math.isnan(g) and math.isnan(e))):
+                    raise SystemExit(f"{label} {key} mismatch: got={g} expected~{e}")
+
+
+@feature_check
+def check_store(tmp):
+    # Two recorded runs: prev_denied, history, diff and flips follow the decisions that changed.
+    from ssr_store import open_store, query_diff, query_flips, query_history, query_runs, record_run
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_routes
+
+    paths = variant_traces(tmp, 400, 4)
+    loose, strict = GateConfig(a_min=-1.0), GateConfig(a_min=0.2, step_spike_mode="abs", step_spike=1.5)
+    first = evaluate_routes(paths[:3], loose).routes
+    second = evaluate_routes(paths, strict).routes
+    must_equal("loose denied", [r.denied for r in first], [0, 0, 0])
+    must_equal("strict denied", [r.denied for r in second], [0, 1, 1, 1])
+    names = [r.route for r in second]
+
+    conn = open_store(tmp / "results.db")
+    a = record_run(conn, first, loose, EngineConfig(), label="loose", started_at="2026-01-01T00:00:00+00:00")
+    b = record_run(conn, second, strict, EngineConfig(), label="strict", started_at="2026-01-02T00:00:00+00:00")
+    must_equal("runs", [r[:7] for r in query_runs(conn)[1]],
+               [(b, "2026-01-02T00:00:00+00:00", "strict", "python", "canonical", 4, 3),
+                (a, "2026-01-01T00:00:00+00:00", "loose", "python", "canonical", 3, 0)])
+    must_equal("prev_denied", conn.execute("SELECT route, prev_denied FROM results WHERE run_id = ? ORDER BY route",
+                                           (b,)).fetchall(), [(names[0], 0), (names[1], 0), (names[2], 0),
+                                                              (names[3], None)])
+    must_equal("history", [(r[0], r[3]) for r in query_history(conn, names[1])[1]], [(a, 0), (b, 1)])
+    must_equal("diff", [(r[0], r[1]) for r in query_diff(conn, a, b)[1]],
+               [(names[1], "ALLOWED->DENIED"), (names[2], "ALLOWED->DENIED"), (names[3], "added")])
+    must_equal("flips", [(r[0], r[2], r[3]) for r in query_flips(conn, to="denied")[1]],
+               [(b, names[1], "ALLOWED->DENIED"), (b, names[2], "ALLOWED->DENIED")])
+    must_equal("flips since", query_flips(conn, since="2026-01-03T00:00:00+00:00")[1], [])
+    must_equal("flips to allowed", query_flips(conn, to="allowed")[1], [])
+    conn.close()
+
+
+@feature_check
+def check_sketch(tmp):
+    # Quantiles within alpha on skewed data, merges equal to one sketch, and the bound kept above
+    # the collapsed range once the default 8192-bucket cap is hit.
+    import random
+    from ssr_sketch import DEFAULT_ALPHA, DEFAULT_MAX_BUCKETS, QuantileSketch
+    from ssr_structural_safety_routing import percentile
+
+    def state(s):
+        return sorted(s.buckets.items()), s.zero_count, s.count, s.min, s.max
+
+    def must_be_near(label, est, exact):
+        if abs(est - exact) > DEFAULT_ALPHA * exact * (1 + 1e-9):
+            raise SystemExit(f"{label}: sketch {est} not within alpha of {exact}")
+
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0.0, 2.0) for _ in range(30000)] + [0.0] * 300
+    rng.shuffle(values)
+    exact = sorted(values)
+    whole = QuantileSketch()
+    whole.update(values)
+    for p in (50.0, 90.0, 95.0, 99.0):
+        must_be_near(f"sketch p{p:g}", whole.percentile(p), percentile(exact, p))
+    for rank in (500, 3000, 15000, 29000):
+        must_be_near(f"sketch rank {rank}", whole.value_at_rank(rank), exact[rank])
+
+    parts = [values[:1000], values[1000:17000], values[17000:]]
+    sketches = []
+    for part in parts:
+        sketches.append(QuantileSketch())
+        sketches[-1].update(part)
+    left, right = QuantileSketch(), QuantileSketch()
+    for s in sketches:
+        left.merge(s)
+    for s in reversed(sketches):
+        right.merge(s)
+    must_equal("sketch merge left", state(left), state(whole))
+    must_equal("sketch merge right", state(right), state(whole))
+
+    for thr in (exact[15000], exact[28500], 0.5, 40.0):
+        got = whole.count_above(thr)
+        n = sum(1 for x in values if x > thr)
+        near = sum(1 for x in values if thr / whole.gamma < x <= thr)
+        if not n <= got <= n + near:
+            raise SystemExit(f"sketch count_above({thr}) = {got}, expected in [{n}, {n + near}]")
+
+    wide = [10.0 ** (-6.0 + 12.0 * i / 49999) for i in range(50000)]
+    capped = QuantileSketch()
+    capped.update(wide)
+    must_equal("sketch collapsed buckets", len(capped.buckets), DEFAULT_MAX_BUCKETS)
+    must_equal("sketch collapsed count", capped.count, len(wide))
+    for p in (50.0, 95.0):
+        must_be_near(f"collapsed p{p:g}", capped.percentile(p), percentile(wide, p))
+    halves = QuantileSketch(), QuantileSketch()
+    halves[0].update(wide[::2])
+    halves[1].update(wide[1::2])
+    halves[0].merge(halves[1])
+    must_equal("sketch collapsed merge buckets", len(halves[0].buckets), DEFAULT_MAX_BUCKETS)
+    must_be_near("collapsed merge p95", halves[0].percentile(95.0), percentile(wide, 95.0))
+
+
+@feature_check
+def check_sketch_gating(tmp):
+    # Sketched rel_p95/rel_median spike counts stay within the band the sketch cannot resolve:
+    # thr is known within alpha and count_above is exact outside thr's bucket. Outside that band
+    # the stream engine decides exactly like the reference.
+    from ssr_sketch import DEFAULT_ALPHA
+    from ssr_structural_safety_routing import (EngineConfig, GateConfig, compute_base, compute_base_stream,
+                                              evaluate_routes, spike_threshold)
+
+    paths = variant_traces(tmp, 300, 40)
+    banded = 0
+    for gate in (GateConfig(step_spike_mode="rel_p95", step_spike_k=1.0),
+                 GateConfig(step_spike_mode="rel_p95", step_spike_k=1.2),
+                 GateConfig(step_spike_mode="rel_median", step_spike_k=3.0)):
+        ref = evaluate_routes(paths, gate).routes
+        stream = evaluate_routes(paths, gate, EngineConfig(engine="stream")).routes
+        for p, r, s in zip(paths, ref, stream):
+            steps = compute_base(p, 1e-12)[1]
+            thr = spike_threshold(gate, r)
+            rm, acc = compute_base_stream(p, 1e-12, gate)
+            gamma = acc.sketch.gamma
+            lo = sum(1 for x in steps if x > thr * (1 + DEFAULT_ALPHA))
+            hi = sum(1 for x in steps if x > thr * (1 - DEFAULT_ALPHA) / gamma)
+            got = acc.count_steps_above(spike_threshold(gate, rm))
+            if not lo <= got <= hi:
+                raise SystemExit(f"sketch gating {p.name}: {got} spikes, expected in [{lo}, {hi}]")
+            if lo == hi:
+                must_equal(f"sketch gating {p.name} denied", s.denied, r.denied)
+            else:
+                banded += 1
+    must_equal("sketch gating knife-edge routes", banded > 0, True)
+
+
+@feature_check
+def check_workers(tmp):
+    # --workers N writes the same summary CSV (row order included) and report as --workers 1.
+    import subprocess
+
+    router = Path(__file__).resolve().parent / "ssr_structural_safety_routing.py"
+    paths = [str(p) for p in variant_traces(tmp, 300, 24)]
+    for extra in (["--step_spike_mode", "rel_p95", "--rank", "max_step"],
+                  ["--engine", "stream", "--exact_quantiles", "--step_spike_mode", "abs", "--step_spike", "1.5"]):
+        outputs = []
+        for workers in ("1", "4"):
+            run = tmp / f"workers{workers}"
+            run.mkdir(exist_ok=True)
+            report = subprocess.run([sys.executable, str(router), "--in", *paths, *extra, "--workers", workers,
+                                     "--out", "summary.csv"], cwd=run, capture_output=True, text=True, check=True)
+            outputs.append((report.stdout, (run / "summary.csv").read_bytes()))
+        must_equal(f"workers {' '.join(extra)} report", outputs[1][0], outputs[0][0])
+        must_equal(f"workers {' '.join(extra)} summary", outputs[1][1], outputs[0][1])
+
+
+@feature_check
+def check_columnar_malformed(tmp):
+    # Missing and malformed cells are counted the same for a CSV trace and its .ssrc conversion.
+    from ssr_columnar import ColumnarTrace, convert_csv
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_routes
+
+    as_rows = [[i, 0.3 + 0.01 * (i % 7), 0.1, "burn" if i == 5 else ""] for i in range(50)]
+    as_rows[3][1] = "NA"
+    as_rows[8][2] = ""
+    as_rows[9][0] = "k9"
+    as_rows[20] = as_rows[20][:2]
+    uv_rows = [[i, 0.02 * i, 0.01, 0.4, 0.2] for i in range(50)]
+    uv_rows[4][1] = "x"
+    uv_rows[6][3] = ""
+    uv_rows[30] = uv_rows[30][:3]
+    traces = [write_trace(tmp / "as.csv", ["k", "a", "s", "event"], as_rows),
+              write_trace(tmp / "uv.csv", ["k", "u", "v", "a", "s"], uv_rows)]
+    columnar = [p.with_suffix(".ssrc") for p in traces]
+    for p, c in zip(traces, columnar):
+        convert_csv(p, c)
+    must_equal("ssrc stored malformed", sorted(ColumnarTrace(columnar[1]).malformed.items()),
+               [("a", 2), ("s", 1), ("u", 1)])
+    gate = GateConfig(a_min=0.1)
+    for ecfg in (EngineConfig(), EngineConfig(engine="numpy"), EngineConfig(engine="stream")):
+        exp = evaluate_routes(traces, gate, ecfg).routes
+        must_equal("csv malformed", [sorted(r.malformed.items()) for r in exp],
+                   [[("a", 1), ("k", 1), ("s", 2)], [("a", 2), ("u", 1)]])
+        got = evaluate_routes(columnar, gate, ecfg).routes
+        must_equal(f"ssrc {ecfg.engine} malformed", [sorted(r.malformed.items()) for r in got],
+                   [sorted(r.malformed.items()) for r in exp])
+
+
+@feature_check
+def check_cache_eviction(tmp):
+    # Filling the cache scans the directory only when a put crosses the cap, and stamp memos are
+    # counted against the cap and evicted with the entries.
+    import ssr_cache
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_routes
+
+    paths = variant_traces(tmp, 100, 120)
+    gate = GateConfig(a_min=0.05)
+    exp = evaluate_routes(paths, gate).routes
+    scans = []
+    evict = ssr_cache.BaseCache.evict
+    ssr_cache.BaseCache.evict = lambda self, target=None: scans.append(target) or evict(self, target)
+    try:
+        roomy = EngineConfig(cache_dir=str(tmp / "roomy"))
+        must_match_routes("cache fill", evaluate_routes(paths, gate, roomy).routes, exp)
+        must_equal("cache scans without eviction", len(scans), 1)
+
+        entry = next((tmp / "roomy").glob("*" + ssr_cache.ENTRY_SUFFIX)).stat().st_size
+        cap = 30 * entry
+        del scans[:]
+        small = EngineConfig(cache_dir=str(tmp / "small"), cache_max_bytes=cap)
+        must_match_routes("cache evicting", evaluate_routes(paths, gate, small).routes, exp)
+    finally:
+        ssr_cache.BaseCache.evict = evict
+    if not 1 < len(scans) <= len(paths) // 3:
+        raise SystemExit(f"cache scanned {len(scans)} times for {len(paths)} puts")
+    files = [*(tmp / "small").glob("*" + ssr_cache.ENTRY_SUFFIX),
+             *(tmp / "small" / "stamps").glob("*" + ssr_cache.STAMP_SUFFIX)]
+    used = sum(p.stat().st_size for p in files)
+    if used > cap:
+        raise SystemExit(f"cache holds {used} bytes > cap {cap}")
+    stamps = len(list((tmp / "small" / "stamps").glob("*" + ssr_cache.STAMP_SUFFIX)))
+    if not 0 < stamps < len(paths):
+        raise SystemExit(f"cache kept {stamps} stamp memos for {len(paths)} traces")
+
+
+@feature_check
+def check_bench_compare(tmp):
+    # compare() flags configurations whose rows/sec fell by more than the tolerance, and only those.
+    import contextlib
+    import io
+    import json
+    from ssr_bench import compare
+
+    def result(name, engine, rows_per_s, workers=1):
+        return {"set": name, "engine": engine, "format": "csv", "workers": workers, "rows_per_s": rows_per_s}
+
+    baseline = tmp / "baseline.json"
+    baseline.write_text(json.dumps({"label": "v1", "results": [
+        result("rows_1000", "python", 100000.0), result("rows_1000", "stream", 100000.0),
+        result("rows_1000", "numpy", 100000.0), result("routes_5x200", "python", 50000.0, 4)]}), encoding="utf-8")
+    current = [result("rows_1000", "python", 95000.0), result("rows_1000", "stream", 80000.0),
+               result("rows_1000", "numpy", 150000.0), result("routes_5x200", "python", 20000.0, 1),
+               result("rows_5000", "python", 1.0)]
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        regressions = compare(current, baseline, 0.10)
+    must_equal("bench regressions", regressions, 1)
+    flagged = [line for line in out.getvalue().splitlines() if line.endswith("REGRESSION")]
+    must_equal("bench flagged", len(flagged), 1)
+    must_contains("bench flagged line", flagged[0], "stream")
+    must_contains("bench compare header", out.getvalue(), "(v1)")
+
+
+@feature_check
+def check_generation_chunks(tmp):
+    # Chunked, parallel generation writes byte-identical traces and bundles to sequential generation.
+    import subprocess
+
+    from ssr_bundle import INDEX_SUFFIX
+
+    root = Path(__file__).resolve().parent
+    for script in (root / "ssr_tracegen.py", root.parent / "mission_space" / "ssr_tracegen_mission.py"):
+        for extra in ([], ["--bundle", "all.bundle.csv"]):
+            outputs = []
+            for workers, chunk_rows in (("1", "1000000"), ("2", "97")):
+                out_dir = tmp / f"{script.stem}{len(extra)}_{workers}"
+                subprocess.run([sys.executable, str(script), "--n", "700", "--variants", "8", *extra,
+                                "--workers", workers, "--chunk_rows", chunk_rows, "--out_dir", str(out_dir)],
+                               capture_output=True, text=True, check=True)
+                # The bundle's index sidecar records the bundle's mtime, so only the traces are compared.
+                outputs.append({p.name: p.read_bytes() for p in sorted(out_dir.iterdir()) if p.suffix != INDEX_SUFFIX})
+            label = f"{script.stem} {' '.join(extra) or 'csv'}"
+            must_equal(f"{label} files", sorted(outputs[1]), sorted(outputs[0]))
+            must_equal(f"{label} bytes", [name for name in outputs[0] if outputs[1][name] != outputs[0][name]], [])
+
+
+@feature_check
+def check_watcher(tmp):
+    # A scan re-evaluates only added or modified traces: touching a file does not re-evaluate it,
+    # modifying, appending to and deleting traces between scans updates just those routes, and
+    # watch_main ends with the same summary as a batch run over the directory.
+    import os
+    import subprocess
+
+    import ssr_structural_safety_routing as router
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, TraceWatcher, evaluate_routes
+
+    watch_dir = tmp / "watch"
+    watch_dir.mkdir()
+    paths = variant_traces(watch_dir, 200, 6)
+    gate = GateConfig(a_min=0.05)
+    evaluated = []
+    evaluate = router.evaluate_or_error
+    router.evaluate_or_error = lambda path, *a: evaluated.append(path.name) or evaluate(path, *a)
+    watcher = TraceWatcher([watch_dir], gate, EngineConfig())
+    try:
+        added, modified, removed = watcher.scan()
+        must_equal("watch first scan", (len(added), modified, removed), (len(paths), [], []))
+        must_equal("watch first evaluated", sorted(evaluated), sorted(p.name for p in paths))
+
+        del evaluated[:]
+        st = paths[0].stat()
+        os.utime(paths[0], ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        must_equal("watch touch", (watcher.scan(), evaluated), (([], [], []), []))
+
+        with paths[1].open(newline="", encoding="utf-8") as f:
+            header, *rows = csv.reader(f)
+        rows[50][header.index("a")] = "-0.9"
+        write_trace(paths[1], header, rows)
+        with paths[2].open("a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows[-5:])
+        paths[3].unlink()
+        added, modified, removed = watcher.scan()
+        must_equal("watch changes", (added, modified, removed), ([], [paths[1], paths[2]], [paths[3]]))
+        must_equal("watch changes evaluated", sorted(evaluated), [paths[1].name, paths[2].name])
+        remaining = [p for p in paths if p != paths[3]]
+        must_match_routes("watch routes", watcher.records(),
+                          evaluate_routes(remaining, gate).routes)
+    finally:
+        router.evaluate_or_error = evaluate
+        watcher.close()
+
+    script = Path(__file__).resolve().parent / "ssr_structural_safety_routing.py"
+    for mode, extra in (("batch", []), ("watch", ["--watch", "--watch_interval", "0.01", "--watch_idle", "0"])):
+        inputs = [str(watch_dir)] if mode == "watch" else [str(p) for p in remaining]
+        subprocess.run([sys.executable, str(script), "--in", *inputs, *extra, "--out", str(tmp / f"{mode}.csv")],
+                       capture_output=True, text=True, check=True)
+    must_equal("watch_main summary", (tmp / "watch.csv").read_bytes(), (tmp / "batch.csv").read_bytes())
+
+
+@feature_check
+def check_profile(tmp):
+    # --profile writes every stage in STAGES (plus the report) for the run and for each route, with
+    # allocation peaks under tracemalloc and none without it; the summary matches a plain run.
+    import json
+    import subprocess
+
+    from ssr_structural_safety_routing import STAGES
+
+    script = Path(__file__).resolve().parent / "ssr_structural_safety_routing.py"
+    paths = [str(p) for p in variant_traces(tmp, 300, 4)]
+    subprocess.run([sys.executable, str(script), "--in", *paths, "--out", str(tmp / "plain.csv")],
+                   capture_output=True, text=True, check=True)
+    for memory in (True, False):
+        extra = [] if memory else ["--no_profile_memory"]
+        out, report_path = tmp / f"profiled{memory:d}.csv", tmp / f"profile{memory:d}.json"
+        subprocess.run([sys.executable, str(script), "--in", *paths, "--profile", str(report_path), *extra,
+                        "--out", str(out)], capture_output=True, text=True, check=True)
+        report = json.loads(report_path.read_text(encoding="utf-8"))
+        must_equal(f"profile{memory:d} summary", out.read_bytes(), (tmp / "plain.csv").read_bytes())
+        must_equal(f"profile{memory:d} stages", list(report["stages"]), STAGES + ["report"])
+        must_equal(f"profile{memory:d} route stages", [list(r["stages"]) for r in report["routes"]],
+                   [STAGES] * len(paths))
+        must_equal(f"profile{memory:d} rows", report["rows"], sum(r["rows"] for r in report["routes"]))
+        peaks = [v["alloc_peak_bytes"] for v in report["stages"].values()]
+        if memory:
+            if not (isinstance(report["traced_peak_bytes"], int) and report["traced_peak_bytes"] > 0):
+                raise SystemExit(f"profile traced_peak_bytes missing: {report['traced_peak_bytes']}")
+            must_equal("profile stage peaks", all(isinstance(p, int) and p >= 0 for p in peaks), True)
+        else:
+            must_equal("profile without tracemalloc peaks", (report["traced_peak_bytes"], set(peaks)), (None, {None}))
+
+
+@feature_check
+def check_graph_paths(tmp):
+    # Dijkstra, A* and Yen agree with enumerating every loopless path over the admissible edges,
+    # and the gate-denied shortcut is never used.
+    from ssr_graph import build_adjacency, distances_to, evaluate_edges, k_shortest_paths, read_manifest, shortest_path
+    from ssr_structural_safety_routing import EngineConfig, GateConfig
+    from ssr_tracegen import make_trace, variant_spec
+
+    links = [("A", "B"), ("A", "C"), ("B", "C"), ("C", "B"), ("B", "D"), ("C", "D"), ("C", "E"),
+             ("D", "E"), ("B", "E"), ("A", "B"), ("E", "A"), ("D", "C"), ("A", "E")]
+    rows = []
+    for i, (src, dst) in enumerate(links):
+        # variant_spec cycles through the patterns: multiples of 5 are corridors, 1 is a permission collapse.
+        spec = variant_spec(1 if (src, dst) == ("A", "E") else 5 * i, 40 + 13 * i)
+        write_trace(tmp / spec.name, *make_trace(spec))
+        rows.append([src, dst, spec.name])
+    manifest = write_trace(tmp / "manifest.csv", ["src", "dst", "trace"], rows)
+    edges = read_manifest(manifest)
+    evaluate_edges(edges, GateConfig(a_min=0.05), EngineConfig())
+    must_equal("graph denied edges", [i for i, e in enumerate(edges) if e.metrics.denied], [len(links) - 1])
+    adj = build_adjacency(edges)
+
+    def brute(source, target):
+        found = []
+
+        def walk(node, ids, seen):
+            if node == target:
+                found.append((math.fsum(edges[i].cost for i in ids), tuple(ids)))
+                return
+            for _, nxt, i in adj.get(node, ()):
+                if nxt not in seen:
+                    walk(nxt, ids + [i], seen | {nxt})
+
+        walk(source, [], {source})
+        return sorted(found)
+
+    nodes = sorted({n for link in links for n in link})
+    for source in nodes:
+        for target in nodes:
+            if source == target:
+                continue
+            exp = brute(source, target)
+            label = f"graph {source}->{target}"
+            for name, to_target in (("dijkstra", None), ("astar", distances_to(adj, target))):
+                got = shortest_path(adj, source, target, to_target=to_target)
+                must_equal(f"{label} {name} found", got is not None, bool(exp))
+                if exp and not math.isclose(got[0], exp[0][0], rel_tol=1e-12):
+                    raise SystemExit(f"{label} {name} cost mismatch: got={got[0]} expected={exp[0][0]}")
+                if exp:
+                    must_equal(f"{label} {name} path cost", math.isclose(math.fsum(edges[i].cost for i in got[1]),
+                                                                         exp[0][0], rel_tol=1e-12), True)
+            yen = k_shortest_paths(adj, edges, source, target, len(exp) + 3)
+            must_equal(f"{label} yen paths", sorted(p.edges for p in yen), sorted(ids for _, ids in exp))
+            must_equal(f"{label} yen costs", [p.L_struct for p in yen], [cost for cost, _ in exp])
+    must_equal("graph denied shortcut unused",
+               any(len(links) - 1 in p.edges for p in k_shortest_paths(adj, edges, "A", "E", 50)), False)
+
+
+@feature_check
+def check_compressed_formats(tmp):
+    # .gz, .bz2 and .xz traces evaluate exactly like the CSV; corrupt or truncated ones fail with
+    # "Cannot decompress" instead of leaving the reader waiting on a dead decompression thread.
+    import bz2
+    import gzip
+    import lzma
+    import subprocess
+    import threading
+
+    from ssr_structural_safety_routing import EngineConfig, GateConfig, evaluate_or_error, evaluate_routes
+
+    src = variant_traces(tmp, 20000, 3)[2]
+    data = src.read_bytes()
+    gate = GateConfig(a_min=0.05)
+    engines = [EngineConfig(engine=engine) for engine in ("python", "stream")]
+    exp = [evaluate_routes([src], gate, ecfg).routes for ecfg in engines]
+    for suffix, compress in ((".gz", gzip.compress), (".bz2", bz2.compress), (".xz", lzma.compress)):
+        packed = compress(data)
+        good = tmp / (src.name + suffix)
+        good.write_bytes(packed)
+        for ecfg, routes in zip(engines, exp):
+            must_match_routes(f"{suffix} {ecfg.engine}", evaluate_routes([good], gate, ecfg).routes, routes)
+
+        mid = len(packed) // 2
+        for kind, bad_bytes in (("corrupt", packed[:mid] + b"\xff" * 64 + packed[mid + 64:]),
+                                ("truncated", packed[:mid])):
+            bad = tmp / f"{kind}_{src.name}{suffix}"
+            bad.write_bytes(bad_bytes)
+            result = []
+            worker = threading.Thread(target=lambda: result.append(evaluate_or_error(bad, gate, EngineConfig())),
+                                      daemon=True)
+            worker.start()
+            worker.join(30)
+            if worker.is_alive():
+                raise SystemExit(f"{kind} {suffix}: reader still waiting after 30s")
+            must_equal(f"{kind} {suffix} metrics", result[0][0], None)
+            must_contains(f"{kind} {suffix} error", result[0][1], "Cannot decompress")
+
+    script = Path(__file__).resolve().parent / "ssr_structural_safety_routing.py"
+    run = subprocess.run([sys.executable, str(script), "--in", str(tmp / f"corrupt_{src.name}.gz"),
+                          "--out", str(tmp / "corrupt.csv")], capture_output=True, text=True, timeout=60)
+    must_equal("corrupt .gz exit", run.returncode != 0, True)
+    must_contains("corrupt .gz stderr", run.stderr, "Cannot decompress")
+
+
+def run_feature_checks():
+    with tempfile.TemporaryDirectory() as d:
+        for fn in FEATURE_CHECKS:
+            tmp = Path(d) / fn.__name__
+            tmp.mkdir()
+            fn(tmp)
+            print("ok", fn.__name__)
+    print("SSR FEATURE TESTS PASSED")
+    return 0
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
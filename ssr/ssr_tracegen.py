@@ -1,8 +1,27 @@
+import argparse
 import csv
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+from ssr_bundle import SUFFIX as BUNDLE_SUFFIX, assemble_bundle, prefixed_rows
+from ssr_columnar import SUFFIX as COLUMNAR_SUFFIX, write_columnar
 
 EPS = 1e-12
+DEFAULT_CHUNK_ROWS = 1 << 20
+
+# Fractional parts of j * (these constants) are evenly spread in [0, 1) (golden ratio and the
+# plastic-number 2D sequence), which keeps variant parameters distinct without an RNG.
+_GOLDEN = 0.6180339887498949
+_PLASTIC_1 = 0.7548776662466927
+_PLASTIC_2 = 0.5698402909980532
+
+# rows(start, stop) -> trace rows [start, stop)
+RowsFn = Callable[[int, int], Iterable[Sequence]]
 
 
 def clamp(x, lo=-0.999999, hi=0.999999):
@@ -18,71 +37,125 @@ class RouteSpec:
     name: str
     n: int
     pattern: str
+    phase: float = 0.0                            # added to the base cos/sin angle
+    band: Optional[Tuple[float, float]] = None    # (lo, hi) fractions of n; None = middle third
+    spikes: Optional[int] = None                  # evenly spaced; None = pattern default (3 or 1)
+
+
+HEADERS = [
+    "k", "x", "x_next", "r", "dx_raw", "dx", "dx_perm",
+    "a", "s", "u", "v", "R", "Psi", "event"
+]
+
+PATTERNS = ["corridor", "permission_collapse", "spike_hazard", "spike_denied", "permission_denied_only"]
 
 
 def make_trace(spec: RouteSpec):
-    rows = []
-    m_prev = 0.0
-    u_prev = 0.0
-    v_prev = 0.0
+    return list(HEADERS), list(trace_rows(spec))
+
+
+def variant_spec(i: int, n: int) -> RouteSpec:
+    """Member i of the deterministic variant family.
+
+    Routes cycle through PATTERNS; the first cycle is the plain scenario set and every later cycle
+    shifts the phase, moves and resizes the band and changes the spike count, using low-discrepancy
+    sequences so thousands of variants stay distinct and spread out without any randomness.
+    """
+    pattern = PATTERNS[i % len(PATTERNS)]
+    j = i // len(PATTERNS)
+    name = f"route{i:05d}_{pattern}.csv"
+    if j == 0:
+        return RouteSpec(name, n, pattern)
+    width = 0.15 + 0.30 * ((j * _PLASTIC_1) % 1.0)
+    lo = 0.05 + (0.90 - width) * ((j * _PLASTIC_2) % 1.0)
+    return RouteSpec(name, n, pattern, phase=2 * math.pi * ((j * _GOLDEN) % 1.0),
+                     band=(lo, lo + width), spikes=1 + j % 6)
+
+
+def route_layout(spec: RouteSpec):
+    """(band start, band end, spike rows) for spec; the defaults reproduce the scenario files."""
+    if spec.band is None:
+        k1 = spec.n // 3
+        k2 = (2 * spec.n) // 3
+    else:
+        k1 = int(spec.band[0] * spec.n)
+        k2 = int(spec.band[1] * spec.n)
+
+    count = spec.spikes
+    if count is None:
+        count = 3 if spec.pattern == "spike_hazard" else 1
+    spikes = frozenset((i * spec.n) // (count + 1) for i in range(1, count + 1))
+    return k1, k2, spikes
+
+
+def pattern_as(spec: RouteSpec, k: int, layout):
+    k1, k2, spikes = layout
+    theta = 2 * math.pi * k / max(1, spec.n - 1) + spec.phase
+
+    if spec.pattern == "corridor":
+        a = 0.65 + 0.10 * math.cos(theta)
+        s = 0.15 + 0.05 * math.sin(theta)
+
+    elif spec.pattern == "permission_collapse":
+        a_base = 0.55 + 0.05 * math.cos(theta)
+        s = 0.20 + 0.05 * math.sin(theta)
+
+        if k1 <= k <= k2:
+            t = (k - k1) / max(1, (k2 - k1))
+            w = 0.5 - 0.5 * math.cos(2 * math.pi * t)   # smooth 0->1->0
+            a = a_base - (0.90 * w)                     # min approx -0.35
+        else:
+            a = a_base
+
+    elif spec.pattern == "spike_hazard":
+        a = 0.55 + 0.06 * math.cos(theta)
+        s = 0.18 + 0.06 * math.sin(theta)
+        if k in spikes:
+            s = 0.85
+
+    elif spec.pattern == "spike_denied":
+        a = 0.60 + 0.04 * math.cos(theta)
+        s = 0.15 + 0.04 * math.sin(theta)
+        if k in spikes:
+            s = 0.98
+
+    elif spec.pattern == "permission_denied_only":
+        a_base = 0.60 + 0.02 * math.cos(theta)
+
+        if k1 <= k <= k2:
+            t = (k - k1) / max(1, (k2 - k1))
+            w = 0.5 - 0.5 * math.cos(2 * math.pi * t)
+            a = a_base - (1.00 * w)
+        else:
+            a = a_base
 
-    headers = [
-        "k", "x", "x_next", "r", "dx_raw", "dx", "dx_perm",
-        "a", "s", "u", "v", "R", "Psi", "event"
-    ]
+        s = 0.12
 
-    for k in range(spec.n):
-        m = float(k)
+    else:
+        raise ValueError(f"Unknown pattern: {spec.pattern}")
 
-        if spec.pattern == "corridor":
-            a = 0.65 + 0.10 * math.cos(2 * math.pi * k / max(1, spec.n - 1))
-            s = 0.15 + 0.05 * math.sin(2 * math.pi * k / max(1, spec.n - 1))
-
-        elif spec.pattern == "permission_collapse":
-            a_base = 0.55 + 0.05 * math.cos(2 * math.pi * k / max(1, spec.n - 1))
-            s = 0.20 + 0.05 * math.sin(2 * math.pi * k / max(1, spec.n - 1))
-
-            k1 = spec.n // 3
-            k2 = (2 * spec.n) // 3
-
-            if k1 <= k <= k2:
-                t = (k - k1) / max(1, (k2 - k1))
-                w = 0.5 - 0.5 * math.cos(2 * math.pi * t)   # smooth 0->1->0
-                a = a_base - (0.90 * w)                     # min approx -0.35
-            else:
-                a = a_base
-
-        elif spec.pattern == "spike_hazard":
-            a = 0.55 + 0.06 * math.cos(2 * math.pi * k / max(1, spec.n - 1))
-            s = 0.18 + 0.06 * math.sin(2 * math.pi * k / max(1, spec.n - 1))
-            if k in {spec.n // 4, spec.n // 2, (3 * spec.n) // 4}:
-                s = 0.85
-
-        elif spec.pattern == "spike_denied":
-            a = 0.60 + 0.04 * math.cos(2 * math.pi * k / max(1, spec.n - 1))
-            s = 0.15 + 0.04 * math.sin(2 * math.pi * k / max(1, spec.n - 1))
-            if k == spec.n // 2:
-                s = 0.98
-
-        elif spec.pattern == "permission_denied_only":
-            a_base = 0.60 + 0.02 * math.cos(2 * math.pi * k / max(1, spec.n - 1))
-            k1 = spec.n // 3
-            k2 = (2 * spec.n) // 3
-
-            if k1 <= k <= k2:
-                t = (k - k1) / max(1, (k2 - k1))
-                w = 0.5 - 0.5 * math.cos(2 * math.pi * t)
-                a = a_base - (1.00 * w)
-            else:
-                a = a_base
-
-            s = 0.12
+    return clamp(a), clamp(s)
 
-        else:
-            raise ValueError(f"Unknown pattern: {spec.pattern}")
 
-        a = clamp(a)
-        s = clamp(s)
+def trace_rows(spec: RouteSpec, start: int = 0, stop: Optional[int] = None):
+    """Yield rows [start, stop) of make_trace(spec) one at a time (constant memory for any spec.n).
+
+    Each row depends only on its own index and the previous row, so any chunk can be generated on
+    its own and chunks concatenate to exactly the sequential trace.
+    """
+    layout = route_layout(spec)
+    stop = spec.n if stop is None else min(stop, spec.n)
+
+    m_prev = 0.0
+    v_prev = 0.0
+    if start > 0:
+        _, s = pattern_as(spec, start - 1, layout)
+        m_prev = float(start - 1)
+        v_prev = atanh_safe(s)
+
+    for k in range(start, stop):
+        m = float(k)
+        a, s = pattern_as(spec, k, layout)
         u = atanh_safe(a)
         v = atanh_safe(s)
 
@@ -103,36 +176,128 @@ def make_trace(spec: RouteSpec):
         x_next = float(k + 1)
         r = 0.0
 
-        rows.append([
+        yield [
             k, x, x_next, r, dx_raw, dx, dx_perm,
             a, s, u, v, R, Psi, event
-        ])
-
-        u_prev, v_prev, m_prev = u, v, m
+        ]
 
-    return headers, rows
+        v_prev, m_prev = v, m
 
 
 def write_csv(path, headers, rows):
+    if Path(path).suffix == COLUMNAR_SUFFIX:
+        write_columnar(path, headers, rows)
+        return
     with open(path, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(headers)
         w.writerows(rows)
 
 
+def _generate(path: Path, headers: Optional[Sequence[str]], rows: RowsFn, start: int, stop: int) -> Path:
+    if headers is None:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows(start, stop))
+    else:
+        write_csv(path, headers, rows(start, stop))
+    return path
+
+
+def write_traces(jobs: Sequence[Tuple[Path, RowsFn, int]], headers: Optional[Sequence[str]], workers: int = 1,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS) -> None:
+    """Write each (path, rows, n) job; rows must be picklable when workers > 1.
+
+    Files are generated in parallel across workers. A CSV longer than chunk_rows is also cut into
+    chunks that are generated independently and concatenated in order, so a single huge route
+    uses every worker too. Rows are streamed throughout, so memory stays bounded for any n.
+    """
+    tasks = []
+    chunked = []
+    for path, rows, n in jobs:
+        path = Path(path)
+        if workers > 1 and path.suffix != COLUMNAR_SUFFIX and n > chunk_rows:
+            parts = [path.with_name(f"{path.name}.part{i:05d}") for i in range(-(-n // chunk_rows))]
+            for i, part in enumerate(parts):
+                start = i * chunk_rows
+                tasks.append((part, headers if i == 0 else None, rows, start, min(n, start + chunk_rows)))
+            chunked.append((path, parts))
+        else:
+            tasks.append((path, headers, rows, 0, n))
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(_generate, *zip(*tasks)))
+    else:
+        for task in tasks:
+            _generate(*task)
+
+    for path, parts in chunked:
+        os.replace(parts[0], path)
+        with path.open("ab") as out:
+            for part in parts[1:]:
+                with part.open("rb") as f:
+                    while True:
+                        buf = f.read(1 << 20)
+                        if not buf:
+                            break
+                        out.write(buf)
+                part.unlink()
+
+
+def write_bundle_traces(bundle: Path, jobs: Sequence[Tuple[str, RowsFn, int]], headers: Sequence[str],
+                        workers: int = 1, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> None:
+    """Write each (route name, rows, n) job into one bundle (see ssr_bundle.py), generated in
+    parallel like write_traces: every route goes to a header-less part file, then the parts are
+    concatenated in job order while the route directory is recorded."""
+    bundle = Path(bundle)
+    parts = [bundle.with_name(f"{bundle.name}.route{i:07d}") for i in range(len(jobs))]
+    write_traces([(part, partial(prefixed_rows, name, rows), n) for part, (name, rows, n) in zip(parts, jobs)],
+                 None, workers=workers, chunk_rows=chunk_rows)
+    assemble_bundle(bundle, headers, [(name, part) for part, (name, _, _) in zip(parts, jobs)])
+
+
 def main():
-    specs = [
-        RouteSpec("routeA_corridor.csv", 60, "corridor"),
-        RouteSpec("routeB_permission_collapse.csv", 60, "permission_collapse"),
-        RouteSpec("routeC_spike_hazard.csv", 60, "spike_hazard"),
-        RouteSpec("routeD_spike_denied.csv", 60, "spike_denied"),
-        RouteSpec("routeE_permission_denied_only.csv", 60, "permission_denied_only"),
-    ]
-
-    for s in specs:
-        headers, rows = make_trace(s)
-        write_csv(s.name, headers, rows)
-        print("WROTE", s.name)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--format", choices=["csv", "ssrc"], default="csv", help="Trace file format")
+    ap.add_argument("--n", type=int, default=60, help="Rows per route")
+    ap.add_argument("--variants", type=int, default=0,
+                    help="Write this many routes from the deterministic variant family instead of the five scenarios")
+    ap.add_argument("--out_dir", default=".")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--chunk_rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                    help="(workers > 1) split CSV routes longer than this into parallel chunks")
+    ap.add_argument("--bundle", default=None, metavar="NAME" + BUNDLE_SUFFIX,
+                    help="Write all routes into this one bundle file in --out_dir instead of one CSV per route")
+    args = ap.parse_args()
+    if args.bundle and (args.format != "csv" or not args.bundle.endswith(BUNDLE_SUFFIX)):
+        raise SystemExit(f"--bundle needs --format csv and a name ending in {BUNDLE_SUFFIX}")
+
+    if args.variants > 0:
+        specs = [variant_spec(i, args.n) for i in range(args.variants)]
+    else:
+        specs = [
+            RouteSpec("routeA_corridor.csv", args.n, "corridor"),
+            RouteSpec("routeB_permission_collapse.csv", args.n, "permission_collapse"),
+            RouteSpec("routeC_spike_hazard.csv", args.n, "spike_hazard"),
+            RouteSpec("routeD_spike_denied.csv", args.n, "spike_denied"),
+            RouteSpec("routeE_permission_denied_only.csv", args.n, "permission_denied_only"),
+        ]
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.bundle:
+        jobs = [(s.name, partial(trace_rows, s), s.n) for s in specs]
+        write_bundle_traces(out_dir / args.bundle, jobs, HEADERS, workers=args.workers,
+                            chunk_rows=max(1, args.chunk_rows))
+        print("WROTE", args.bundle, f"({len(specs)} routes)")
+        return
+
+    names = [s.name if args.format == "csv" else str(Path(s.name).with_suffix(COLUMNAR_SUFFIX)) for s in specs]
+    jobs = [(out_dir / name, partial(trace_rows, s), s.n) for name, s in zip(names, specs)]
+    write_traces(jobs, HEADERS, workers=args.workers, chunk_rows=max(1, args.chunk_rows))
+    for name in names:
+        print("WROTE", name)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,315 @@
+"""Differential verification of the accelerated engines against the reference engine.
+
+The reference is the python engine without cache, early exit or chunking (compute_base plus the
+gating loop). verify_run() evaluates the same traces with the reference and with one accelerated
+engine configuration, compares every summary field within tolerances, checks that admit/deny
+decisions and the ranking agree (routes whose rank keys are equal within tolerance count as tied),
+and times both. `ssr_structural_safety_routing.py --verify` runs it for the engine selected on the
+command line; main() below is the harness that runs it over the canonical and mission scenarios
+and large generated traces for every engine configuration.
+"""
+
+import argparse
+import json
+import math
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field, replace
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ssr_structural_safety_routing import (
+    DEFAULT_ALPHA,
+    EngineConfig,
+    GateConfig,
+    RouteMetrics,
+    evaluate_routes,
+    rank_routes,
+    spike_threshold,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EXACT_FIELDS = ("rows", "denied", "deny_class", "deny_reason", "deny_count_a")
+FLOAT_FIELDS = ("progress", "L_struct", "eta", "L_classical", "a_min_seen", "max_step", "max_R", "max_Psi")
+QUANTILE_FIELDS = ("median_step", "p95_step", "spike_thr")
+
+# Accelerated configurations the harness verifies (EngineConfig overrides).
+ENGINE_CONFIGS: Dict[str, Dict] = {
+    "numpy": {"engine": "numpy"},
+    "stream": {"engine": "stream"},
+    "stream_exact": {"engine": "stream", "exact_quantiles": True},
+    "chunked": {"engine": "stream", "chunk_bytes": 1 << 16, "chunk_workers": 2},
+    "cache": {"engine": "python"},  # cache_dir is filled in by the harness; verified on cache hits
+    "early_exit": {"engine": "stream", "early_exit": True},
+}
+
+GATES: List[Tuple[str, GateConfig]] = [
+    ("none", GateConfig(step_spike_mode="none")),
+    ("abs", GateConfig(step_spike_mode="abs", step_spike=1.5)),
+    ("rel_p95", GateConfig(step_spike_mode="rel_p95", step_spike_k=1.2)),
+    ("rel_median", GateConfig(step_spike_mode="rel_median", step_spike_k=1.5)),
+    ("rel_window", GateConfig(step_spike_mode="rel_window", step_spike_window=50, step_spike_k=1.5)),
+    ("fraction", GateConfig(step_spike_mode="rel_p95", step_spike_k=1.2, deny_mode="fraction", deny_frac=0.02)),
+]
+
+
+@dataclass
+class Tolerances:
+    rtol: float = 1e-9          # relative, for summed / derived float metrics
+    atol: float = 1e-12         # absolute floor (values near zero)
+    quantile_rtol: float = 1e-9  # median/p95 step and relative spike thresholds
+
+    @classmethod
+    def for_engine(cls, ecfg: EngineConfig, rtol: float = 1e-9) -> "Tolerances":
+        """Quantiles from the stream engine's sketch are only guaranteed within sketch_alpha."""
+        sketched = ecfg.engine == "stream" and not ecfg.exact_quantiles
+        q = max(rtol, ecfg.sketch_alpha * (1.0 + 1e-6)) if sketched else rtol
+        return cls(rtol=rtol, quantile_rtol=q)
+
+    def for_field(self, name: str) -> float:
+        return self.quantile_rtol if name in QUANTILE_FIELDS else self.rtol
+
+
+@dataclass
+class Divergence:
+    route: str
+    field: str
+    reference: object
+    fast: object
+
+
+@dataclass
+class VerifyReport:
+    label: str
+    routes: int
+    divergences: List[Divergence]
+    ranking: Optional[Tuple[List[str], List[str]]]   # (reference, fast) when they differ
+    ref_seconds: float
+    fast_seconds: float
+    fast_routes: List[RouteMetrics] = field(default_factory=list, repr=False)
+
+    @property
+    def decisions(self) -> int:
+        return sum(1 for d in self.divergences if d.field == "denied")
+
+    @property
+    def ok(self) -> bool:
+        return not self.divergences and self.ranking is None
+
+    @property
+    def speedup(self) -> float:
+        return self.ref_seconds / self.fast_seconds if self.fast_seconds > 0 else math.inf
+
+
+def _close(a: float, b: float, rtol: float, atol: float) -> bool:
+    if a != a or b != b:
+        return a != a and b != b
+    return math.isclose(a, b, rel_tol=rtol, abs_tol=atol)
+
+
+def _thr(gate: GateConfig, r: RouteMetrics) -> float:
+    thr = spike_threshold(gate, r)
+    return math.nan if thr is None else thr
+
+
+def compare_metrics(ref: RouteMetrics, fast: RouteMetrics, gate: GateConfig, tol: Tolerances) -> List[Divergence]:
+    """Fields of fast that disagree with ref. Routes an early exit stopped (complete=0) carry partial
+    metrics by design, so only their decision is compared."""
+    out: List[Divergence] = []
+    if ref.route != fast.route:
+        return [Divergence(ref.route, "route", ref.route, fast.route)]
+    if not fast.complete:
+        if ref.denied != fast.denied:
+            out.append(Divergence(ref.route, "denied", ref.denied, fast.denied))
+        return out
+    for name in EXACT_FIELDS:
+        a, b = getattr(ref, name), getattr(fast, name)
+        if a != b:
+            out.append(Divergence(ref.route, name, a, b))
+    for name in FLOAT_FIELDS:
+        a, b = getattr(ref, name), getattr(fast, name)
+        if not _close(a, b, tol.rtol, tol.atol):
+            out.append(Divergence(ref.route, name, a, b))
+    for name in QUANTILE_FIELDS:
+        if name == "spike_thr":
+            a, b = _thr(gate, ref), _thr(gate, fast)
+        else:
+            a, b = getattr(ref, name), getattr(fast, name)
+        if not _close(a, b, tol.quantile_rtol, tol.atol):
+            out.append(Divergence(ref.route, name, a, b))
+    return out
+
+
+def reference_config(ecfg: EngineConfig) -> EngineConfig:
+    return EngineConfig(engine="python", eps=ecfg.eps, profile=ecfg.profile)
+
+
+def run_timed(paths: Sequence[Path], gate: GateConfig, ecfg: EngineConfig, rank: str,
+              workers: int) -> Tuple[List[RouteMetrics], float]:
+    t0 = time.perf_counter()
+    routes = evaluate_routes(paths, gate, ecfg, rank, workers, compact=True).routes
+    return routes, time.perf_counter() - t0
+
+
+def verify_run(paths: Sequence[Path], gate: GateConfig, ecfg: EngineConfig, rank: str = "L_struct",
+               workers: int = 1, tol: Optional[Tolerances] = None, label: str = "",
+               reference: Optional[Tuple[List[RouteMetrics], float]] = None) -> VerifyReport:
+    """Run the reference and ecfg on the same traces and compare; reference = (routes, seconds)
+    reuses an earlier reference run of the same traces and gate."""
+    tol = tol if tol is not None else Tolerances.for_engine(ecfg)
+    ref_routes, ref_s = reference if reference is not None else run_timed(
+        paths, gate, reference_config(ecfg), rank, workers)
+    fast_routes, fast_s = run_timed(paths, gate, ecfg, rank, workers)
+
+    divergences: List[Divergence] = []
+    for ref, fast in zip(ref_routes, fast_routes):
+        divergences.extend(compare_metrics(ref, fast, gate, tol))
+
+    ref_ranked = rank_routes(ref_routes, rank, ecfg.metrics)
+    fast_ranked = rank_routes(fast_routes, rank, ecfg.metrics)
+    agree = rankings_agree(ref_ranked, fast_ranked, ecfg.metrics.rank_key(rank),
+                           tol.for_field(rank), tol.atol)
+    ranking = None if agree else ([r.route for r in ref_ranked], [r.route for r in fast_ranked])
+    return VerifyReport(label or ecfg.engine, len(ref_routes), divergences, ranking, ref_s, fast_s, fast_routes)
+
+
+def rankings_agree(ref_ranked: Sequence[RouteMetrics], fast_ranked: Sequence[RouteMetrics],
+                   key, rtol: float, atol: float = 1e-12) -> bool:
+    """True when fast_ranked is ref_ranked up to the order of ties: every route in fast_ranked sits
+    at a position whose reference rank key equals its own reference key within rtol/atol."""
+    if len(ref_ranked) != len(fast_ranked):
+        return False
+    ref_key = {r.route: key(r) for r in ref_ranked}
+    for ref, fast in zip(ref_ranked, fast_ranked):
+        if fast.route == ref.route:
+            continue
+        if fast.route not in ref_key or not _close(ref_key[fast.route], ref_key[ref.route], rtol, atol):
+            return False
+    return True
+
+
+def print_verify(report: VerifyReport, limit: int = 20) -> None:
+    print("")
+    print(f"VERIFY ({report.label} vs reference): {report.routes} routes | "
+          f"reference {report.ref_seconds:.3f}s | {report.label} {report.fast_seconds:.3f}s | "
+          f"speedup {report.speedup:.2f}x")
+    if report.ok:
+        print("- all summary fields within tolerance; decisions and ranking agree")
+        return
+    if report.decisions:
+        print(f"- ADMIT/DENY DIVERGENCE on {report.decisions} route(s)")
+    for d in report.divergences[:limit]:
+        print(f"- {d.route}  {d.field}: reference={d.reference!r} {report.label}={d.fast!r}")
+    if len(report.divergences) > limit:
+        print(f"- ... {len(report.divergences) - limit} more")
+    if report.ranking is not None:
+        ref_order, fast_order = report.ranking
+        print(f"- RANKING DIVERGENCE: reference={ref_order} {report.label}={fast_order}")
+
+
+def build_datasets(work: Path, rows: int, routes: int) -> List[Tuple[str, str, List[Path]]]:
+    """(name, metric profile, traces): repo scenarios plus large generated variant families."""
+    here = Path(__file__).resolve().parent
+    sys.path.insert(0, str(here.parent / "mission_space"))
+    import ssr_tracegen
+    import ssr_tracegen_mission
+
+    sets = [
+        ("canonical", "canonical", sorted((here / "traces").glob("*.csv"))),
+        ("mission", "mission", sorted((here.parent / "mission_space" / "traces").glob("*.csv"))),
+    ]
+    if rows > 0 and routes > 0:
+        big = work / f"large_{rows}"
+        big_mission = work / f"large_mission_{rows}"
+        for out_dir in (big, big_mission):
+            out_dir.mkdir(parents=True, exist_ok=True)
+        specs = [ssr_tracegen.variant_spec(i, rows) for i in range(routes)]
+        ssr_tracegen.write_traces([(big / s.name, partial(ssr_tracegen.trace_rows, s), s.n) for s in specs
+                                   if not (big / s.name).exists()], ssr_tracegen.HEADERS)
+        mspecs = [ssr_tracegen_mission.variant_spec(i, rows) for i in range(routes)]
+        ssr_tracegen_mission.write_traces(
+            [(big_mission / s.name, partial(ssr_tracegen_mission.trace_rows, s, 0.05), s.n) for s in mspecs
+             if not (big_mission / s.name).exists()], ssr_tracegen_mission.HEADERS)
+        sets.append(("large", "canonical", [big / s.name for s in specs]))
+        sets.append(("large_mission", "mission", [big_mission / s.name for s in mspecs]))
+    return sets
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Differential test: every accelerated engine vs the reference engine")
+    ap.add_argument("--engines", nargs="+", choices=list(ENGINE_CONFIGS), default=list(ENGINE_CONFIGS))
+    ap.add_argument("--gates", nargs="+", choices=[g for g, _ in GATES], default=[g for g, _ in GATES])
+    ap.add_argument("--rows", type=int, default=200000, help="Rows per generated large trace (0 = scenarios only)")
+    ap.add_argument("--routes", type=int, default=4, help="Generated large traces per profile")
+    ap.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance for float summary fields")
+    ap.add_argument("--sketch_alpha", type=float, default=DEFAULT_ALPHA)
+    ap.add_argument("--rank", choices=["L_struct", "eta", "p95_step", "max_step"], default="L_struct")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--work_dir", default=None, help="Where large traces are generated and reused (default: temp dir)")
+    ap.add_argument("--out", default=None, help="Also write the results as JSON")
+    args = ap.parse_args()
+
+    engines = [e for e in args.engines if e != "numpy" or np is not None]
+    if len(engines) < len(args.engines):
+        print("NOTE: NumPy not installed; skipping the numpy engine", file=sys.stderr)
+
+    tmp = tempfile.TemporaryDirectory(prefix="ssr_verify_")
+    work = Path(args.work_dir) if args.work_dir else Path(tmp.name)
+    work.mkdir(parents=True, exist_ok=True)
+    datasets = build_datasets(work, args.rows, args.routes)
+    gates = [(name, g) for name, g in GATES if name in args.gates]
+
+    print("SSUM-SSR — Differential verification (reference vs accelerated engines)")
+    print(f"Tolerances: rtol={args.rtol} (quantiles from the sketch: sketch_alpha={args.sketch_alpha})")
+    print("")
+    print(f"{'dataset':<14}{'gate':<12}{'engine':<14}{'routes':>7}{'ref s':>10}{'fast s':>10}{'speedup':>9}  result")
+
+    results = []
+    failed = 0
+    for ds_name, profile, paths in datasets:
+        for gate_name, gate in gates:
+            base = EngineConfig(eps=1e-12, profile=profile, sketch_alpha=args.sketch_alpha)
+            reference = run_timed(paths, gate, reference_config(base), args.rank, args.workers)
+            for engine in engines:
+                ecfg = replace(base, **ENGINE_CONFIGS[engine])
+                if engine == "cache":
+                    ecfg = replace(ecfg, cache_dir=str(work / "cache"))
+                    run_timed(paths, gate, ecfg, args.rank, args.workers)  # fill; the verified run hits
+                report = verify_run(paths, gate, ecfg, args.rank, args.workers,
+                                    Tolerances.for_engine(ecfg, args.rtol), engine, reference)
+                if report.ok:
+                    result = "OK"
+                else:
+                    failed += 1
+                    result = f"DIVERGED ({len(report.divergences)} fields, {report.decisions} decisions" + \
+                             (", ranking)" if report.ranking else ")")
+                print(f"{ds_name:<14}{gate_name:<12}{engine:<14}{report.routes:>7}{report.ref_seconds:>10.3f}"
+                      f"{report.fast_seconds:>10.3f}{report.speedup:>8.2f}x  {result}")
+                if not report.ok:
+                    print_verify(report, limit=5)
+                results.append({
+                    "dataset": ds_name, "gate": gate_name, "engine": engine, "routes": report.routes,
+                    "ref_seconds": report.ref_seconds, "fast_seconds": report.fast_seconds,
+                    "speedup": report.speedup, "ok": report.ok,
+                    "divergences": [vars(d) for d in report.divergences],
+                    "ranking": report.ranking,
+                })
+
+    print("")
+    print(f"{len(results)} comparisons, {failed} diverged")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"rtol": args.rtol, "results": results}, indent=2, default=str),
+                                  encoding="utf-8")
+        print(f"WROTE {args.out}")
+    tmp.cleanup()
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()